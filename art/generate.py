@@ -1,46 +1,434 @@
-from diffusers import AutoPipelineForImage2Image
-import torch
-from diffusers.utils import load_image
 import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import resource
+import itertools
+from contextlib import contextmanager
 
-# Load the model
-pipeline = AutoPipelineForImage2Image.from_pretrained(
-    "stabilityai/stable-diffusion-xl-base-1.0", torch_dtype=torch.float16, use_safetensors=True
-)
-pipeline.enable_model_cpu_offload()
-pipeline.enable_xformers_memory_efficient_attention()
-
-# Define the input images and prompts
-media = [
-    {
-        "input_image": "input/book_cover.png",
-        "prompt": "A realistic book cover with castle and night sky. The design features a small princess with her back to the viewer, looking towards a castle under a starry sky. The focus is solely on the book cover itself, with no surrounding background.",
-        "output_image": "output/book_cover.png"
-    },
-    {
-        "input_image": "input/dvd_cover.png",
-        "prompt": "A DVD cover for fairies. The design should be focused solely on the DVD cover with no background",
-        "output_image": "output/dvd_cover.png"
-    },
-    {
-        "input_image": "input/album_cover.png",
-        "prompt": "An album cover that features a guitar amidst clouds, with a sky blue color scheme. The image should be focused solely on the album cover with no background",
-        "output_image": "output/album_cover.png"
-    }
-]
-
-# Ensure the output directory exists
-os.makedirs("output", exist_ok=True)
-
-# Generate images
-for item in media:
-    print(f"Processing: {item['input_image']}")
-    init_image = load_image(item["input_image"])
-    generated_image = pipeline(
-        item["prompt"],
-        image=init_image,
-        strength=0.8,  # Adjust strength for creativity
-        guidance_scale=7.5  # Adjust guidance scale for prompt adherence
-    ).images[0]
-    generated_image.save(item["output_image"])
-    print(f"Saved: {item['output_image']}")
\ No newline at end of file
+DEFAULT_MANIFEST = "covers.json"
+DEFAULT_STATE = "output/.generated.json"
+DEFAULT_LATENT_CACHE = ".latents"
+DEFAULT_MODEL = "stabilityai/stable-diffusion-xl-base-1.0"
+DEFAULT_PARAMETERS = {"strength": 0.8, "guidance_scale": 7.5, "num_inference_steps": 50, "seed": 0, "variants": 1}
+REQUIRED_FIELDS = ("input_image", "prompt", "output_image")
+BATCH_PARAMETERS = ("strength", "guidance_scale", "num_inference_steps")
+
+
+class ExecutionProfile:
+    """How the pipeline runs on a device: precision, memory savers and a step cap."""
+
+    def __init__(self, device, dtype, offload=False, xformers=False, attention_slicing=False, vae_tiling=False,
+                 max_steps=None):
+        self.device = device
+        self.dtype = dtype
+        self.offload = offload
+        self.xformers = xformers
+        self.attention_slicing = attention_slicing
+        self.vae_tiling = vae_tiling
+        self.max_steps = max_steps
+
+    def describe(self):
+        return f"{self.device}:{self.dtype}"
+
+    def steps(self, requested):
+        return min(requested, self.max_steps) if self.max_steps else requested
+
+
+def select_profile(requested, cpu_steps):
+    device = requested
+    if requested == "auto":
+        try:
+            import torch
+        except ImportError:
+            device = "cpu"
+        else:
+            if torch.cuda.is_available():
+                device = "cuda"
+            elif torch.backends.mps.is_available():
+                device = "mps"
+            else:
+                device = "cpu"
+
+    if device == "cuda":
+        return ExecutionProfile("cuda", "float16", offload=True, xformers=True)
+    if device == "mps":
+        return ExecutionProfile("mps", "float16", attention_slicing=True, vae_tiling=True)
+    # Half precision is slow or unsupported on CPUs; fewer steps keep a CPU run within minutes.
+    return ExecutionProfile("cpu", "float32", attention_slicing=True, vae_tiling=True, max_steps=cpu_steps)
+
+
+class DiffusersPipeline:
+    def __init__(self, model, profile):
+        # Imported here so dry runs and the stub pipeline work without torch or diffusers.
+        import torch
+        from diffusers import AutoPipelineForImage2Image
+
+        self.name = model
+        self.torch = torch
+        self.profile = profile
+        self.dtype = getattr(torch, profile.dtype)
+        self.latent_format = f"{model.replace('/', '--')}-{profile.dtype}"
+        self.latent_suffix = ".pt"
+        self.pipeline = AutoPipelineForImage2Image.from_pretrained(
+            model, torch_dtype=self.dtype, use_safetensors=True
+        )
+        if profile.offload:
+            self.pipeline.enable_model_cpu_offload()
+        else:
+            self.pipeline.to(profile.device)
+        if profile.xformers:
+            try:
+                self.pipeline.enable_xformers_memory_efficient_attention()
+            except Exception as error:
+                print(f"xformers is not available ({error}); using attention slicing")
+                self.pipeline.enable_attention_slicing()
+        if profile.attention_slicing:
+            self.pipeline.enable_attention_slicing()
+        if profile.vae_tiling:
+            self.pipeline.enable_vae_tiling()
+
+    def encode(self, image):
+        torch = self.torch
+        vae = self.pipeline.vae
+        device = self.pipeline._execution_device
+        dtype = self.dtype
+        # The SDXL VAE overflows in float16, which is why the pipeline itself encodes in float32.
+        if getattr(vae.config, "force_upcast", False) and dtype == torch.float16:
+            dtype = torch.float32
+        vae.to(device=device, dtype=dtype)
+        pixels = self.pipeline.image_processor.preprocess(image).to(device=device, dtype=dtype)
+        with torch.no_grad():
+            latents = vae.encode(pixels).latent_dist.mode() * vae.config.scaling_factor
+        vae.to(dtype=self.dtype)
+        return latents.to(dtype=self.dtype).cpu()
+
+    def save_latents(self, latents, path):
+        self.torch.save(latents, path)
+
+    def load_latents(self, path):
+        return self.torch.load(path)
+
+    def generate(self, prompts, latents, seeds, strength, guidance_scale, num_inference_steps):
+        # One CPU generator per image keeps each output reproducible regardless of its batch.
+        generators = [self.torch.Generator("cpu").manual_seed(seed) for seed in seeds]
+        # Four-channel tensors are taken as already encoded init images, so the VAE encode is skipped.
+        return self.pipeline(
+            prompt=prompts,
+            image=self.torch.cat(latents),
+            strength=strength,
+            guidance_scale=guidance_scale,
+            num_inference_steps=num_inference_steps,
+            generator=generators
+        ).images
+
+    def peak_memory(self):
+        if self.profile.device == "cuda":
+            return {"cuda_peak_mb": self.torch.cuda.max_memory_allocated() / 2 ** 20}
+        return {}
+
+
+class StubPipeline:
+    """Tints each input with a colour derived from its seed and prompt, for testing runs on a CPU.
+
+    Its "latents" are the input scaled down by eight, so the latent cache is exercised too.
+    """
+
+    name = "stub"
+    latent_format = "stub"
+    latent_suffix = ".png"
+
+    def encode(self, image):
+        return image.resize((max(1, image.width // 8), max(1, image.height // 8)))
+
+    def save_latents(self, latents, path):
+        latents.save(path)
+
+    def load_latents(self, path):
+        from PIL import Image
+        with Image.open(path) as latents:
+            return latents.convert("RGB")
+
+    def generate(self, prompts, latents, seeds, strength, guidance_scale, num_inference_steps):
+        from PIL import Image
+        results = []
+        for prompt, latent, seed in zip(prompts, latents, seeds):
+            rng = random.Random(f"{seed}:{prompt}")
+            image = latent.resize((latent.width * 8, latent.height * 8))
+            tint = Image.new("RGB", image.size, tuple(rng.randrange(256) for _ in range(3)))
+            results.append(Image.blend(image, tint, strength / 2))
+        return results
+
+    def peak_memory(self):
+        return {}
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def report(self, pipeline):
+        for name, seconds in self.seconds.items():
+            print(f"  {name}: {seconds:.2f}s over {self.counts[name]} calls")
+        # ru_maxrss is in kilobytes on Linux.
+        memory = {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+        memory.update(pipeline.peak_memory() if pipeline is not None else {})
+        print("  " + ", ".join(f"{name}: {value:.0f}" for name, value in memory.items()))
+
+
+class LatentCache:
+    """Encoded init images keyed by input hash, resolution and encoder.
+
+    Sweeps over one cover encode it once per run, and once ever when a cache directory is set.
+    """
+
+    def __init__(self, pipeline, timer, directory=None):
+        self.pipeline = pipeline
+        self.timer = timer
+        self.directory = directory
+        self.entries = {}
+        self.encoded = 0
+        self.reused = 0
+
+    def get(self, task):
+        from PIL import Image
+        with Image.open(task["input_image"]) as image:
+            width, height = image.size
+        key = f"{task['input_hash'][:32]}-{width}x{height}-{self.pipeline.latent_format}"
+        if key in self.entries:
+            self.reused += 1
+            return self.entries[key]
+
+        path = os.path.join(self.directory, key + self.pipeline.latent_suffix) if self.directory else None
+        if path and os.path.isfile(path):
+            with self.timer.stage("load_latents"):
+                latents = self.pipeline.load_latents(path)
+            self.reused += 1
+        else:
+            with self.timer.stage("load_image"):
+                image = Image.open(task["input_image"]).convert("RGB")
+            with self.timer.stage("encode"):
+                latents = self.pipeline.encode(image)
+            self.encoded += 1
+            if path:
+                os.makedirs(self.directory, exist_ok=True)
+                temp_path = f"{path[:-len(self.pipeline.latent_suffix)]}.partial{self.pipeline.latent_suffix}"
+                self.pipeline.save_latents(latents, temp_path)
+                os.replace(temp_path, path)
+        self.entries[key] = latents
+        return latents
+
+
+def load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as fh:
+        if path.lower().endswith(('.yaml', '.yml')):
+            import yaml
+            manifest = yaml.safe_load(fh)
+        else:
+            manifest = json.load(fh)
+
+    defaults = {**DEFAULT_PARAMETERS, **manifest.get("defaults", {})}
+    jobs = []
+    for index, entry in enumerate(manifest.get("jobs", [])):
+        missing = [field for field in REQUIRED_FIELDS if not entry.get(field)]
+        if missing:
+            raise ValueError(f"Job {index} in {path} is missing {', '.join(missing)}")
+        job = {**defaults, **entry}
+        job.setdefault("name", os.path.splitext(os.path.basename(job["output_image"]))[0])
+        jobs.extend(expand_sweep(job))
+    return manifest.get("model", DEFAULT_MODEL), jobs
+
+
+def expand_sweep(job):
+    """A job with lists of strengths, guidance scales or step counts becomes one job per combination."""
+    swept = [parameter for parameter in BATCH_PARAMETERS if isinstance(job[parameter], list)]
+    if not swept:
+        return [job]
+    root, extension = os.path.splitext(job["output_image"])
+    jobs = []
+    for values in itertools.product(*(job[parameter] for parameter in swept)):
+        suffix = "_".join(f"{parameter}{value}" for parameter, value in zip(swept, values))
+        jobs.append({
+            **job,
+            **dict(zip(swept, values)),
+            "name": f"{job['name']}_{suffix}",
+            "output_image": f"{root}_{suffix}{extension}"
+        })
+    return jobs
+
+
+def load_state(path):
+    if os.path.isfile(path):
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    return {}
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as fh:
+        json.dump(state, fh, indent=2)
+    os.replace(temp_path, path)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def variant_path(output_image, variant, variants):
+    if variants == 1:
+        return output_image
+    root, extension = os.path.splitext(output_image)
+    return f"{root}_{variant + 1}{extension}"
+
+
+def expand_tasks(jobs, pipeline_name, profile):
+    """One task per output image, with the fingerprint of everything that determines its pixels."""
+    input_hashes = {}
+    tasks = []
+    for job in jobs:
+        if job["input_image"] not in input_hashes:
+            input_hashes[job["input_image"]] = hash_file(job["input_image"])
+        for variant in range(job["variants"]):
+            task = {
+                "job": job["name"],
+                "input_image": job["input_image"],
+                "input_hash": input_hashes[job["input_image"]],
+                "output_image": variant_path(job["output_image"], variant, job["variants"]),
+                "prompt": job["prompt"],
+                "seed": job["seed"] + variant,
+                **{parameter: job[parameter] for parameter in BATCH_PARAMETERS}
+            }
+            task["num_inference_steps"] = profile.steps(task["num_inference_steps"])
+            fingerprint_fields = {
+                "pipeline": pipeline_name,
+                "execution": profile.describe(),
+                "input_hash": task["input_hash"],
+                **{key: task[key] for key in ("prompt", "seed", *BATCH_PARAMETERS)}
+            }
+            task["fingerprint"] = hashlib.sha256(
+                json.dumps(fingerprint_fields, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+            tasks.append(task)
+    return tasks
+
+
+def is_up_to_date(task, state):
+    return os.path.isfile(task["output_image"]) and state.get(task["output_image"]) == task["fingerprint"]
+
+
+def group_batches(tasks, batch_size):
+    from PIL import Image
+
+    # A batched call shares its sampling parameters, and its init images must be the same size.
+    groups = {}
+    for task in tasks:
+        with Image.open(task["input_image"]) as image:
+            size = image.size
+        key = (size, *(task[parameter] for parameter in BATCH_PARAMETERS))
+        groups.setdefault(key, []).append(task)
+    return [
+        group[start:start + batch_size]
+        for group in groups.values()
+        for start in range(0, len(group), batch_size)
+    ]
+
+
+def run_batch(pipeline, latent_cache, timer, batch):
+    latents = [latent_cache.get(task) for task in batch]
+    with timer.stage("generate"):
+        return pipeline.generate(
+            [task["prompt"] for task in batch],
+            latents,
+            [task["seed"] for task in batch],
+            **{parameter: batch[0][parameter] for parameter in BATCH_PARAMETERS}
+        )
+
+
+def save_image(image, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    root, extension = os.path.splitext(path)
+    # Written under a temporary name, so an interrupted save never looks like a finished output.
+    temp_path = f"{root}.partial{extension}"
+    image.save(temp_path)
+    os.replace(temp_path, path)
+
+
+def run(arguments):
+    model, jobs = load_manifest(arguments.manifest)
+    model = arguments.model or model
+    pipeline_name = "stub" if arguments.stub else model
+    profile = ExecutionProfile("cpu", "float32") if arguments.stub else select_profile(arguments.device, arguments.cpu_steps)
+    tasks = expand_tasks(jobs, pipeline_name, profile)
+    state = {} if arguments.force else load_state(arguments.state)
+
+    pending = [task for task in tasks if not is_up_to_date(task, state)]
+    batches = group_batches(pending, max(1, arguments.batch_size))
+    print(f"{len(tasks)} outputs: {len(tasks) - len(pending)} up to date, "
+          f"{len(pending)} to generate in {len(batches)} batches on {profile.describe()}")
+
+    if arguments.dry_run:
+        for batch in batches:
+            print("Would generate: " + ", ".join(task["output_image"] for task in batch))
+        return
+
+    if not batches:
+        return
+
+    timer = StageTimer()
+    # Load the model only when there is something to generate
+    with timer.stage("load_model"):
+        pipeline = StubPipeline() if arguments.stub else DiffusersPipeline(model, profile)
+    latent_cache = LatentCache(pipeline, timer, arguments.latent_cache or None)
+
+    for batch in batches:
+        print("Processing: " + ", ".join(task["input_image"] for task in batch))
+        images = run_batch(pipeline, latent_cache, timer, batch)
+        with timer.stage("save"):
+            for task, image in zip(batch, images):
+                save_image(image, task["output_image"])
+                state[task["output_image"]] = task["fingerprint"]
+                print(f"Saved: {task['output_image']}")
+            # Recorded after every batch, so a restarted run resumes with the next one.
+            save_state(arguments.state, state)
+
+    print(f"Init images encoded: {latent_cache.encoded}, reused: {latent_cache.reused}")
+    print("Stage timings:")
+    timer.report(pipeline)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate alternative media covers from a job manifest.")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="JSON or YAML job manifest.")
+    parser.add_argument("--state", default=DEFAULT_STATE, help="Fingerprints of finished outputs.")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be generated.")
+    parser.add_argument("--stub", action="store_true", help="Use a stand-in pipeline that needs no GPU or model.")
+    parser.add_argument("--force", action="store_true", help="Regenerate outputs that are up to date.")
+    parser.add_argument("--model", help="Overrides the manifest's model, e.g. a tiny pipeline for CPU tests.")
+    parser.add_argument("--device", default="auto", choices=("auto", "cuda", "mps", "cpu"))
+    parser.add_argument("--cpu-steps", type=int, default=20, help="Maximum inference steps on a CPU.")
+    parser.add_argument("--latent-cache", default=DEFAULT_LATENT_CACHE,
+                        help="Directory for encoded init images; an empty value keeps them in memory only.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_arguments())
@@ -1,7 +1,12 @@
-from langchain_openai import ChatOpenAI
-from langchain_classic.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate
-from config import API_KEY_OPENAI, MODEL_NAME
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from config import API_KEY_OPENAI, MODEL_NAME, STREAM_RESPONSES, AGENT_MODE
+from memory import TICKET_FIELD_PROMPTS
+from telemetry import TurnMetricsHandler
+from ratelimit import openai_client_settings
+
+AGENT_MODES = ("tool-calling", "retrieve-first")
 
 
 AGENT_INSTRUCTIONS = """As a virtual assistant at AutoSupport AI Ltd., your primary mission is assisting 
@@ -66,6 +71,8 @@ TICKET GENERATION PROCEDURE
   • Never fabricate or interpolate missing information
   • Examples of FORBIDDEN inputs: "John Doe", "user@example.com", "Sample Issue"
   • Maintain customer's exact terminology without paraphrasing
+  • After submission, share the returned ticket ID; use the ticket status tool when the
+    customer later asks about that ticket or its tracking link
 
 ═══════════════════════════════════════════════════════════════════════════════
 INTERACTION GUIDELINES  
@@ -90,42 +97,93 @@ Remember: Accuracy, transparency, and customer consent are paramount.
 ═══════════════════════════════════════════════════════════════════════════════
 """
 
+RETRIEVED_CONTEXT_INSTRUCTIONS = """The knowledge base has already been searched with the customer's latest message.
+Results:
+
+{retrieved_context}
+
+Answer from these results and cite them in the required source format. Call the knowledge base
+search tool only when the results above do not cover the question or a different topic has to be
+looked up. The ticket procedure above still applies unchanged."""
+
+SKIPPED_CONTEXT = "(No search was run: the customer is answering a support ticket question.)"
+
 
 def setup_llm_model():
+    from langchain_openai import ChatOpenAI
     model = ChatOpenAI(
         model_name=MODEL_NAME,
         temperature=0.1,
-        openai_api_key=API_KEY_OPENAI
+        openai_api_key=API_KEY_OPENAI,
+        **openai_client_settings()
     )
     return model
 
 
-def create_prompt_structure():
-    template = ChatPromptTemplate.from_messages([
+def create_summary_model():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model_name=MODEL_NAME,
+        temperature=0,
+        max_tokens=300,
+        openai_api_key=API_KEY_OPENAI,
+        **openai_client_settings()
+    )
+
+
+def create_prompt_structure(mode=AGENT_MODE):
+    messages = [
         ("system", AGENT_INSTRUCTIONS),
         ("placeholder", "{chat_history}"),
+    ]
+    if mode == "retrieve-first":
+        messages.append(("system", RETRIEVED_CONTEXT_INSTRUCTIONS))
+    messages.extend([
         ("human", "{input}"),
         ("placeholder", "{agent_scratchpad}"),
     ])
-    return template
+    return ChatPromptTemplate.from_messages(messages)
+
+
+def awaiting_ticket_field(chat_history):
+    last_reply = next((message.content for message in reversed(chat_history) if isinstance(message, AIMessage)), "")
+    return any(pattern.search(last_reply) for pattern in TICKET_FIELD_PROMPTS.values())
+
+
+def create_context_prefetch(search_tool):
+    def retrieve_context(inputs, config):
+        if awaiting_ticket_field(inputs.get("chat_history") or []):
+            return SKIPPED_CONTEXT
+        # Invoked as the tool itself so streaming status and telemetry treat it like a tool call.
+        return search_tool.invoke({"search_queries": [inputs["input"]]}, config=config)
+
+    return RunnableLambda(retrieve_context)
 
 
 class AgentBuilder:
-    def __init__(self):
+    def __init__(self, mode=AGENT_MODE, verbose=True):
+        if mode not in AGENT_MODES:
+            raise ValueError(f"Unknown agent mode: {mode}")
+        self.mode = mode
+        self.verbose = verbose
         self.model = None
         self.prompt = None
         self.tools = None
 
     def with_language_model(self):
+        from langchain_openai import ChatOpenAI
         self.model = ChatOpenAI(
             model_name=MODEL_NAME,
             temperature=0.1,
-            openai_api_key=API_KEY_OPENAI
+            openai_api_key=API_KEY_OPENAI,
+            streaming=STREAM_RESPONSES,
+            stream_usage=True,
+            **openai_client_settings()
         )
         return self
 
     def with_prompt_template(self):
-        self.prompt = create_prompt_structure()
+        self.prompt = create_prompt_structure(self.mode)
         return self
 
     def with_tools(self, tool_list):
@@ -135,6 +193,7 @@ class AgentBuilder:
     def build(self):
         if not all([self.model, self.prompt, self.tools]):
             raise ValueError("Agent builder requires model, prompt, and tools")
+        from langchain_classic.agents import create_tool_calling_agent, AgentExecutor
 
         agent_instance = create_tool_calling_agent(
             self.model,
@@ -142,18 +201,28 @@ class AgentBuilder:
             self.prompt
         )
 
-        return AgentExecutor(
+        executor = AgentExecutor(
             agent=agent_instance,
             tools=self.tools,
-            verbose=True,
+            verbose=self.verbose,
             handle_parsing_errors=True,
             max_iterations=10,
-            early_stopping_method="force"
+            early_stopping_method="force",
+            # The controller reads submitted ticket IDs from the ticket tool's output.
+            return_intermediate_steps=True
         )
+        if self.mode == "retrieve-first":
+            # Retrieval runs before the first LLM call, so the common question is answered in a
+            # single completion instead of one round to request the search and one to answer.
+            search_tool = next(tool for tool in self.tools if tool.name == "search_knowledge_base")
+            executor = RunnablePassthrough.assign(retrieved_context=create_context_prefetch(search_tool)) | executor
+
+        # Bound through the run config (not the constructor) so nested LLM and tool runs inherit it.
+        return executor.with_config(callbacks=[TurnMetricsHandler()])
 
 
-def create_agent_executor(tool_list):
-    builder = AgentBuilder()
+def create_agent_executor(tool_list, mode=AGENT_MODE):
+    builder = AgentBuilder(mode)
     return (builder
             .with_language_model()
             .with_prompt_template()
@@ -0,0 +1,171 @@
+import time
+import sqlite3
+import threading
+import numpy as np
+
+from config import PATH_ANSWER_CACHE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES
+from embeddings import pack_vector, unpack_vector
+from memory import TICKET_ID_PATTERN
+from telemetry import get_metrics_sink
+
+ERROR_PREFIX = "⚠️"
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def normalize_question(text):
+    return " ".join(text.lower().split())
+
+
+def is_cacheable_answer(answer):
+    # Only grounded answers are reused; fallbacks, errors and ticket confirmations are per-customer.
+    if not answer or answer.startswith(ERROR_PREFIX):
+        return False
+    if TICKET_ID_PATTERN.search(answer):
+        return False
+    return "Source:" in answer
+
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding, valid for a single index version.
+
+    Entries built against another index version are dropped on the next lookup, so any
+    document change invalidates the whole cache.
+    """
+
+    def __init__(self, embedding_function, db_path=PATH_ANSWER_CACHE, threshold=ANSWER_CACHE_THRESHOLD,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, metrics_sink=None):
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.metrics_sink = metrics_sink
+        self.lock = threading.Lock()
+        self.index_version = None
+        self.entry_ids = []
+        self.matrix = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "entry_id INTEGER PRIMARY KEY AUTOINCREMENT, index_version TEXT NOT NULL, question TEXT NOT NULL, "
+            "vector BLOB NOT NULL, answer TEXT NOT NULL, answer_seconds REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def embed_question(self, question):
+        vector = np.asarray(self.embedding_function.embed_query(normalize_question(question)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def load_version(self, index_version):
+        if index_version == self.index_version:
+            return
+        removed = self.connection.execute(
+            "DELETE FROM answers WHERE index_version != ?", (index_version,)
+        ).rowcount
+        self.connection.commit()
+        if removed:
+            print(f"[ANSWER_CACHE] Dropped {removed} answers from a previous index version")
+
+        rows = self.connection.execute(
+            "SELECT entry_id, vector FROM answers WHERE index_version = ? ORDER BY entry_id", (index_version,)
+        ).fetchall()
+        self.entry_ids = [entry_id for entry_id, _ in rows]
+        self.matrix = np.array([unpack_vector(blob) for _, blob in rows], dtype=np.float32) if rows else None
+        self.index_version = index_version
+
+    def lookup(self, question, index_version):
+        started = time.perf_counter()
+        query_vector = self.embed_question(question)
+        with self.lock:
+            self.load_version(index_version)
+            match = None
+            if self.matrix is not None and self.matrix.shape[1] == query_vector.shape[0]:
+                scores = self.matrix @ query_vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    match = self.connection.execute(
+                        "SELECT entry_id, answer, answer_seconds FROM answers WHERE entry_id = ?",
+                        (self.entry_ids[best],)
+                    ).fetchone()
+
+            if match is None:
+                self.misses += 1
+                self.report("miss")
+                return None
+
+            entry_id, answer, answer_seconds = match
+            self.connection.execute(
+                "UPDATE answers SET hits = hits + 1, last_used = ? WHERE entry_id = ?", (time.time(), entry_id)
+            )
+            self.connection.commit()
+            saved = max(0.0, answer_seconds - (time.perf_counter() - started))
+            self.hits += 1
+            self.saved_seconds += saved
+            self.report("hit", saved)
+            return answer
+
+    def store(self, question, answer, index_version, answer_seconds):
+        if not is_cacheable_answer(answer):
+            return False
+        query_vector = self.embed_question(question)
+        now = time.time()
+        with self.lock:
+            self.load_version(index_version)
+            cursor = self.connection.execute(
+                "INSERT INTO answers (index_version, question, vector, answer, answer_seconds, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (index_version, question, pack_vector(query_vector), answer, answer_seconds, now, now)
+            )
+            self.connection.commit()
+            self.entry_ids.append(cursor.lastrowid)
+            row = query_vector[None, :]
+            self.matrix = row if self.matrix is None else np.vstack((self.matrix, row))
+            if len(self.entry_ids) > self.max_entries:
+                self.evict_least_used()
+        return True
+
+    def evict_least_used(self):
+        excess = len(self.entry_ids) - self.max_entries
+        stale = self.connection.execute(
+            "SELECT entry_id FROM answers ORDER BY last_used ASC LIMIT ?", (excess,)
+        ).fetchall()
+        self.connection.executemany("DELETE FROM answers WHERE entry_id = ?", stale)
+        self.connection.commit()
+        stale_ids = {entry_id for entry_id, in stale}
+        keep = [row for row, entry_id in enumerate(self.entry_ids) if entry_id not in stale_ids]
+        self.entry_ids = [self.entry_ids[row] for row in keep]
+        self.matrix = self.matrix[keep] if keep else None
+
+    def report(self, result, saved_seconds=0.0):
+        sink = self.metrics_sink or get_metrics_sink()
+        try:
+            sink.record_counter("rag_answer_cache_lookups_total", result=result)
+            if saved_seconds:
+                sink.record_counter("rag_answer_cache_saved_seconds_total", round(saved_seconds, 4))
+        except OSError as error:
+            print(f"[ANSWER_CACHE] Failed to write cache metrics: {error}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entry_ids),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds
+        }
+
+
+def get_answer_cache(embedding_function):
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(embedding_function)
+        return _answer_cache
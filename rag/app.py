@@ -1,19 +1,73 @@
-import streamlit as st
-from langchain_core.messages import HumanMessage, AIMessage
-
-from config import API_KEY_OPENAI, TOKEN_GITHUB, REPOSITORY_GITHUB
-from vector import setup_vector_store
-from tools import build_agent_tools
-from agent import create_agent_executor
-from ui import setup_page_layout, show_header, render_sidebar, init_session_data, show_chat_messages
-
+import time
+SCRIPT_STARTED = time.perf_counter()
 
-class ApplicationController:
+import streamlit as st
+from config import (
+    API_KEY_OPENAI,
+    TOKEN_GITHUB,
+    REPOSITORY_GITHUB,
+    STREAM_RESPONSES,
+    AGENT_MODE,
+    MODEL_NAME,
+    WARMUP_ON_START
+)
+from core import AgentResources, ApplicationController
+from sessions import get_session_store
+from telemetry import StageTimer, get_metrics_sink
+from ui import (
+    setup_page_layout,
+    show_header,
+    render_sidebar,
+    init_session_data,
+    show_chat_messages,
+    ChatStreamHandler
+)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_agent_resources(index_version, _knowledge_base, agent_mode=AGENT_MODE, model_name=MODEL_NAME,
+                         streaming=STREAM_RESPONSES):
+    # The model settings are part of the cache key so a config change builds a new executor.
+    # Evicted entries release their index generation once no session is still using them.
+    resources = AgentResources(_knowledge_base, index_version, agent_mode)
+    if WARMUP_ON_START:
+        resources.warm_up()
+    return resources
+
+
+@st.cache_resource(show_spinner=False)
+def load_live_index():
+    from vector import LiveIndex
+    # The watcher thread only swaps in new index generations. Cached resources are built by the
+    # next script run that sees a new version, since st.cache_resource needs a script run context.
+    return LiveIndex().load().start_watcher()
+
+
+@st.cache_resource(show_spinner=False)
+def get_process_state():
+    return {"warm": False}
+
+
+def report_script_timing(timer):
+    state = get_process_state()
+    run_kind = "rerun" if state["warm"] else "cold"
+    state["warm"] = True
+
+    # Time spent answering is tracked per turn; this is the cost of re-running the script itself.
+    overhead = timer.total() - timer.stages.get("turn", 0.0)
+    label = "Rerun overhead" if run_kind == "rerun" else "Cold start"
+    print(f"[APP_MODULE] {label}: {overhead * 1000:.0f}ms ({timer.describe()})")
+    try:
+        get_metrics_sink().record_observation("rag_script_run_seconds", overhead, run=run_kind)
+    except OSError as error:
+        print(f"[APP_MODULE] Failed to record script timing: {error}")
+
+
+class StreamlitController(ApplicationController):
     def __init__(self):
+        super().__init__()
         self.validate_configuration()
         self.setup_interface()
-        self.knowledge_base = None
-        self.agent_executor = None
 
     def validate_configuration(self):
         required = [API_KEY_OPENAI, TOKEN_GITHUB, REPOSITORY_GITHUB]
@@ -27,64 +81,72 @@ class ApplicationController:
         render_sidebar()
 
     def initialize_system(self):
-        self.knowledge_base = setup_vector_store()
+        self.knowledge_base = load_live_index().current()
         if self.knowledge_base is None:
             st.warning("No documents found in **documents/** folder. Please add PDF or TXT files and refresh.")
             st.stop()
 
-        agent_tools = build_agent_tools(self.knowledge_base)
-        self.agent_executor = create_agent_executor(agent_tools)
-
-    def prepare_conversation_context(self):
-        messages = []
-        for entry in st.session_state.conversation_history:
-            if entry["role"] == "user":
-                messages.append(HumanMessage(content=entry["content"]))
-            else:
-                messages.append(AIMessage(content=entry["content"]))
-        return messages
-
-    def generate_response(self, query):
-        context = self.prepare_conversation_context()
+        # The lexical index is saved with the manifest version the store was synchronized to.
+        index_version = self.knowledge_base.lexical_index.version
+        self.attach_resources(load_agent_resources(index_version, self.knowledge_base))
 
+    def generate_response(self, query, history, window_state, history_offset):
         with st.spinner("Processing your request..."):
-            try:
-                result = self.agent_executor.invoke({
-                    "input": query,
-                    "chat_history": context
-                })
-                return result["output"]
-            except Exception as error:
-                return f"⚠️ An error occurred while processing your request.\n\nDetails: {error}"
+            return self.generate_answer(query, history, window_state, history_offset=history_offset)
+
+    def stream_response(self, query, history, window_state, history_offset):
+        stream_handler = ChatStreamHandler(st.empty(), st.empty())
+        response = self.generate_answer(query, history, window_state, [stream_handler], history_offset)
+        stream_handler.finish(response)
+        return response
 
     def handle_user_input(self):
         query = st.chat_input("How can I assist you with your Toyota today?")
 
         if query:
-            st.session_state.conversation_history.append({"role": "user", "content": query})
+            session_id = st.session_state.session_id
+            store = get_session_store()
+            history, window_state, history_offset = store.load_context(session_id)
+            history.append({"role": "user", "content": query})
 
             with st.chat_message("user"):
                 st.markdown(query)
 
-            response = self.generate_response(query)
+            cached_response = self.lookup_cached_answer(query, history, window_state, history_offset)
 
-            with st.chat_message("assistant"):
-                st.markdown(response)
+            if cached_response is not None:
+                response = cached_response
+                with st.chat_message("assistant"):
+                    st.markdown(response)
+            elif STREAM_RESPONSES:
+                with st.chat_message("assistant"):
+                    response = self.stream_response(query, history, window_state, history_offset)
+            else:
+                response = self.generate_response(query, history, window_state, history_offset)
 
-            st.session_state.conversation_history.append({"role": "assistant", "content": response})
+                with st.chat_message("assistant"):
+                    st.markdown(response)
 
-    def run(self):
+            store.append(session_id, [history[-1], {"role": "assistant", "content": response}], window_state)
+
+    def run(self, timer):
         init_session_data()
         self.initialize_system()
+        timer.mark("initialize")
         show_chat_messages()
+        timer.mark("history")
         self.handle_user_input()
+        timer.mark("turn")
 
 
 def main():
-    controller = ApplicationController()
-    controller.run()
+    timer = StageTimer(SCRIPT_STARTED)
+    timer.mark("imports")
+    controller = StreamlitController()
+    timer.mark("interface")
+    controller.run(timer)
+    report_script_timing(timer)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,583 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import textwrap
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+BENCHMARK_DIMENSIONS = 384
+BUILD_BATCH_ROWS = 20000
+RETRIEVAL_BATCH_QUERIES = 3
+
+CORPUS_MODELS = ("Camry", "Corolla", "RAV4", "Prius", "Highlander", "Tacoma", "Sienna", "Yaris")
+CORPUS_FACTS = (
+    ("oil change interval", "every {a},000 km or 12 months, whichever comes first"),
+    ("recommended tire pressure", "{b} psi front and rear, measured when the tires are cold"),
+    ("coolant capacity", "{c}.{a} litres of Toyota Super Long Life Coolant"),
+    ("brake fluid specification", "DOT {c} fluid, replaced every {c} years"),
+    ("maximum towing capacity", "{a}00 kg with a braked trailer"),
+    ("spark plug replacement interval", "every {b},000 km using iridium-tipped plugs"),
+    ("engine oil grade", "0W-{b} synthetic oil meeting API SP"),
+    ("cabin air filter interval", "every {a},000 km, or sooner on dusty roads")
+)
+CORPUS_FILLER = (
+    "Always park on level ground and apply the parking brake before servicing the vehicle.",
+    "Refer to the maintenance schedule in the warranty booklet for the complete service list.",
+    "If a warning light stays on after restarting, contact your authorized Toyota dealer.",
+    "Use only genuine Toyota parts to keep the warranty coverage valid.",
+    "Driving in extreme temperatures or towing heavy loads counts as severe service.",
+    "Dispose of used fluids at an approved recycling facility."
+)
+
+
+def percentile_ms(samples, percentile):
+    return float(np.percentile(np.asarray(samples) * 1000.0, percentile))
+
+
+def resident_memory_mb():
+    try:
+        with open("/proc/self/status", 'r', encoding='utf-8') as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def synthetic_batches(rows, dimensions, seed=7):
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, BUILD_BATCH_ROWS):
+        count = min(BUILD_BATCH_ROWS, rows - start)
+        vectors = rng.standard_normal((count, dimensions), dtype=np.float32)
+        texts = [f"Synthetic manual chunk {start + index}" for index in range(count)]
+        metadatas = [
+            {"source": f"documents/manual_{(start + index) % 50}.pdf", "page": (start + index) % 400}
+            for index in range(count)
+        ]
+        ids = [f"chunk-{start + index}" for index in range(count)]
+        yield texts, vectors, metadatas, ids
+
+
+def build_flat_index(index_path, rows, dimensions, quantized):
+    from flatstore import FlatVectorStore
+    store = FlatVectorStore(None, index_path=index_path, quantized=quantized)
+    for texts, vectors, metadatas, ids in synthetic_batches(rows, dimensions):
+        store.add_embeddings(texts, vectors, metadatas, ids)
+
+
+def build_chroma_index(index_path, rows, dimensions):
+    import chromadb
+    client = chromadb.PersistentClient(path=index_path)
+    collection = client.get_or_create_collection("benchmark", metadata={"hnsw:space": "cosine"})
+    batch_limit = client.get_max_batch_size()
+    for texts, vectors, metadatas, ids in synthetic_batches(rows, dimensions):
+        for start in range(0, len(ids), batch_limit):
+            stop = start + batch_limit
+            collection.add(
+                ids=ids[start:stop],
+                embeddings=vectors[start:stop],
+                documents=texts[start:stop],
+                metadatas=metadatas[start:stop]
+            )
+
+
+def probe_store(backend, index_path, queries_path, k):
+    queries = np.load(queries_path)
+    # Only the probed backend is imported, so its memory is not inflated by the other one.
+    if backend == "chroma":
+        import chromadb
+    else:
+        from flatstore import FlatVectorStore
+    baseline_mb = resident_memory_mb()
+
+    started = time.perf_counter()
+    if backend == "chroma":
+        collection = chromadb.PersistentClient(path=index_path).get_collection("benchmark")
+        search = lambda vector: collection.query(query_embeddings=[vector], n_results=k)
+    else:
+        store = FlatVectorStore(None, index_path=index_path)
+        search = lambda vector: store.similarity_search_by_vector(vector, k=k)
+    search(queries[0])
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for vector in queries:
+        query_started = time.perf_counter()
+        search(vector)
+        latencies.append(time.perf_counter() - query_started)
+
+    return {
+        "load_seconds": load_seconds,
+        "resident_mb": resident_memory_mb() - baseline_mb,
+        "query_p50_ms": percentile_ms(latencies, 50),
+        "query_p99_ms": percentile_ms(latencies, 99),
+        "queries": len(latencies)
+    }
+
+
+def run_probe_subprocess(backend, index_path, queries_path, k):
+    # Each probe runs in a fresh interpreter so load time and memory reflect a cold start.
+    command = [
+        sys.executable, os.path.abspath(__file__), "store-probe",
+        "--backend", backend, "--path", index_path, "--queries", queries_path, "--k", str(k)
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark_vector_stores(sizes, backends, dimensions, query_count, k):
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="store-benchmark-")
+    try:
+        queries_path = os.path.join(work_dir, "queries.npy")
+        np.save(queries_path, np.random.default_rng(11).standard_normal((query_count, dimensions), dtype=np.float32))
+
+        for rows in sizes:
+            for backend in backends:
+                index_path = os.path.join(work_dir, f"{backend}-{rows}")
+                started = time.perf_counter()
+                if backend == "chroma":
+                    build_chroma_index(index_path, rows, dimensions)
+                else:
+                    build_flat_index(index_path, rows, dimensions, quantized=backend == "flat-int8")
+                build_seconds = time.perf_counter() - started
+
+                probe = run_probe_subprocess(backend, index_path, queries_path, k)
+                results.append({"backend": backend, "chunks": rows, "build_seconds": build_seconds, **probe})
+                print(f"[BENCHMARK] {json.dumps(results[-1])}", file=sys.stderr)
+                shutil.rmtree(index_path, ignore_errors=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    # Minimal single-font PDF, enough for PyPDFLoader to extract one document per page.
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    }
+    page_ids = []
+    for lines in pages:
+        page_id = 4 + 2 * len(page_ids)
+        text = " ".join(f"({escape_pdf_text(line)}) Tj T*" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} ET".encode("latin-1", "replace")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        ).encode("ascii")
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("ascii")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, 'wb') as fh:
+        fh.write(output)
+
+
+def synthetic_fact(rng):
+    topic, template = rng.choice(CORPUS_FACTS)
+    model = rng.choice(CORPUS_MODELS)
+    year = rng.randint(2012, 2024)
+    value = template.format(a=rng.randint(5, 15), b=rng.randint(20, 40), c=rng.randint(3, 6))
+    return f"What is the {topic} for the {year} {model}?", f"For the {year} {model}, the {topic} is {value}."
+
+
+def generate_corpus(directory, pdf_files, pages_per_pdf, txt_files, seed=5):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    queries = []
+
+    for file_index in range(pdf_files):
+        filename = f"owner_manual_{file_index:03d}.pdf"
+        pages = []
+        for page_number in range(pages_per_pdf):
+            paragraphs = []
+            for _ in range(5):
+                question, fact = synthetic_fact(rng)
+                queries.append({"question": question, "source": filename, "page": page_number})
+                paragraphs.append(" ".join([fact] + rng.sample(CORPUS_FILLER, 3)))
+            pages.append([line for paragraph in paragraphs for line in textwrap.wrap(paragraph, 110) + [""]])
+        write_pdf(os.path.join(directory, filename), pages)
+
+    for file_index in range(txt_files):
+        filename = f"support_faq_{file_index:03d}.txt"
+        entries = []
+        for _ in range(40):
+            question, fact = synthetic_fact(rng)
+            queries.append({"question": question, "source": filename, "page": None})
+            entries.append(f"Q: {question}\nA: {fact} {rng.choice(CORPUS_FILLER)}")
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as fh:
+            fh.write("\n\n".join(entries) + "\n")
+
+    rng.shuffle(queries)
+    return {
+        "pdf_files": pdf_files,
+        "txt_files": txt_files,
+        "pages": pdf_files * pages_per_pdf + txt_files,
+        "bytes": sum(entry.stat().st_size for entry in os.scandir(directory)),
+        "queries": queries
+    }
+
+
+def reserve_local_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def prepare_offline_environment(workspace, github_url, vector_store):
+    # Must run before any module that imports config, which reads these at import time.
+    os.environ.update({
+        "OPENAI_API_KEY": "offline-benchmark",
+        "GITHUB_TOKEN": "offline-benchmark",
+        "GITHUB_USER": "benchmark",
+        "GITHUB_REPO": "support",
+        "GITHUB_API_URL": github_url,
+        "EMBEDDING_BACKEND": "hashing",
+        "VECTOR_STORE_BACKEND": vector_store,
+        "ANSWER_CACHE_ENABLED": "false",
+        "STREAM_RESPONSES": "false"
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs(workspace, exist_ok=True)
+    os.chdir(workspace)
+
+
+def benchmark_ingestion(corpus):
+    from vector import VectorStoreManager
+    started = time.perf_counter()
+    manager = VectorStoreManager(interactive=False)
+    database = manager.get_or_create_database()
+    build_seconds = time.perf_counter() - started
+    chunks = sum(len(entry["chunk_ids"]) for entry in manager.manifest.files.values())
+
+    started = time.perf_counter()
+    VectorStoreManager(interactive=False).get_or_create_database()
+    resync_seconds = time.perf_counter() - started
+
+    return database, {
+        "files": corpus["pdf_files"] + corpus["txt_files"],
+        "pages": corpus["pages"],
+        "chunks": chunks,
+        "chunking": manager.processor.chunking,
+        "build_seconds": build_seconds,
+        "pages_per_second": corpus["pages"] / build_seconds,
+        "chunks_per_second": chunks / build_seconds,
+        "unchanged_resync_seconds": resync_seconds
+    }
+
+
+def latency_summary(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": float(np.mean(samples) * 1000.0) if samples else 0.0,
+        "p50_ms": percentile_ms(samples, 50) if samples else 0.0,
+        "p95_ms": percentile_ms(samples, 95) if samples else 0.0,
+        "p99_ms": percentile_ms(samples, 99) if samples else 0.0
+    }
+
+
+def benchmark_retrieval(database, queries):
+    from tools import ToolFactory
+    factory = ToolFactory(database)
+    factory.retrieve_documents(queries[0]["question"])
+
+    single, found = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        documents = factory.retrieve_documents(query["question"])
+        single.append(time.perf_counter() - started)
+        found += any(os.path.basename(doc.metadata.get("source", "")) == query["source"] for doc in documents)
+
+    batched = []
+    for start in range(0, len(queries) - RETRIEVAL_BATCH_QUERIES + 1, RETRIEVAL_BATCH_QUERIES):
+        group = [query["question"] for query in queries[start:start + RETRIEVAL_BATCH_QUERIES]]
+        started = time.perf_counter()
+        factory.retrieve_documents_batch(group)
+        batched.append(time.perf_counter() - started)
+
+    return {
+        "single_query": latency_summary(single),
+        f"batch_of_{RETRIEVAL_BATCH_QUERIES}": latency_summary(batched),
+        "source_hit_rate": found / len(queries)
+    }
+
+
+class SimulatedSession:
+    """Replays what ApplicationController does for one Streamlit session, without the UI."""
+
+    def __init__(self, executor, window):
+        from memory import new_window_state
+        self.executor = executor
+        self.window = window
+        self.history = []
+        self.window_state = new_window_state()
+
+    def turn(self, query):
+        from core import confirm_submitted_tickets
+        started = time.perf_counter()
+        self.history.append({"role": "user", "content": query})
+        context = self.window.build_messages(self.history[:-1], self.window_state)
+        result = self.executor.invoke({"input": query, "chat_history": context})
+        response = confirm_submitted_tickets(result["output"], result.get("intermediate_steps", []))
+        self.history.append({"role": "assistant", "content": response})
+        return time.perf_counter() - started
+
+
+def build_offline_agent(database, mode, llm_latency):
+    from fakes import FakeSupportChatModel
+    from agent import AgentBuilder
+    from tools import build_agent_tools
+    builder = AgentBuilder(mode, verbose=False)
+    builder.model = FakeSupportChatModel(latency_seconds=llm_latency)
+    return builder.with_prompt_template().with_tools(build_agent_tools(database)).build()
+
+
+def read_turn_records(start_line):
+    path = os.path.join("telemetry", "turns.jsonl")
+    if not os.path.isfile(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as fh:
+        return [json.loads(line) for line in fh.readlines()[start_line:]]
+
+
+def summarize_turn_records(records):
+    if not records:
+        return {}
+    return {
+        "mean_iterations": float(np.mean([record["iterations"] for record in records])),
+        "mean_prompt_tokens": float(np.mean([record["prompt_tokens"] for record in records])),
+        "mean_completion_tokens": float(np.mean([record["completion_tokens"] for record in records]))
+    }
+
+
+def benchmark_turns(database, queries, mode, llm_latency, turns):
+    from fakes import FakeSupportChatModel
+    from memory import ConversationWindow
+    executor = build_offline_agent(database, mode, llm_latency)
+    session = SimulatedSession(executor, ConversationWindow(FakeSupportChatModel(latency_seconds=llm_latency)))
+
+    first_record = len(read_turn_records(0))
+    latencies = [session.turn(query["question"]) for query in queries[:turns]]
+    return {"mode": mode, **latency_summary(latencies), **summarize_turn_records(read_turn_records(first_record))}
+
+
+def count_tickets_by_status():
+    from ticket import get_ticket_outbox
+    outbox = get_ticket_outbox()
+    with outbox.lock:
+        rows = outbox.connection.execute(
+            "SELECT status, COUNT(*), AVG(updated_at - created_at) FROM tickets GROUP BY status"
+        ).fetchall()
+    return {status: {"count": count, "mean_seconds": mean_seconds} for status, count, mean_seconds in rows}
+
+
+def wait_for_ticket_delivery(expected, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        statuses = count_tickets_by_status()
+        if sum(entry["count"] for name, entry in statuses.items() if name in ("delivered", "dead")) >= expected:
+            return statuses
+        time.sleep(0.1)
+    return count_tickets_by_status()
+
+
+def benchmark_sessions(database, queries, mode, llm_latency, session_counts, turns_per_session, github):
+    from fakes import FakeSupportChatModel, TICKET_REQUEST_PREFIX
+    from memory import ConversationWindow
+    executor = build_offline_agent(database, mode, llm_latency)
+    window = ConversationWindow(FakeSupportChatModel(latency_seconds=llm_latency))
+    results = []
+    tickets_opened = 0
+
+    for session_count in session_counts:
+        latencies = []
+        latencies_lock = threading.Lock()
+        run_tag = f"{session_count}-{time.time_ns()}"
+
+        def run_session(session_index):
+            session = SimulatedSession(executor, window)
+            offset = session_index * turns_per_session
+            script = [query["question"] for query in queries[offset:offset + turns_per_session]]
+            script.append(f"{TICKET_REQUEST_PREFIX} Warning light on (session {run_tag}-{session_index})")
+            for query in script:
+                seconds = session.turn(query)
+                with latencies_lock:
+                    latencies.append(seconds)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=session_count) as pool:
+            list(pool.map(run_session, range(session_count)))
+        wall_seconds = time.perf_counter() - started
+        tickets_opened += session_count
+
+        results.append({
+            "sessions": session_count,
+            "turns": len(latencies),
+            "wall_seconds": wall_seconds,
+            "turns_per_second": len(latencies) / wall_seconds,
+            **latency_summary(latencies)
+        })
+        print(f"[BENCHMARK] {json.dumps(results[-1])}", file=sys.stderr)
+
+    return {
+        "mode": mode,
+        "runs": results,
+        "tickets": wait_for_ticket_delivery(tickets_opened),
+        "github_requests": github.requests
+    }
+
+
+def benchmark_pipeline(arguments):
+    source_dir = os.getcwd()
+    workspace = arguments.workspace or tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    github_port = reserve_local_port()
+    prepare_offline_environment(workspace, f"http://127.0.0.1:{github_port}", arguments.vector_store)
+
+    from fakes import FakeGitHubServer
+    github = FakeGitHubServer(failure_rate=arguments.github_failure_rate, port=github_port).start()
+    try:
+        corpus = generate_corpus("documents", arguments.pdfs, arguments.pages, arguments.txts)
+        queries = corpus.pop("queries")
+        print(f"[BENCHMARK] corpus: {json.dumps(corpus)}", file=sys.stderr)
+
+        database, ingestion = benchmark_ingestion(corpus)
+        print(f"[BENCHMARK] ingestion: {json.dumps(ingestion)}", file=sys.stderr)
+        retrieval = benchmark_retrieval(database, queries[:arguments.queries])
+        print(f"[BENCHMARK] retrieval: {json.dumps(retrieval)}", file=sys.stderr)
+
+        llm_latency = arguments.llm_latency_ms / 1000.0
+        modes = arguments.modes.split(",")
+        turns = [benchmark_turns(database, queries, mode, llm_latency, arguments.turns) for mode in modes]
+        sessions = benchmark_sessions(
+            database, queries, modes[0], llm_latency,
+            [int(count) for count in arguments.sessions.split(",")], arguments.turns_per_session, github
+        )
+        return {
+            "settings": {key: value for key, value in vars(arguments).items() if key != "command"},
+            "corpus": corpus,
+            "ingestion": ingestion,
+            "retrieval": retrieval,
+            "turns": turns,
+            "concurrent_sessions": sessions
+        }
+    finally:
+        github.stop()
+        os.chdir(source_dir)
+        if not arguments.workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+def current_commit():
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def write_results(results, output_path):
+    payload = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": current_commit(), "results": results}
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as fh:
+            json.dump(payload, fh, indent=2)
+    print(json.dumps(payload, indent=2))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks for the support assistant.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    store = commands.add_parser("store", help="Compare vector store load time, memory and query latency.")
+    store.add_argument("--sizes", default="10000,100000,1000000")
+    store.add_argument("--backends", default="chroma,flat,flat-int8")
+    store.add_argument("--dimensions", type=int, default=BENCHMARK_DIMENSIONS)
+    store.add_argument("--queries", type=int, default=200)
+    store.add_argument("--k", type=int, default=4)
+    store.add_argument("--output", default="benchmark_results/store.json")
+
+    corpus = commands.add_parser("corpus", help="Write a synthetic PDF/TXT corpus shaped like documents/.")
+    corpus.add_argument("--output", default="benchmark_corpus")
+    corpus.add_argument("--pdfs", type=int, default=40)
+    corpus.add_argument("--pages", type=int, default=50)
+    corpus.add_argument("--txts", type=int, default=20)
+
+    pipeline = commands.add_parser(
+        "pipeline", help="Ingestion, retrieval, turn latency and concurrent sessions with fake LLM and GitHub."
+    )
+    pipeline.add_argument("--pdfs", type=int, default=40)
+    pipeline.add_argument("--pages", type=int, default=50)
+    pipeline.add_argument("--txts", type=int, default=20)
+    pipeline.add_argument("--vector-store", default="flat")
+    pipeline.add_argument("--queries", type=int, default=500)
+    pipeline.add_argument("--modes", default="retrieve-first,tool-calling")
+    pipeline.add_argument("--turns", type=int, default=30)
+    pipeline.add_argument("--sessions", default="1,4,16")
+    pipeline.add_argument("--turns-per-session", type=int, default=5)
+    pipeline.add_argument("--llm-latency-ms", type=float, default=200.0)
+    pipeline.add_argument("--github-failure-rate", type=float, default=0.0)
+    pipeline.add_argument("--workspace", help="Keep the generated corpus and index in this directory.")
+    pipeline.add_argument("--output", default="benchmark_results/pipeline.json")
+
+    probe = commands.add_parser("store-probe")
+    probe.add_argument("--backend", required=True)
+    probe.add_argument("--path", required=True)
+    probe.add_argument("--queries", required=True)
+    probe.add_argument("--k", type=int, default=4)
+
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    if arguments.command == "store-probe":
+        print(json.dumps(probe_store(arguments.backend, arguments.path, arguments.queries, arguments.k)))
+        return
+
+    if arguments.command == "store":
+        sizes = [int(size) for size in arguments.sizes.split(",")]
+        backends = arguments.backends.split(",")
+        results = benchmark_vector_stores(sizes, backends, arguments.dimensions, arguments.queries, arguments.k)
+        write_results(results, arguments.output)
+
+    if arguments.command == "corpus":
+        corpus = generate_corpus(arguments.output, arguments.pdfs, arguments.pages, arguments.txts)
+        with open(os.path.join(arguments.output, "queries.json"), 'w', encoding='utf-8') as fh:
+            json.dump(corpus.pop("queries"), fh, indent=2)
+        print(json.dumps(corpus, indent=2))
+
+    if arguments.command == "pipeline":
+        write_results(benchmark_pipeline(arguments), arguments.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+
+def chroma_where(shard_filter):
+    # Chroma takes one condition per "where" clause; lists of allowed values become "$in".
+    if not shard_filter:
+        return None
+    clauses = [
+        {key: {"$in": list(value)} if isinstance(value, (list, tuple, set)) else value}
+        for key, value in shard_filter.items()
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class BatchedChroma(Chroma):
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return super().similarity_search_by_vector(embedding, k=k, filter=chroma_where(filter), **kwargs)
+
+    def similarity_search_by_vectors(self, embeddings, k=4, filter=None):
+        results = self._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=chroma_where(filter),
+            include=["documents", "metadatas"]
+        )
+        return [
+            [
+                Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
@@ -0,0 +1,253 @@
+import re
+import hashlib
+from collections import Counter
+import numpy as np
+from langchain_core.documents import Document
+
+from config import (
+    TEXT_CHUNK_SIZE,
+    TEXT_CHUNK_OVERLAP,
+    CHUNKING_STRATEGY,
+    CHUNK_DEDUP_ENABLED,
+    CHUNK_DEDUP_MAX_DISTANCE,
+    BOILERPLATE_MIN_PAGE_RATIO
+)
+from lexical import tokenize
+from routing import DocumentTagger, TAGGING_VERSION, QUESTION_PATTERN
+
+FAQ_SECTION_PATTERN = re.compile(r"^===\s*(.+?)\s*===\s*$")
+NUMBERED_HEADING_PATTERN = re.compile(r"^\d+(?:[-.]\d+)*\.?\s+[A-Za-z]")
+DIGITS_PATTERN = re.compile(r"\d+")
+SIMHASH_BANDS = 4
+
+
+class RecursiveChunker:
+    def __init__(self, chunk_size=TEXT_CHUNK_SIZE, chunk_overlap=TEXT_CHUNK_OVERLAP):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        self.chunk_size = chunk_size
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def accepts(self, source, documents):
+        return True
+
+    def split(self, documents):
+        return self.splitter.split_documents(documents)
+
+    def pack(self, blocks, metadata, prefix=""):
+        """Joins consecutive blocks into chunks of up to ``chunk_size`` without splitting a block.
+
+        Only a block that is larger than a chunk on its own is cut with the recursive splitter.
+        """
+        chunks = []
+        current = []
+        length = len(prefix)
+
+        def flush():
+            if current:
+                chunks.append(Document(page_content=prefix + "\n\n".join(current), metadata=dict(metadata)))
+                current.clear()
+
+        for block in blocks:
+            if len(prefix) + len(block) > self.chunk_size:
+                flush()
+                length = len(prefix)
+                for piece in self.splitter.split_text(block):
+                    chunks.append(Document(page_content=prefix + piece, metadata=dict(metadata)))
+                continue
+            if current and length + len(block) + 2 > self.chunk_size:
+                flush()
+                length = len(prefix)
+            current.append(block)
+            length += len(block) + 2
+        flush()
+        return chunks
+
+
+class QAPairChunker(RecursiveChunker):
+    """FAQ text: chunks hold whole question/answer pairs of one ``=== SECTION ===``."""
+
+    def accepts(self, source, documents):
+        text = "\n".join(doc.page_content for doc in documents)
+        return source.lower().endswith('.txt') and len(QUESTION_PATTERN.findall(text)) >= 2
+
+    def split_sections(self, text):
+        section, blocks, current = None, [], []
+        for line in text.splitlines():
+            heading = FAQ_SECTION_PATTERN.match(line.strip())
+            if heading or QUESTION_PATTERN.match(line):
+                if current:
+                    blocks.append("\n".join(current).strip())
+                    current = []
+                if heading:
+                    if blocks:
+                        yield section, [block for block in blocks if block]
+                    section, blocks = heading.group(1), []
+                    continue
+            current.append(line)
+        if current:
+            blocks.append("\n".join(current).strip())
+        if blocks:
+            yield section, [block for block in blocks if block]
+
+    def split(self, documents):
+        chunks = []
+        for document in documents:
+            for section, blocks in self.split_sections(document.page_content):
+                metadata = dict(document.metadata)
+                if section:
+                    metadata["section"] = section
+                prefix = f"{section}\n" if section else ""
+                chunks.extend(self.pack(blocks, metadata, prefix))
+        return chunks
+
+
+class SectionChunker(RecursiveChunker):
+    """Manual pages: drops repeated headers and footers and splits each page at its headings.
+
+    Chunks never span pages, so the ``page`` metadata used for citations stays exact. A page
+    that continues a section from the previous page starts with that section's heading.
+    """
+
+    def __init__(self, chunk_size=TEXT_CHUNK_SIZE, chunk_overlap=TEXT_CHUNK_OVERLAP,
+                 boilerplate_ratio=BOILERPLATE_MIN_PAGE_RATIO):
+        super().__init__(chunk_size, chunk_overlap)
+        self.boilerplate_ratio = boilerplate_ratio
+
+    def accepts(self, source, documents):
+        return source.lower().endswith('.pdf')
+
+    def normalize_line(self, line):
+        # Page numbers differ between otherwise identical running headers and footers.
+        return DIGITS_PATTERN.sub("#", " ".join(line.split()))
+
+    def find_boilerplate(self, documents):
+        if len(documents) < 3:
+            return set()
+        page_counts = Counter()
+        for document in documents:
+            page_counts.update({self.normalize_line(line) for line in document.page_content.splitlines() if line.strip()})
+        threshold = max(3, self.boilerplate_ratio * len(documents))
+        return {line for line, count in page_counts.items() if count >= threshold}
+
+    def is_heading(self, line):
+        if not 3 <= len(line) <= 80 or line[-1] in ".,;:":
+            return False
+        if NUMBERED_HEADING_PATTERN.match(line):
+            return True
+        letters = [char for char in line if char.isalpha()]
+        return len(letters) >= 3 and line.isupper()
+
+    def split(self, documents):
+        boilerplate = self.find_boilerplate(documents)
+        chunks = []
+        heading = None
+        for document in documents:
+            sections = []
+            current = []
+            continued_heading = heading
+            for line in document.page_content.splitlines():
+                line = line.strip()
+                if not line or self.normalize_line(line) in boilerplate:
+                    continue
+                if self.is_heading(line):
+                    if current:
+                        sections.append("\n".join(current))
+                    current = []
+                    heading = line
+                current.append(line)
+            if current:
+                sections.append("\n".join(current))
+            if not sections:
+                continue
+
+            first_line = sections[0].split("\n", 1)[0]
+            section = first_line if self.is_heading(first_line) else continued_heading
+            if section != first_line and section:
+                sections[0] = f"{section}\n{sections[0]}"
+
+            metadata = dict(document.metadata)
+            if section:
+                metadata["section"] = section
+            chunks.extend(self.pack(sections, metadata))
+        return chunks
+
+
+def simhash(text):
+    tokens = tokenize(text)
+    features = [" ".join(tokens[index:index + 3]) for index in range(max(1, len(tokens) - 2))]
+    digests = b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    votes = bits.sum(axis=0) * 2 > len(features)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+class NearDuplicateFilter:
+    """Drops chunks whose 64-bit SimHash is within ``max_distance`` bits of an earlier chunk.
+
+    Fingerprints are indexed in four 16-bit bands; any two within three bits share a band.
+    """
+
+    def __init__(self, max_distance=CHUNK_DEDUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = {}
+
+    def band_keys(self, fingerprint):
+        return [(band, (fingerprint >> (band * 16)) & 0xFFFF) for band in range(SIMHASH_BANDS)]
+
+    def is_duplicate(self, fingerprint):
+        for key in self.band_keys(fingerprint):
+            for candidate in self.bands.get(key, ()):
+                if bin(fingerprint ^ candidate).count("1") <= self.max_distance:
+                    return True
+        for key in self.band_keys(fingerprint):
+            self.bands.setdefault(key, []).append(fingerprint)
+        return False
+
+    def filter(self, chunks):
+        return [chunk for chunk in chunks if not self.is_duplicate(simhash(chunk.page_content))]
+
+
+class DocumentChunker:
+    """Picks the first chunker that accepts a file, then removes near-duplicate chunks.
+
+    Duplicates are only removed within one file; the manifest tracks chunks per file, so a
+    chunk dropped in favour of another file's copy would vanish when that file is removed.
+    """
+
+    def __init__(self, strategy=CHUNKING_STRATEGY, dedupe=CHUNK_DEDUP_ENABLED, chunk_size=TEXT_CHUNK_SIZE,
+                 chunk_overlap=TEXT_CHUNK_OVERLAP):
+        self.strategy = strategy
+        self.dedupe = dedupe
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.fallback = RecursiveChunker(chunk_size, chunk_overlap)
+        self.tagger = DocumentTagger()
+        if strategy == "structured":
+            self.chunkers = [QAPairChunker(chunk_size, chunk_overlap), SectionChunker(chunk_size, chunk_overlap)]
+        elif strategy == "recursive":
+            self.chunkers = []
+        else:
+            raise ValueError(f"Unknown chunking strategy: {strategy}")
+
+    def describe(self):
+        description = f"{self.strategy}:{self.chunk_size}:{self.chunk_overlap}:{TAGGING_VERSION}"
+        return f"{description}:dedup{CHUNK_DEDUP_MAX_DISTANCE}" if self.dedupe else description
+
+    def select_chunker(self, source, documents):
+        return next((chunker for chunker in self.chunkers if chunker.accepts(source, documents)), self.fallback)
+
+    def split_file(self, documents):
+        if not documents:
+            return []
+        source = documents[0].metadata.get("source", "")
+        chunks = self.select_chunker(source, documents).split(documents)
+        tags = self.tagger.tag_file(source, documents)
+        for chunk in chunks:
+            chunk.metadata.update(tags)
+        return NearDuplicateFilter().filter(chunks) if self.dedupe else chunks
+
+    def split_documents(self, documents):
+        by_source = {}
+        for document in documents:
+            by_source.setdefault(document.metadata.get("source", ""), []).append(document)
+        return [chunk for file_documents in by_source.values() for chunk in self.split_file(file_documents)]
@@ -0,0 +1,165 @@
+import re
+import math
+from collections import Counter
+
+from config import SEARCH_CONTEXT_TOKEN_BUDGET, SEARCH_MMR_LAMBDA
+from lexical import tokenize, STOP_WORDS
+from memory import count_tokens
+from routing import QUESTION_PATTERN
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+OMISSION_MARKER = "…"
+# Chunks this similar to one already selected add no information (overlapping pages, copies).
+REDUNDANCY_CUTOFF = 0.9
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.split(text) if sentence and sentence.strip()]
+
+
+def split_passages(text):
+    """Splits chunk text into sentences, keeping each FAQ question together with its answer."""
+    passages = []
+    in_answer = False
+    for sentence in split_sentences(text):
+        if QUESTION_PATTERN.match(sentence):
+            passages.append(sentence)
+            in_answer = True
+        elif in_answer:
+            passages[-1] += " " + sentence
+        else:
+            passages.append(sentence)
+    return passages
+
+
+def is_title(line):
+    letters = [character for character in line if character.isalpha()]
+    return bool(letters) and not any(character.islower() for character in letters)
+
+
+def has_body(text):
+    # Chunks made only of capitalised titles, such as a document's name, answer nothing.
+    return any(line.strip() and not is_title(line) for line in text.splitlines())
+
+
+def term_vector(text):
+    return Counter(term for term in tokenize(text) if term not in STOP_WORDS)
+
+
+def cosine_similarity(first, second):
+    if not first or not second:
+        return 0.0
+    dot = sum(count * second.get(term, 0) for term, count in first.items())
+    norms = math.sqrt(sum(v * v for v in first.values())) * math.sqrt(sum(v * v for v in second.values()))
+    return dot / norms
+
+
+class ContextCompressor:
+    """Turns retrieved chunks into search tool output that fits a token budget.
+
+    Chunks are re-ordered with maximal marginal relevance: retrieval rank stands in for
+    relevance and term-vector cosine for redundancy. Only when the chunks exceed the budget is
+    each one cut down: its best sentence by query terms (weighted by the lexical index's IDF)
+    comes first, then its other sentences in document order. An FAQ question is never separated
+    from its answer, and every included chunk keeps its citation header so answers can still
+    name document and page.
+    """
+
+    def __init__(self, lexical_index=None, token_budget=SEARCH_CONTEXT_TOKEN_BUDGET, mmr_lambda=SEARCH_MMR_LAMBDA):
+        self.lexical_index = lexical_index
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+
+    def diversify(self, documents, limit):
+        vectors = [term_vector(doc.page_content) for doc in documents]
+        remaining = list(range(len(documents)))
+        selected = []
+        while remaining and len(selected) < limit:
+            redundancy = {
+                index: max((cosine_similarity(vectors[index], vectors[chosen]) for chosen in selected), default=0.0)
+                for index in remaining
+            }
+
+            def marginal_relevance(index):
+                relevance = 1.0 - index / len(documents)
+                return self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy[index]
+
+            best = max(remaining, key=marginal_relevance)
+            remaining.remove(best)
+            if redundancy[best] < REDUNDANCY_CUTOFF:
+                selected.append(best)
+        return [documents[index] for index in selected]
+
+    def term_weights(self, queries):
+        terms = {term for query in queries for term in tokenize(query) if term not in STOP_WORDS}
+        if self.lexical_index is None:
+            return dict.fromkeys(terms, 1.0)
+        return self.lexical_index.inverse_document_frequencies(terms)
+
+    def score_sentence(self, sentence, weights):
+        return sum(weights.get(term, 0.0) for term in set(tokenize(sentence)))
+
+    def compress(self, queries, documents, limit, format_header):
+        documents = [doc for doc in self.diversify(documents, limit) if has_body(doc.page_content)]
+        entries = [
+            {"header": format_header(doc), "text": doc.page_content.strip(), "passages": split_passages(doc.page_content)}
+            for doc in documents
+        ]
+        # Whole chunks are returned whenever they fit; sentences are only dropped to meet the budget.
+        if sum(count_tokens(entry["header"]) + count_tokens(entry["text"]) for entry in entries) <= self.token_budget:
+            return [f"{entry['header']}\n{entry['text']}" for entry in entries]
+
+        weights = self.term_weights(queries)
+        for entry in entries:
+            entry["scores"] = [self.score_sentence(passage, weights) for passage in entry["passages"]]
+            entry["ranked"] = sorted(range(len(entry["passages"])), key=lambda index: (-entry["scores"][index], index))
+            entry["kept"] = set()
+
+        # Every chunk first gets its header and best passage, in MMR order, while they fit.
+        used = 0
+        included = []
+        for entry in entries:
+            best = entry["ranked"][0]
+            cost = count_tokens(entry["header"]) + count_tokens(entry["passages"][best])
+            if used + cost > self.token_budget:
+                continue
+            entry["kept"].add(best)
+            included.append(entry)
+            used += cost
+
+        # Then the highest-scoring remaining passages of any chunk, and finally the rest of each
+        # included chunk in document order, since answers often share no term with the question.
+        scored = sorted(
+            ((entry["scores"][index], position, index)
+             for position, entry in enumerate(included)
+             for index in entry["ranked"][1:]
+             if entry["scores"][index] > 0),
+            key=lambda candidate: (-candidate[0], candidate[1], candidate[2])
+        )
+        remaining = [
+            (position, index)
+            for position, entry in enumerate(included)
+            for index in range(len(entry["passages"]))
+        ]
+        for position, index in [(position, index) for _, position, index in scored] + remaining:
+            entry = included[position]
+            if index in entry["kept"]:
+                continue
+            cost = count_tokens(entry["passages"][index])
+            if used + cost <= self.token_budget:
+                entry["kept"].add(index)
+                used += cost
+
+        return [self.render(entry) for entry in included]
+
+    def render(self, entry):
+        parts = []
+        previous = None
+        if len(entry["kept"]) == len(entry["passages"]):
+            return f"{entry['header']}\n{entry['text']}"
+        for index in sorted(entry["kept"]):
+            if previous is not None and index != previous + 1:
+                parts.append(OMISSION_MARKER)
+            parts.append(entry["passages"][index])
+            previous = index
+        return f"{entry['header']}\n{' '.join(parts)}"
@@ -7,18 +7,106 @@ load_dotenv()
 
 def get_env_setting(config_key: str) -> str:
     env_value = os.getenv(config_key)
-    if not env_value and hasattr(st, 'secrets') and config_key in st.secrets:
-        env_value = st.secrets[config_key]
+    if not env_value and hasattr(st, 'secrets'):
+        try:
+            if config_key in st.secrets:
+                env_value = st.secrets[config_key]
+        except FileNotFoundError:
+            # No secrets.toml outside a configured Streamlit deployment (offline ingestion, scripts).
+            pass
     return env_value
 
 
 API_KEY_OPENAI = get_env_setting("OPENAI_API_KEY")
 TOKEN_GITHUB = get_env_setting("GITHUB_TOKEN")
 REPOSITORY_GITHUB = get_env_setting("GITHUB_REPO")
+GITHUB_API_URL = get_env_setting("GITHUB_API_URL") or "https://api.github.com"
 MODEL_NAME = get_env_setting("LLM_MODEL") or "gpt-4o-mini"
+STREAM_RESPONSES = (get_env_setting("STREAM_RESPONSES") or "true").lower() == "true"
+# tool-calling lets the model decide when to search; retrieve-first searches before the first LLM call
+AGENT_MODE = get_env_setting("AGENT_MODE") or "tool-calling"
+WARMUP_ON_START = (get_env_setting("WARMUP_ON_START") or "true").lower() == "true"
+
+# Per-process budget; set below the account limits when several processes share one key.
+OPENAI_REQUESTS_PER_MINUTE = int(get_env_setting("OPENAI_REQUESTS_PER_MINUTE") or 500)
+OPENAI_TOKENS_PER_MINUTE = int(get_env_setting("OPENAI_TOKENS_PER_MINUTE") or 200000)
+OPENAI_MAX_RETRIES = 6
+OPENAI_MIN_RATE_FRACTION = 0.1
 
 PATH_VECTOR_DB = "chroma_db"
 PATH_DOCUMENTS = "documents"
+PATH_INDEX_MANIFEST = os.path.join(PATH_VECTOR_DB, "manifest.json")
+PATH_LEXICAL_INDEX = os.path.join(PATH_VECTOR_DB, "lexical_index.json")
+PATH_FLAT_INDEX = os.path.join(PATH_VECTOR_DB, "flat_index")
+PATH_ACTIVE_INDEX = "active_index.json"
+
+DOCUMENT_WATCH_ENABLED = (get_env_setting("DOCUMENT_WATCH_ENABLED") or "true").lower() == "true"
+DOCUMENT_WATCH_POLL_SECONDS = 5.0
+DOCUMENT_WATCH_DEBOUNCE_SECONDS = 2.0
+
+VECTOR_STORE_BACKEND = get_env_setting("VECTOR_STORE_BACKEND") or "chroma"
+FLAT_INDEX_QUANTIZED = (get_env_setting("FLAT_INDEX_QUANTIZED") or "false").lower() == "true"
+
+CONTEXT_TOKEN_BUDGET = 3000
+CONTEXT_RECENT_TURNS = 6
+CONTEXT_SUMMARY_SLACK_TURNS = 2
+
+# tune.py measures these against evaluation/retrieval_questions.json and recommends values
+TEXT_CHUNK_SIZE = int(get_env_setting("TEXT_CHUNK_SIZE") or 1050)
+TEXT_CHUNK_OVERLAP = int(get_env_setting("TEXT_CHUNK_OVERLAP") or 120)
+# structured (FAQ pairs and manual sections) or recursive (fixed-size splitting only)
+CHUNKING_STRATEGY = get_env_setting("CHUNKING_STRATEGY") or "structured"
+CHUNK_DEDUP_ENABLED = (get_env_setting("CHUNK_DEDUP_ENABLED") or "true").lower() == "true"
+CHUNK_DEDUP_MAX_DISTANCE = 3
+BOILERPLATE_MIN_PAGE_RATIO = 0.3
+
+EMBEDDING_BACKEND = get_env_setting("EMBEDDING_BACKEND") or "openai"
+EMBEDDING_DIMENSIONS = int(get_env_setting("EMBEDDING_DIMENSIONS") or 1024)
+EMBEDDING_LOCAL_MODEL = get_env_setting("EMBEDDING_LOCAL_MODEL") or "sentence-transformers/all-MiniLM-L6-v2"
+
+PATH_EMBEDDING_CACHE = "embedding_cache.db"
+EMBEDDING_CACHE_MAX_MB = int(get_env_setting("EMBEDDING_CACHE_MAX_MB") or 512)
+
+INGEST_WORKERS = int(get_env_setting("INGEST_WORKERS") or min(4, os.cpu_count() or 1))
+INGEST_BATCH_SIZE = int(get_env_setting("INGEST_BATCH_SIZE") or 256)
+INGEST_MAX_IN_FLIGHT = int(get_env_setting("INGEST_MAX_IN_FLIGHT") or 2)
+
+LEXICAL_DECISIVE_MARGIN = 1.5
+
+SEARCH_COMPRESSION_ENABLED = (get_env_setting("SEARCH_COMPRESSION_ENABLED") or "true").lower() == "true"
+SEARCH_CONTEXT_TOKEN_BUDGET = int(get_env_setting("SEARCH_CONTEXT_TOKEN_BUDGET") or 1200)
+SEARCH_RESULT_LIMIT = int(get_env_setting("SEARCH_RESULT_LIMIT") or 4)
+SEARCH_CANDIDATE_FACTOR = 2
+SEARCH_MMR_LAMBDA = 0.7
+# Restrict searches to the vehicle model, year and document type a question names
+SEARCH_ROUTING_ENABLED = (get_env_setting("SEARCH_ROUTING_ENABLED") or "true").lower() == "true"
+
+PATH_TICKET_OUTBOX = "ticket_outbox.db"
+TICKET_MAX_ATTEMPTS = 6
+TICKET_RETRY_BASE_SECONDS = 2.0
+TICKET_RETRY_MAX_SECONDS = 300.0
+TICKET_HTTP_TIMEOUT = 10
+
+PATH_TELEMETRY = "telemetry"
+TELEMETRY_LOG_MAX_MB = 10
+TELEMETRY_LOG_BACKUPS = 5
+TELEMETRY_METRICS_PORT = int(get_env_setting("TELEMETRY_METRICS_PORT") or 0)
+TELEMETRY_FLUSH_SECONDS = 10.0
+TELEMETRY_PROFILE_SAMPLE_RATE = float(get_env_setting("TELEMETRY_PROFILE_SAMPLE_RATE") or 0)
+TELEMETRY_PROFILER = get_env_setting("TELEMETRY_PROFILER") or "cprofile"
+
+ANSWER_CACHE_ENABLED = (get_env_setting("ANSWER_CACHE_ENABLED") or "true").lower() == "true"
+PATH_ANSWER_CACHE = "answer_cache.db"
+ANSWER_CACHE_THRESHOLD = float(get_env_setting("ANSWER_CACHE_THRESHOLD") or 0.95)
+ANSWER_CACHE_MAX_ENTRIES = 2000
+
+PATH_SESSION_STORE = "sessions.db"
+CHAT_PAGE_SIZE = int(get_env_setting("CHAT_PAGE_SIZE") or 20)
 
-TEXT_CHUNK_SIZE = 1050
-TEXT_CHUNK_OVERLAP = 120
+API_HOST = get_env_setting("API_HOST") or "0.0.0.0"
+API_PORT = int(get_env_setting("API_PORT") or 8000)
+API_WORKERS = int(get_env_setting("API_WORKERS") or 2)
+API_MAX_CONCURRENT_TURNS = int(get_env_setting("API_MAX_CONCURRENT_TURNS") or 8)
+API_MAX_QUEUED_REQUESTS = int(get_env_setting("API_MAX_QUEUED_REQUESTS") or 32)
+API_QUEUE_TIMEOUT_SECONDS = 30.0
+API_INDEX_RETIRE_SECONDS = 300.0
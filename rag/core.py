@@ -0,0 +1,147 @@
+import time
+import threading
+from collections import OrderedDict
+
+from config import ANSWER_CACHE_ENABLED, AGENT_MODE
+from memory import ConversationWindow, ticket_flow_in_progress, TICKET_ID_PATTERN
+from ratelimit import is_rate_limit_error
+
+WARMUP_QUERY = "customer support contact hours"
+TICKET_TOOL_NAME = "submit_support_ticket"
+RATE_LIMITED_MESSAGE = "⚠️ The assistant is handling a lot of requests right now. Please try again in a minute."
+
+
+def confirm_submitted_tickets(response, intermediate_steps):
+    """Appends the ID of every ticket submitted during the turn that the reply does not name.
+
+    The ID in the stored reply is what ends the ticket flow on later turns and keeps the reply
+    out of the answer cache, so it is taken from the ticket tool's output, not the model's wording.
+    """
+    for action, observation in intermediate_steps:
+        if action.tool != TICKET_TOOL_NAME:
+            continue
+        match = TICKET_ID_PATTERN.search(str(observation))
+        if match and match.group(0).upper() not in response.upper():
+            response = f"{response}\n\nTicket ID: {match.group(0)}"
+    return response
+
+
+class AgentResources:
+    """Executor, tools and model clients shared by every session for one index version."""
+
+    def __init__(self, knowledge_base, index_version, agent_mode=AGENT_MODE):
+        # Imported here so the page renders before LangChain, OpenAI and Chroma are loaded.
+        from tools import build_agent_tools
+        from agent import create_agent_executor, create_summary_model
+        from answercache import get_answer_cache
+
+        self.knowledge_base = knowledge_base
+        self.index_version = index_version
+        self.tools = build_agent_tools(knowledge_base)
+        self.agent_executor = create_agent_executor(self.tools, agent_mode)
+        self.summary_model = create_summary_model()
+        self.conversation_window = ConversationWindow(self.summary_model)
+        self.answer_cache = get_answer_cache(knowledge_base.embeddings) if ANSWER_CACHE_ENABLED else None
+
+    def warm_up(self):
+        from ticket import get_ticket_outbox
+        started = time.perf_counter()
+
+        # Pages in the vector and lexical indexes and the query embedding path.
+        search_tool = next(tool for tool in self.tools if tool.name == "search_knowledge_base")
+        search_tool.invoke({"search_queries": [WARMUP_QUERY]})
+        get_ticket_outbox()
+        try:
+            # All OpenAI clients share one HTTP connection pool, so this also primes the agent's.
+            self.summary_model.root_client.models.list()
+        except Exception as error:
+            print(f"[CORE_MODULE] Could not prime the OpenAI connection: {error}")
+
+        print(f"[CORE_MODULE] Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+class AgentResourceCache:
+    """Keeps the resources of the most recent index versions, for front ends without st.cache_resource."""
+
+    def __init__(self, max_entries=2, warm_up=False):
+        self.max_entries = max_entries
+        self.warm_up = warm_up
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, knowledge_base):
+        index_version = knowledge_base.lexical_index.version
+        with self.lock:
+            if index_version not in self.entries:
+                resources = AgentResources(knowledge_base, index_version)
+                if self.warm_up:
+                    resources.warm_up()
+                self.entries[index_version] = resources
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            self.entries.move_to_end(index_version)
+            return self.entries[index_version]
+
+
+class ApplicationController:
+    """Answers support turns; the front end owns where history lives and how replies are shown.
+
+    ``history`` is the conversation as role/content entries ending with the customer's new
+    message, and ``window_state`` is the rolling-summary state from ``new_window_state``.
+    ``history_offset`` is the position of ``history[0]`` when only the part of the
+    conversation that is not yet summarized is passed.
+    """
+
+    def __init__(self):
+        self.knowledge_base = None
+        self.agent_executor = None
+        self.conversation_window = None
+        self.index_version = None
+        self.answer_cache = None
+
+    def attach_resources(self, resources):
+        self.knowledge_base = resources.knowledge_base
+        self.index_version = resources.index_version
+        self.agent_executor = resources.agent_executor
+        self.conversation_window = resources.conversation_window
+        self.answer_cache = resources.answer_cache
+        return self
+
+    def prepare_conversation_context(self, history, window_state, history_offset=0):
+        # The latest user message is passed to the agent as "input", not as history.
+        return self.conversation_window.build_messages(history[:-1], window_state, history_offset)
+
+    def run_agent(self, query, context, callbacks=None):
+        try:
+            result = self.agent_executor.invoke(
+                {"input": query, "chat_history": context},
+                config={"callbacks": callbacks or []}
+            )
+            return confirm_submitted_tickets(result["output"], result.get("intermediate_steps", []))
+        except Exception as error:
+            if is_rate_limit_error(error):
+                return RATE_LIMITED_MESSAGE
+            return f"⚠️ An error occurred while processing your request.\n\nDetails: {error}"
+
+    def answer_is_cacheable(self, history, window_state=None, history_offset=0):
+        # Ticket answers depend on what this customer already provided, so they bypass the cache.
+        return self.answer_cache is not None and not ticket_flow_in_progress(history[:-1], window_state, history_offset)
+
+    def lookup_cached_answer(self, query, history, window_state=None, history_offset=0):
+        if not self.answer_is_cacheable(history, window_state, history_offset):
+            return None
+        return self.answer_cache.lookup(query, self.index_version)
+
+    def generate_answer(self, query, history, window_state, callbacks=None, history_offset=0):
+        started = time.perf_counter()
+        context = self.prepare_conversation_context(history, window_state, history_offset)
+        response = self.run_agent(query, context, callbacks)
+        if self.answer_is_cacheable(history, window_state, history_offset):
+            self.answer_cache.store(query, response, self.index_version, time.perf_counter() - started)
+        return response
+
+    def answer(self, query, history, window_state, callbacks=None, history_offset=0):
+        cached_response = self.lookup_cached_answer(query, history, window_state, history_offset)
+        if cached_response is not None:
+            return cached_response, True
+        return self.generate_answer(query, history, window_state, callbacks, history_offset), False
@@ -0,0 +1,269 @@
+import zlib
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from concurrent.futures import Future
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import (
+    API_KEY_OPENAI,
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_LOCAL_MODEL,
+    PATH_EMBEDDING_CACHE,
+    EMBEDDING_CACHE_MAX_MB
+)
+from lexical import tokenize
+
+SQL_BATCH_SIZE = 500
+TOUCH_BATCH_SIZE = 1000
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def build_embedding_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector):
+    return array('f', vector).tobytes()
+
+
+def unpack_vector(blob):
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """Embedding vectors in SQLite, evicted least recently used once they exceed ``max_bytes``.
+
+    The stored size is tracked in memory and only recounted once it passes the limit, which
+    also accounts for other processes writing the same file. Hits are timestamped in memory and
+    written with the next insert or every ``TOUCH_BATCH_SIZE`` hits, so lookups rarely commit.
+    """
+
+    def __init__(self, cache_path=PATH_EMBEDDING_CACHE, max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+        self.pending_touches = {}
+        self.stored_bytes = self.size_bytes()
+
+    def select_by_keys(self, columns, keys):
+        rows = []
+        for start in range(0, len(keys), SQL_BATCH_SIZE):
+            batch = keys[start:start + SQL_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(self.connection.execute(
+                f"SELECT key, {columns} FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+
+    def get_many(self, keys):
+        unique_keys = list(dict.fromkeys(keys))
+        with self.lock:
+            found = {key: unpack_vector(blob) for key, blob in self.select_by_keys("vector", unique_keys)}
+            if found:
+                self.pending_touches.update(dict.fromkeys(found, time.time()))
+                if len(self.pending_touches) >= TOUCH_BATCH_SIZE:
+                    self.write_touches()
+                    self.connection.commit()
+        return found
+
+    def write_touches(self):
+        if self.pending_touches:
+            self.connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self.pending_touches.items()]
+            )
+            self.pending_touches = {}
+
+    def put_many(self, vectors_by_key):
+        if not vectors_by_key:
+            return
+        now = time.time()
+        rows = [(key, pack_vector(vector), now) for key, vector in vectors_by_key.items()]
+        with self.lock:
+            replaced_bytes = sum(size for _, size in self.select_by_keys("LENGTH(vector)", list(vectors_by_key)))
+            self.write_touches()
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self.connection.commit()
+            self.stored_bytes += sum(len(blob) for _, blob, _ in rows) - replaced_bytes
+            if self.stored_bytes > self.max_bytes:
+                self.evict_oldest()
+
+    def size_bytes(self):
+        total = self.connection.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        return total[0]
+
+    def evict_oldest(self):
+        self.stored_bytes = self.size_bytes()
+        excess = self.stored_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        # Free an extra 10% so eviction does not run again on every subsequent insert.
+        excess += self.max_bytes // 10
+        stale_keys = []
+        for key, size in self.connection.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used ASC"
+        ):
+            stale_keys.append((key,))
+            excess -= size
+            self.stored_bytes -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM embeddings WHERE key = ?", stale_keys)
+        self.connection.commit()
+
+
+class SingleFlight:
+    """Shares one embedding call between concurrent callers that miss the cache on the same text.
+
+    The first caller to claim a key computes it; later callers wait on its future instead of
+    sending the same text to the provider again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def claim(self, keys):
+        owned, waiting = [], {}
+        with self.lock:
+            for key in keys:
+                if key in self.pending:
+                    waiting[key] = self.pending[key]
+                else:
+                    self.pending[key] = Future()
+                    owned.append(key)
+        return owned, waiting
+
+    def resolve(self, vectors_by_key):
+        with self.lock:
+            futures = [(self.pending.pop(key), vector) for key, vector in vectors_by_key.items()]
+        for future, vector in futures:
+            future.set_result(vector)
+
+    def fail(self, keys, error):
+        with self.lock:
+            futures = [self.pending.pop(key) for key in keys]
+        for future in futures:
+            future.set_exception(error)
+
+
+_in_flight = SingleFlight()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embedding_model, cache=None, model_name=None):
+        self.embedding_model = embedding_model
+        self.cache = cache or EmbeddingCache()
+        self.model_name = model_name or getattr(embedding_model, "model", type(embedding_model).__name__)
+        self.in_flight = _in_flight
+
+    def embed_missing(self, missing, embed):
+        # Keys are computed before waiting on other callers' keys, so two callers cannot deadlock.
+        owned, waiting = self.in_flight.claim(list(missing))
+        fresh_by_key = {}
+        if owned:
+            try:
+                fresh_by_key = dict(zip(owned, embed([missing[key] for key in owned])))
+                self.cache.put_many(fresh_by_key)
+            except Exception as error:
+                self.in_flight.fail(owned, error)
+                raise
+            self.in_flight.resolve(fresh_by_key)
+        fresh_by_key.update((key, future.result()) for key, future in waiting.items())
+        return fresh_by_key
+
+    def embed_documents(self, texts):
+        keys = [build_embedding_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            vectors.update(self.embed_missing(missing, self.embedding_model.embed_documents))
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        key = build_embedding_key(self.model_name, text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            return cached[key]
+
+        fresh = self.embed_missing({key: text}, lambda texts: [self.embedding_model.embed_query(texts[0])])
+        return fresh[key]
+
+
+class HashingEmbeddings(Embeddings):
+    def __init__(self, dimensions=EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+
+    def extract_features(self, text):
+        tokens = tokenize(text)
+        return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+    def encode(self, texts):
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            for feature in self.extract_features(text):
+                rows.append(row)
+                hashes.append(zlib.crc32(feature.encode("utf-8")))
+
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        columns = (hashes % self.dimensions).astype(np.intp)
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), columns), signs)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+def create_embedding_backend(backend_name=EMBEDDING_BACKEND):
+    if backend_name == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        from ratelimit import openai_client_settings
+        return CachedEmbeddings(OpenAIEmbeddings(openai_api_key=API_KEY_OPENAI, **openai_client_settings()))
+    if backend_name == "hashing":
+        return HashingEmbeddings()
+    if backend_name == "local-model":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        model = HuggingFaceEmbeddings(model_name=EMBEDDING_LOCAL_MODEL, encode_kwargs={"batch_size": 64})
+        return CachedEmbeddings(model, model_name=EMBEDDING_LOCAL_MODEL)
+    raise ValueError(f"Unknown embedding backend: {backend_name}")
+
+
+def describe_embedding_backend(embedding_model, backend_name=EMBEDDING_BACKEND):
+    model_name = getattr(embedding_model, "model_name", None) or getattr(embedding_model, "model", None)
+    return f"{backend_name}:{model_name}"
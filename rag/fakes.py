@@ -0,0 +1,164 @@
+import re
+import json
+import zlib
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage, SystemMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from memory import SUMMARY_INSTRUCTIONS
+
+TICKET_REQUEST_PREFIX = "TICKET:"
+CITATION_PATTERN = re.compile(r"^Source: .+$", re.MULTILINE)
+
+
+def stable_id(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class FakeSupportChatModel(BaseChatModel):
+    """Deterministic stand-in for the agent's chat model, used by the offline benchmarks.
+
+    It follows the agent protocol closely enough to exercise the real tool loop: it searches
+    before answering (unless retrieved context is already in the prompt), answers with the
+    first citation it was given, and submits a ticket for messages starting with ``TICKET:``.
+    """
+
+    latency_seconds: float = 0.0
+    seconds_per_output_token: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "fake-support-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def respond(self, messages):
+        question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        last = messages[-1]
+
+        if messages[0].content == SUMMARY_INSTRUCTIONS:
+            return f"Earlier the customer discussed: {question[-300:]}"
+
+        if isinstance(last, ToolMessage):
+            citation = CITATION_PATTERN.search(last.content)
+            if citation:
+                return f"Here is what the manuals say. ({citation.group(0)})"
+            return last.content.split("\n")[0]
+
+        if question.startswith(TICKET_REQUEST_PREFIX):
+            summary = question[len(TICKET_REQUEST_PREFIX):].strip() or "Benchmark issue"
+            return AIMessage(content="", tool_calls=[{
+                "name": "submit_support_ticket",
+                "args": {
+                    "summary": summary,
+                    "description": f"{summary} reported during an offline benchmark run.",
+                    "user_name": "Benchmark Customer",
+                    "user_email": f"customer-{stable_id(summary) % 10000}@benchmark.invalid"
+                },
+                "id": f"call_{stable_id(summary)}"
+            }])
+
+        context = "\n".join(m.content for m in messages if isinstance(m, SystemMessage))
+        if "has already been searched" in context:
+            citation = CITATION_PATTERN.search(context)
+            if citation:
+                return f"Here is what the manuals say. ({citation.group(0)})"
+
+        return AIMessage(content="", tool_calls=[{
+            "name": "search_knowledge_base",
+            "args": {"search_queries": [question]},
+            "id": f"call_{stable_id(question)}"
+        }])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self.respond(messages)
+        if isinstance(message, str):
+            message = AIMessage(content=message)
+
+        input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = estimate_tokens(message.content or json.dumps(message.tool_calls))
+        time.sleep(self.latency_seconds + output_tokens * self.seconds_per_output_token)
+
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeGitHubServer:
+    """Local stand-in for the GitHub issues API used by the ticket outbox."""
+
+    def __init__(self, failure_rate=0.0, latency_seconds=0.0, seed=3, port=0):
+        self.port = port
+        self.failure_rate = failure_rate
+        self.latency_seconds = latency_seconds
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.issues = []
+        self.requests = 0
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        github = self
+
+        class IssuesRequestHandler(BaseHTTPRequestHandler):
+            def send_json(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with github.lock:
+                    github.requests += 1
+                    issues = list(github.issues)
+                self.send_json(200, issues)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                time.sleep(github.latency_seconds)
+                with github.lock:
+                    github.requests += 1
+                    failed = github.random.random() < github.failure_rate
+                    if not failed:
+                        number = len(github.issues) + 1
+                        issue = {
+                            "number": number,
+                            "html_url": f"{github.url}{self.path}/{number}",
+                            "body": payload.get("body", "")
+                        }
+                        github.issues.append(issue)
+                if failed:
+                    self.send_json(502, {"message": "Bad gateway (simulated)"})
+                else:
+                    self.send_json(201, issue)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), IssuesRequestHandler)
+        threading.Thread(target=self.server.serve_forever, name="fake-github", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,365 @@
+import os
+import json
+import shutil
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from config import PATH_FLAT_INDEX, FLAT_INDEX_QUANTIZED
+
+SEARCH_BLOCK_ROWS = 16384
+RERANK_FACTOR = 4
+COMPACTION_RATIO = 0.25
+COMPACTION_STAGING_SUFFIX = ".compacting"
+COMPACTION_RETIRED_SUFFIX = ".compacted-old"
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize_rows(matrix):
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class FlatVectorStore(VectorStore):
+    """Chunk vectors in a memory-mapped float32 matrix, searched with a vectorized top-k.
+
+    Files in ``index_path``: ``vectors.f32`` (row-major matrix), optional ``codes.i8`` and
+    ``scales.f32`` (int8 copy with per-row scales), ``records.jsonl`` with ``offsets.u64``
+    (chunk text and metadata per row), ``deleted.u8`` (tombstones), ``ids.txt`` and
+    ``meta.json``. ``meta.json`` is written last, so rows appended after it are ignored.
+    """
+
+    def __init__(self, embedding_function, index_path=PATH_FLAT_INDEX, quantized=FLAT_INDEX_QUANTIZED):
+        self.embedding_function = embedding_function
+        self.index_path = index_path
+        self.quantized = quantized
+        self.lock = threading.RLock()
+        self.load()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def file_path(self, name):
+        return os.path.join(self.index_path, name)
+
+    def load(self):
+        self.finish_compaction()
+        os.makedirs(self.index_path, exist_ok=True)
+        meta = {"rows": 0, "dimensions": 0, "records_bytes": 0, "ids_bytes": 0, "quantized": self.quantized}
+        if os.path.isfile(self.file_path("meta.json")):
+            with open(self.file_path("meta.json"), 'r', encoding='utf-8') as fh:
+                meta.update(json.load(fh))
+
+        self.rows = meta["rows"]
+        self.dimensions = meta["dimensions"]
+        self.records_bytes = meta["records_bytes"]
+        self.ids_bytes = meta["ids_bytes"]
+        self.has_codes = meta["quantized"]
+
+        self.ids = []
+        if self.rows:
+            with open(self.file_path("ids.txt"), 'r', encoding='utf-8') as fh:
+                self.ids = [line.rstrip("\n") for _, line in zip(range(self.rows), fh)]
+        self.deleted = self.read_array("deleted.u8", np.uint8, self.rows).astype(bool)
+        self.offsets = self.read_array("offsets.u64", np.uint64, self.rows)
+        self.row_by_id = {chunk_id: row for row, chunk_id in enumerate(self.ids) if not self.deleted[row]}
+        self.map_matrices()
+
+    def read_array(self, name, dtype, count):
+        if not count:
+            return np.zeros(0, dtype=dtype)
+        return np.fromfile(self.file_path(name), dtype=dtype, count=count)
+
+    def map_matrices(self):
+        # Mapping instead of reading keeps startup constant-time and lets every session and
+        # worker process share the same page-cache pages.
+        self.vectors = self.codes = self.scales = None
+        self.shards = {}
+        if not self.rows:
+            return
+        shape = (self.rows, self.dimensions)
+        self.vectors = np.memmap(self.file_path("vectors.f32"), dtype=np.float32, mode='r', shape=shape)
+        if self.has_codes:
+            self.codes = np.memmap(self.file_path("codes.i8"), dtype=np.int8, mode='r', shape=shape)
+            self.scales = np.memmap(self.file_path("scales.f32"), dtype=np.float32, mode='r', shape=(self.rows,))
+
+    def write_meta(self):
+        meta = {
+            "rows": self.rows,
+            "dimensions": self.dimensions,
+            "records_bytes": self.records_bytes,
+            "ids_bytes": self.ids_bytes,
+            "quantized": self.has_codes
+        }
+        temp_path = self.file_path("meta.json.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh)
+        os.replace(temp_path, self.file_path("meta.json"))
+
+    def append_file(self, name, data, committed_bytes):
+        with open(self.file_path(name), 'ab') as fh:
+            # Drop anything a crashed write left behind the last committed row.
+            fh.truncate(committed_bytes)
+            fh.write(data)
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [str(self.rows + index) for index in range(len(texts))]
+        matrix = normalize_rows(embeddings)
+
+        with self.lock:
+            if not self.rows:
+                self.dimensions = matrix.shape[1]
+                self.has_codes = self.quantized
+            elif matrix.shape[1] != self.dimensions:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index ({self.dimensions})")
+
+            self.delete([chunk_id for chunk_id in ids if chunk_id in self.row_by_id])
+
+            records = [
+                json.dumps({"text": text, "metadata": metadata or {}}, ensure_ascii=False).encode("utf-8") + b"\n"
+                for text, metadata in zip(texts, metadatas)
+            ]
+            lengths = np.fromiter((len(record) for record in records), dtype=np.uint64, count=len(records))
+            offsets = self.records_bytes + np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.uint64)
+
+            row_bytes = self.dimensions * 4
+            self.append_file("vectors.f32", matrix.tobytes(), self.rows * row_bytes)
+            if self.has_codes:
+                codes, scales = quantize_rows(matrix)
+                self.append_file("codes.i8", codes.tobytes(), self.rows * self.dimensions)
+                self.append_file("scales.f32", scales.tobytes(), self.rows * 4)
+            self.append_file("records.jsonl", b"".join(records), self.records_bytes)
+            self.append_file("offsets.u64", offsets.tobytes(), self.rows * 8)
+            self.append_file("deleted.u8", bytes(len(texts)), self.rows)
+            id_lines = "".join(f"{chunk_id}\n" for chunk_id in ids).encode("utf-8")
+            self.append_file("ids.txt", id_lines, self.ids_bytes)
+
+            first_row = self.rows
+            self.rows += len(texts)
+            self.records_bytes += int(lengths.sum())
+            self.ids_bytes += len(id_lines)
+            self.write_meta()
+
+            self.ids.extend(ids)
+            self.deleted = np.concatenate((self.deleted, np.zeros(len(texts), dtype=bool)))
+            self.offsets = np.concatenate((self.offsets, offsets))
+            self.row_by_id.update((chunk_id, first_row + index) for index, chunk_id in enumerate(ids))
+            self.map_matrices()
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return True
+        with self.lock:
+            rows = [self.row_by_id.pop(chunk_id) for chunk_id in ids if chunk_id in self.row_by_id]
+            if not rows:
+                return True
+            with open(self.file_path("deleted.u8"), 'r+b') as fh:
+                for row in rows:
+                    fh.seek(row)
+                    fh.write(b"\x01")
+            self.deleted[rows] = True
+            if self.deleted.sum() > COMPACTION_RATIO * self.rows:
+                self.compact()
+        return True
+
+    def compact(self):
+        """Rewrites the live rows without tombstones.
+
+        The compacted index is written to a sibling directory and swapped in with two renames,
+        so a crash at any point leaves a complete index that ``load`` recovers.
+        """
+        with self.lock:
+            live_rows = np.flatnonzero(~self.deleted)
+            staging_path = f"{self.index_path}{COMPACTION_STAGING_SUFFIX}"
+            shutil.rmtree(staging_path, ignore_errors=True)
+            staged = FlatVectorStore(self.embedding_function, index_path=staging_path, quantized=self.has_codes)
+            if len(live_rows):
+                records = self.read_records(live_rows)
+                staged.add_embeddings(
+                    [record["text"] for record in records],
+                    np.array(self.vectors[live_rows]),
+                    [record["metadata"] for record in records],
+                    [self.ids[row] for row in live_rows]
+                )
+
+            retired_path = f"{self.index_path}{COMPACTION_RETIRED_SUFFIX}"
+            shutil.rmtree(retired_path, ignore_errors=True)
+            os.replace(self.index_path, retired_path)
+            os.replace(staging_path, self.index_path)
+            shutil.rmtree(retired_path, ignore_errors=True)
+            self.load()
+
+    def finish_compaction(self):
+        staging_path = f"{self.index_path}{COMPACTION_STAGING_SUFFIX}"
+        retired_path = f"{self.index_path}{COMPACTION_RETIRED_SUFFIX}"
+        if os.path.isdir(retired_path):
+            if os.path.isdir(self.index_path):
+                # The compacted index was already swapped in.
+                shutil.rmtree(retired_path, ignore_errors=True)
+            else:
+                # Interrupted between the two renames: the old index is still complete.
+                os.replace(retired_path, self.index_path)
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+    def reset_collection(self):
+        with self.lock:
+            shutil.rmtree(self.index_path, ignore_errors=True)
+            self.load()
+
+    def read_records(self, rows):
+        if not len(rows):
+            return []
+        ends = np.append(self.offsets[1:], np.uint64(self.records_bytes))
+        descriptor = os.open(self.file_path("records.jsonl"), os.O_RDONLY)
+        try:
+            return [
+                json.loads(os.pread(descriptor, int(ends[row] - self.offsets[row]), int(self.offsets[row])))
+                for row in rows
+            ]
+        finally:
+            os.close(descriptor)
+
+    def read_all_records(self):
+        if not self.rows:
+            return []
+        # Records are appended in row order and JSON-encoded without raw newlines.
+        with open(self.file_path("records.jsonl"), 'rb') as fh:
+            return [json.loads(line) for line in fh.read(self.records_bytes).splitlines()]
+
+    def shard_rows(self, key):
+        """Rows grouped by one metadata field, built on the first filtered search and kept until rows change."""
+        index = self.shards.get(key)
+        if index is None:
+            groups = {}
+            for row, record in enumerate(self.read_all_records()):
+                groups.setdefault(record["metadata"].get(key), []).append(row)
+            index = {value: np.asarray(rows, dtype=np.intp) for value, rows in groups.items()}
+            self.shards[key] = index
+        return index
+
+    def filter_rows(self, filter):
+        selected = None
+        for key, allowed in filter.items():
+            allowed = allowed if isinstance(allowed, (list, tuple, set)) else [allowed]
+            index = self.shard_rows(key)
+            rows = np.concatenate(
+                [index.get(value, np.zeros(0, dtype=np.intp)) for value in set(allowed)] or [np.zeros(0, dtype=np.intp)]
+            )
+            selected = rows if selected is None else np.intersect1d(selected, rows)
+        return np.sort(selected)
+
+    def score_rows(self, queries, vectors, codes, scales, rows):
+        scores = np.empty((queries.shape[0], rows), dtype=np.float32)
+        for start in range(0, rows, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, rows)
+            if codes is not None:
+                block = codes[start:stop].astype(np.float32) @ queries.T
+                scores[:, start:stop] = (block * scales[start:stop, None]).T
+            else:
+                scores[:, start:stop] = (vectors[start:stop] @ queries.T).T
+        return scores
+
+    def search_rows(self, query_embeddings, k, filter=None):
+        with self.lock:
+            rows, vectors, codes, scales = self.rows, self.vectors, self.codes, self.scales
+            deleted = self.deleted
+            selected = self.filter_rows(filter) if filter and rows else None
+        if not rows:
+            return [[] for _ in query_embeddings]
+
+        queries = normalize_rows(query_embeddings)
+        scored_vectors, scored_codes, scored_scales = vectors, codes, scales
+        if selected is not None:
+            # Only the rows of the matching shards are scored, so the cost follows the shard size.
+            selected = selected[~deleted[selected]]
+            if not len(selected):
+                return [[] for _ in query_embeddings]
+            if codes is not None:
+                scored_codes, scored_scales = np.asarray(codes[selected]), np.asarray(scales[selected])
+            else:
+                scored_vectors = np.asarray(vectors[selected])
+            deleted = np.zeros(len(selected), dtype=bool)
+            rows = len(selected)
+        scores = self.score_rows(queries, scored_vectors, scored_codes, scored_scales, rows)
+        scores[:, deleted] = -np.inf
+
+        # Over-fetch when scores are approximate (int8).
+        candidates = k * RERANK_FACTOR if codes is not None else k
+        candidates = min(candidates, rows)
+        results = []
+        for query, query_scores in zip(queries, scores):
+            top = np.argpartition(-query_scores, candidates - 1)[:candidates]
+            top = np.sort(top[np.isfinite(query_scores[top])])
+            matrix_rows = selected[top] if selected is not None else top
+            if codes is not None:
+                top_scores = np.asarray(vectors[matrix_rows]) @ query
+            else:
+                top_scores = query_scores[top]
+            order = np.argsort(-top_scores)
+            results.append([(int(matrix_rows[index]), float(top_scores[index])) for index in order])
+        return [self.to_documents(hits, k) for hits in results]
+
+    def to_documents(self, hits, k):
+        with self.lock:
+            records = self.read_records([row for row, _ in hits[:k]])
+        return [
+            (Document(page_content=record["text"], metadata=record["metadata"], id=self.ids[row]), score)
+            for (row, score), record in zip(hits, records)
+        ]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.search_rows([self.embedding_function.embed_query(query)], k, filter)[0]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.search_rows([embedding], k, filter)[0]]
+
+    def similarity_search_by_vectors(self, embeddings, k=4, filter=None):
+        return [[doc for doc, _ in hits] for hits in self.search_rows(embeddings, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    def get(self, ids=None, include=None, **kwargs):
+        with self.lock:
+            if ids is None:
+                rows = [row for row in range(self.rows) if not self.deleted[row]]
+            else:
+                rows = [self.row_by_id[chunk_id] for chunk_id in ids if chunk_id in self.row_by_id]
+            records = self.read_records(rows)
+            return {
+                "ids": [self.ids[row] for row in rows],
+                "documents": [record["text"] for record in records],
+                "metadatas": [record["metadata"] for record in records]
+            }
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, index_path=PATH_FLAT_INDEX, **kwargs):
+        store = cls(embedding, index_path=index_path)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,174 @@
+import os
+import time
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from langchain_core.documents import Document
+
+from config import PATH_DOCUMENTS, INGEST_WORKERS, INGEST_BATCH_SIZE, INGEST_MAX_IN_FLIGHT
+from manifest import build_chunk_id
+from ratelimit import request_priority, PRIORITY_BACKGROUND
+
+
+def extract_file_documents(file_path):
+    if file_path.lower().endswith('.pdf'):
+        from langchain_community.document_loaders import PyPDFLoader
+        return PyPDFLoader(file_path).load()
+
+    with open(file_path, 'r', encoding='utf-8') as fh:
+        content = fh.read()
+    return [Document(page_content=content, metadata={"source": file_path})]
+
+
+class IngestionProgress:
+    def __init__(self, total_files):
+        self.total_files = total_files
+        self.files = 0
+        self.failed = 0
+        self.pages = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+
+    def elapsed(self):
+        return max(time.perf_counter() - self.started, 1e-9)
+
+    def pages_per_second(self):
+        return self.pages / self.elapsed()
+
+    def chunks_per_second(self):
+        return self.chunks / self.elapsed()
+
+    def fraction(self):
+        return (self.files + self.failed) / self.total_files if self.total_files else 1.0
+
+    def describe(self):
+        return (
+            f"{self.files}/{self.total_files} files, "
+            f"{self.pages} pages ({self.pages_per_second():.1f}/s), "
+            f"{self.chunks} chunks ({self.chunks_per_second():.1f}/s)"
+        )
+
+
+class IngestionPipeline:
+    def __init__(self, chunker, database, batch_size=INGEST_BATCH_SIZE, max_workers=INGEST_WORKERS,
+                 max_in_flight=INGEST_MAX_IN_FLIGHT, progress_callback=None, lexical_index=None):
+        self.chunker = chunker
+        self.database = database
+        self.lexical_index = lexical_index
+        self.batch_size = batch_size
+        self.max_workers = max(1, max_workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.progress_callback = progress_callback
+        self.progress = IngestionProgress(0)
+        self.failures = []
+
+    def extract_documents(self, filenames):
+        pending_names = iter(filenames)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            queue = deque()
+
+            def submit_next():
+                filename = next(pending_names, None)
+                if filename is not None:
+                    file_path = os.path.join(PATH_DOCUMENTS, filename)
+                    queue.append((filename, pool.submit(extract_file_documents, file_path)))
+
+            # Keep at most two files per worker extracted ahead of the splitter.
+            for _ in range(self.max_workers * 2):
+                submit_next()
+
+            while queue:
+                filename, future = queue.popleft()
+                submit_next()
+                try:
+                    documents = future.result()
+                except Exception as err:
+                    self.failures.append((filename, err))
+                    self.progress.failed += 1
+                    continue
+                yield filename, documents
+
+    def write_batch(self, chunks, chunk_ids):
+        # Embedding calls for ingestion yield the OpenAI budget to waiting chat turns.
+        with request_priority(PRIORITY_BACKGROUND):
+            self.database.add_documents(chunks, ids=chunk_ids)
+        if self.lexical_index is not None:
+            self.lexical_index.add_documents(chunks, chunk_ids)
+
+    def report(self):
+        if self.progress_callback:
+            self.progress_callback(self.progress)
+
+    def run(self, content_hashes):
+        self.progress = IngestionProgress(len(content_hashes))
+        self.failures = []
+        self.chunk_ids = {}
+        self.open_batches = defaultdict(int)
+        self.split_finished = set()
+        self.batch = []
+        self.in_flight = {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as writers:
+                for filename, documents in self.extract_documents(list(content_hashes)):
+                    self.chunk_ids[filename] = []
+                    for chunk in self.chunker.split_file(documents):
+                        chunk_id = build_chunk_id(filename, content_hashes[filename], len(self.chunk_ids[filename]))
+                        self.chunk_ids[filename].append(chunk_id)
+                        self.batch.append((filename, chunk_id, chunk))
+                        if len(self.batch) >= self.batch_size:
+                            yield from self.submit_batch(writers)
+
+                    self.progress.pages += len(documents)
+                    self.split_finished.add(filename)
+                    yield from self.release_finished_files()
+                    self.report()
+
+                yield from self.submit_batch(writers)
+                while self.in_flight:
+                    yield from self.collect_writes(ALL_COMPLETED)
+        except Exception:
+            # Chunks of files that never completed must not outlive this run, since the
+            # manifest will not reference them.
+            orphaned = [chunk_id for ids in self.chunk_ids.values() for chunk_id in ids]
+            if orphaned:
+                self.database.delete(ids=orphaned)
+                if self.lexical_index is not None:
+                    self.lexical_index.remove(orphaned)
+            raise
+
+    def submit_batch(self, writers):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        filenames = {filename for filename, _, _ in batch}
+        for filename in filenames:
+            self.open_batches[filename] += 1
+
+        while len(self.in_flight) >= self.max_in_flight:
+            yield from self.collect_writes(FIRST_COMPLETED)
+
+        future = writers.submit(
+            self.write_batch,
+            [chunk for _, _, chunk in batch],
+            [chunk_id for _, chunk_id, _ in batch]
+        )
+        self.in_flight[future] = (filenames, len(batch))
+
+    def collect_writes(self, return_when):
+        done, _ = wait(list(self.in_flight), return_when=return_when)
+        for future in done:
+            filenames, batch_size = self.in_flight.pop(future)
+            future.result()
+            self.progress.chunks += batch_size
+            for filename in filenames:
+                self.open_batches[filename] -= 1
+        yield from self.release_finished_files()
+        self.report()
+
+    def release_finished_files(self):
+        pending_chunks = {filename for filename, _, _ in self.batch}
+        for filename in sorted(self.split_finished):
+            if self.open_batches[filename] == 0 and filename not in pending_chunks:
+                self.split_finished.discard(filename)
+                self.progress.files += 1
+                yield filename, self.chunk_ids.pop(filename)
@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from typing import Any
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from config import PATH_LEXICAL_INDEX, LEXICAL_DECISIVE_MARGIN
+from telemetry import timed
+from routing import metadata_matches
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./@][a-z0-9]+)*")
+# Part numbers and error codes mix letters and digits (P0420, 90915-YZZD1); years and trims do not
+# qualify, nor do short model names such as rav4.
+IDENTIFIER_PATTERN = re.compile(r"(?=.*[a-z])(?=.*[0-9])[a-z0-9][a-z0-9./@-]{4,}")
+STOP_WORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "the", "to", "what", "when", "where", "which", "with", "you",
+    "your"
+}
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def document_key(doc):
+    return doc.id or (doc.metadata.get('source'), doc.metadata.get('page'), doc.page_content)
+
+
+def reciprocal_rank_fusion(rankings, limit, offset=60):
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (offset + rank + 1)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ordered[:limit]]
+
+
+class BM25Index:
+    def __init__(self, index_path=PATH_LEXICAL_INDEX, k1=1.5, b=0.75):
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self.version = None
+        self.documents = {}
+        self.postings = {}
+        self.total_length = 0
+        self.lock = threading.RLock()
+
+    def load(self):
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            self.version = data.get("version")
+            self.documents = data.get("documents", {})
+            self.postings = data.get("postings", {})
+            self.total_length = sum(entry["length"] for entry in self.documents.values())
+        return self
+
+    def save(self, version):
+        with self.lock:
+            self.version = version
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as fh:
+                json.dump({"version": version, "documents": self.documents, "postings": self.postings}, fh)
+            os.replace(temp_path, self.index_path)
+
+    def clear(self):
+        with self.lock:
+            self.documents = {}
+            self.postings = {}
+            self.total_length = 0
+
+    def add(self, chunk_ids, texts, metadatas):
+        with self.lock:
+            for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas):
+                if chunk_id in self.documents:
+                    self.remove([chunk_id])
+                term_counts = Counter(tokenize(text))
+                length = sum(term_counts.values())
+                self.documents[chunk_id] = {"text": text, "metadata": metadata or {}, "length": length}
+                self.total_length += length
+                for term, count in term_counts.items():
+                    self.postings.setdefault(term, {})[chunk_id] = count
+
+    def add_documents(self, documents, chunk_ids):
+        self.add(chunk_ids, [doc.page_content for doc in documents], [doc.metadata for doc in documents])
+
+    def remove(self, chunk_ids):
+        with self.lock:
+            for chunk_id in chunk_ids:
+                entry = self.documents.pop(chunk_id, None)
+                if entry is None:
+                    continue
+                self.total_length -= entry["length"]
+                for term in set(tokenize(entry["text"])):
+                    postings = self.postings.get(term, {})
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        self.postings.pop(term, None)
+
+    def idf(self, term):
+        postings = self.postings.get(term)
+        if not postings:
+            return 0.0
+        total_docs = len(self.documents)
+        return math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+
+    def inverse_document_frequencies(self, terms):
+        with self.lock:
+            return {term: self.idf(term) for term in terms}
+
+    def search(self, query, k=4, filter=None):
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self.lock:
+            total_docs = len(self.documents)
+            if not terms or not total_docs:
+                return []
+            average_length = self.total_length / total_docs
+            scores = {}
+            allowed = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = self.idf(term)
+                for chunk_id, frequency in postings.items():
+                    if filter:
+                        if chunk_id not in allowed:
+                            allowed[chunk_id] = metadata_matches(self.documents[chunk_id]["metadata"], filter)
+                        if not allowed[chunk_id]:
+                            continue
+                    length_norm = 1 - self.b + self.b * self.documents[chunk_id]["length"] / average_length
+                    weight = idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + weight
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:k]
+
+    def is_decisive(self, query, hits):
+        if not hits:
+            return False
+        top_id, top_score = hits[0]
+        second_score = hits[1][1] if len(hits) > 1 else 0.0
+
+        query_terms = tokenize(query)
+        with self.lock:
+            # Identifiers such as part numbers and error codes are exact lookups.
+            identifiers = [term for term in query_terms if IDENTIFIER_PATTERN.fullmatch(term)]
+            if identifiers and all(top_id in self.postings.get(term, {}) for term in identifiers):
+                return True
+
+            content_terms = {term for term in query_terms if term not in STOP_WORDS}
+            covers_query = bool(content_terms) and all(top_id in self.postings.get(term, {}) for term in content_terms)
+        return covers_query and top_score >= LEXICAL_DECISIVE_MARGIN * second_score
+
+    def to_documents(self, hits):
+        documents = []
+        for chunk_id, _ in hits:
+            entry = self.documents[chunk_id]
+            documents.append(Document(page_content=entry["text"], metadata=dict(entry["metadata"]), id=chunk_id))
+        return documents
+
+
+class HybridRetriever(BaseRetriever):
+    vector_store: Any
+    lexical_index: Any = None
+    k: int = 4
+
+    def lexical_lookup(self, query, filter=None):
+        if self.lexical_index is None:
+            return [], False
+        with timed("lexical"):
+            hits = self.lexical_index.search(query, self.k, filter)
+            return self.lexical_index.to_documents(hits), self.lexical_index.is_decisive(query, hits)
+
+    def vector_lookup(self, query, filter=None):
+        with timed("embedding"):
+            query_vector = self.vector_store.embeddings.embed_query(query)
+        with timed("store"):
+            return self.vector_store.similarity_search_by_vector(query_vector, k=self.k, filter=filter)
+
+    def _get_relevant_documents(self, query, *, run_manager, filter=None):
+        lexical_docs, decisive = self.lexical_lookup(query, filter)
+        if decisive:
+            return lexical_docs
+        vector_docs = self.vector_lookup(query, filter)
+        if not lexical_docs:
+            return vector_docs
+        return reciprocal_rank_fusion([lexical_docs, vector_docs], self.k)
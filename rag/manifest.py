@@ -0,0 +1,116 @@
+import os
+import json
+import hashlib
+
+from config import PATH_INDEX_MANIFEST, PATH_VECTOR_DB, PATH_ACTIVE_INDEX
+
+LEGACY_EMBEDDING_BACKEND = "openai:text-embedding-ada-002"
+LEGACY_VECTOR_STORE = "chroma"
+LEGACY_CHUNKING = "recursive:1050:120"
+
+
+def index_file_path(index_dir, default_path):
+    # The configured paths describe the layout inside PATH_VECTOR_DB; every generation reuses it.
+    return os.path.join(index_dir, os.path.relpath(default_path, PATH_VECTOR_DB))
+
+
+def read_active_index_dir():
+    if os.path.isfile(PATH_ACTIVE_INDEX):
+        with open(PATH_ACTIVE_INDEX, 'r', encoding='utf-8') as fh:
+            return json.load(fh).get("index_dir", PATH_VECTOR_DB)
+    return PATH_VECTOR_DB
+
+
+def write_active_index_dir(index_dir):
+    temp_path = f"{PATH_ACTIVE_INDEX}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as fh:
+        json.dump({"index_dir": index_dir}, fh)
+    os.replace(temp_path, PATH_ACTIVE_INDEX)
+
+
+def compute_file_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_chunk_id(filename, content_hash, index):
+    return f"{filename}:{content_hash[:16]}:{index}"
+
+
+def build_chunk_ids(filename, content_hash, chunk_count):
+    return [build_chunk_id(filename, content_hash, index) for index in range(chunk_count)]
+
+
+class IndexManifest:
+    def __init__(self, manifest_path=PATH_INDEX_MANIFEST):
+        self.manifest_path = manifest_path
+        self.files = {}
+        self.embedding_backend = None
+        self.vector_store = None
+        self.chunking = None
+
+    def exists(self):
+        return os.path.isfile(self.manifest_path)
+
+    def load(self):
+        if self.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+            self.files = data.get("files", {})
+            # Manifests written before backends were configurable were always built with OpenAI.
+            self.embedding_backend = data.get("embedding_backend", LEGACY_EMBEDDING_BACKEND)
+            self.vector_store = data.get("vector_store", LEGACY_VECTOR_STORE)
+            self.chunking = data.get("chunking", LEGACY_CHUNKING)
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as fh:
+            data = {
+                "embedding_backend": self.embedding_backend,
+                "vector_store": self.vector_store,
+                "chunking": self.chunking,
+                "files": self.files
+            }
+            json.dump(data, fh, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def record(self, filename, content_hash, chunk_ids):
+        self.files[filename] = {"hash": content_hash, "chunk_ids": list(chunk_ids)}
+
+    def reset(self, embedding_backend, vector_store, chunking):
+        self.files = {}
+        self.embedding_backend = embedding_backend
+        self.vector_store = vector_store
+        self.chunking = chunking
+
+    def rechunk(self, chunking):
+        # Clearing the hashes makes compare() report every file as changed.
+        self.chunking = chunking
+        for entry in self.files.values():
+            entry["hash"] = None
+
+    def forget(self, filename):
+        self.files.pop(filename, None)
+
+    def chunk_ids(self, filename):
+        return self.files.get(filename, {}).get("chunk_ids", [])
+
+    def version(self):
+        digest = hashlib.sha256(f"{self.embedding_backend}:{self.vector_store}:{self.chunking}\n".encode("utf-8"))
+        for filename in sorted(self.files):
+            digest.update(f"{filename}:{self.files[filename].get('hash')}\n".encode("utf-8"))
+        return digest.hexdigest()[:12]
+
+    def compare(self, current_hashes):
+        added = sorted(f for f in current_hashes if f not in self.files)
+        removed = sorted(f for f in self.files if f not in current_hashes)
+        changed = sorted(
+            f for f in current_hashes
+            if f in self.files and self.files[f].get("hash") != current_hashes[f]
+        )
+        return added, changed, removed
@@ -0,0 +1,170 @@
+import re
+from functools import lru_cache
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+from config import MODEL_NAME, CONTEXT_TOKEN_BUDGET, CONTEXT_RECENT_TURNS, CONTEXT_SUMMARY_SLACK_TURNS
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Ticket IDs come from ticket.create_support_ticket; a reply naming one ends the ticket flow.
+TICKET_ID_PATTERN = re.compile(r"\bTKT-[0-9A-F]{8}\b", re.IGNORECASE)
+
+# Phrases the agent uses to request each ticket field (see AGENT_INSTRUCTIONS).
+TICKET_FIELD_PROMPTS = {
+    "name": re.compile(r"provide your (?:full )?name", re.IGNORECASE),
+    "email": re.compile(r"provide your email", re.IGNORECASE),
+    "summary": re.compile(r"summary/title|(?:summary|title) for (?:the|your) ticket", re.IGNORECASE),
+    "description": re.compile(r"describe the issue", re.IGNORECASE)
+}
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a customer support conversation about Toyota vehicles. "
+    "Update the existing summary with the new messages. Keep vehicle details, symptoms, answers "
+    "already given with their sources, and any open requests. Reply with the summary only, in at most "
+    "150 words."
+)
+
+
+@lru_cache(maxsize=1)
+def get_token_encoder():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(MODEL_NAME)
+    except KeyError:
+        encoding_name = "o200k_base"
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # Encodings are downloaded on first use; fall back to an estimate when offline.
+        return None
+
+
+def count_tokens(text):
+    encoder = get_token_encoder()
+    if encoder is None:
+        return max(1, len(text) // 4)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def to_message(entry):
+    if entry["role"] == "user":
+        return HumanMessage(content=entry["content"])
+    return AIMessage(content=entry["content"])
+
+
+def scan_ticket_fields(history, fields=None, awaiting=None):
+    """Continues collecting ticket fields over ``history`` from a previous scan's fields and
+    awaited field, and returns both for the next scan."""
+    fields = dict(fields or {})
+    for entry in history:
+        content = entry["content"]
+        if entry["role"] == "assistant":
+            if TICKET_ID_PATTERN.search(content):
+                fields = {}
+                awaiting = None
+                continue
+            awaiting = next(
+                (field for field, pattern in TICKET_FIELD_PROMPTS.items() if pattern.search(content)),
+                None
+            )
+            continue
+
+        if awaiting:
+            match = EMAIL_PATTERN.search(content) if awaiting == "email" else None
+            fields[awaiting] = match.group(0) if match else content.strip()
+            awaiting = None
+        elif "email" not in fields:
+            match = EMAIL_PATTERN.search(content)
+            if match and fields:
+                fields["email"] = match.group(0)
+    return fields, awaiting
+
+
+def scan_ticket_flow(history, state=None, offset=0):
+    # Fields given before the summary boundary are pinned in the window state; history may
+    # start at that boundary (offset) or earlier, and only what follows it is scanned.
+    if state is None:
+        return scan_ticket_fields(history)
+    tail = history[max(0, state["summarized_upto"] - offset):]
+    return scan_ticket_fields(tail, state.get("ticket_fields"), state.get("ticket_awaiting"))
+
+
+def extract_ticket_fields(history, state=None, offset=0):
+    return scan_ticket_flow(history, state, offset)[0]
+
+
+def ticket_flow_in_progress(history, state=None, offset=0):
+    # Answering the agent's request for a field counts too, before any field was collected.
+    fields, awaiting = scan_ticket_flow(history, state, offset)
+    return bool(fields) or awaiting is not None
+
+
+def summarize_messages(model, previous_summary, entries):
+    transcript = "\n".join(f"{entry['role'].title()}: {entry['content']}" for entry in entries)
+    response = model.invoke([
+        SystemMessage(content=SUMMARY_INSTRUCTIONS),
+        HumanMessage(content=f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}")
+    ])
+    return response.content.strip()
+
+
+class ConversationWindow:
+    def __init__(self, summary_model, token_budget=CONTEXT_TOKEN_BUDGET, recent_turns=CONTEXT_RECENT_TURNS,
+                 slack_turns=CONTEXT_SUMMARY_SLACK_TURNS):
+        self.summary_model = summary_model
+        self.token_budget = token_budget
+        self.recent_messages = recent_turns * 2
+        self.slack_messages = slack_turns * 2
+
+    def find_window_start(self, history):
+        start = len(history)
+        used_tokens = 0
+        while start > 0 and len(history) - start < self.recent_messages:
+            cost = count_tokens(history[start - 1]["content"])
+            if used_tokens + cost > self.token_budget and start < len(history):
+                break
+            used_tokens += cost
+            start -= 1
+        return start
+
+    def fold_into_summary(self, history, state, offset=0):
+        # Positions in the state count from the start of the conversation; history may be only
+        # its tail, starting at position offset (at most state["summarized_upto"]).
+        window_start = offset + self.find_window_start(history)
+        if window_start <= state["summarized_upto"]:
+            return state["summarized_upto"] - offset
+
+        # Fold a few extra turns at once so the summary is refreshed every few turns, not on each one.
+        fold_until = min(window_start + self.slack_messages, offset + len(history) - 1)
+        fold_until = max(fold_until, window_start)
+        folded = history[state["summarized_upto"] - offset:fold_until - offset]
+        state["summary"] = summarize_messages(self.summary_model, state["summary"], folded)
+        # Ticket fields in the folded messages would otherwise only survive as the summary's paraphrase.
+        state["ticket_fields"], state["ticket_awaiting"] = scan_ticket_fields(
+            folded, state.get("ticket_fields"), state.get("ticket_awaiting")
+        )
+        state["summarized_upto"] = fold_until
+        return fold_until - offset
+
+    def build_messages(self, history, state, offset=0):
+        window_start = self.fold_into_summary(history, state, offset)
+        messages = []
+
+        if state["summary"]:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{state['summary']}"))
+
+        ticket_fields = extract_ticket_fields(history, state, offset)
+        if ticket_fields:
+            pinned = "\n".join(f"- {field}: {value}" for field, value in ticket_fields.items())
+            messages.append(SystemMessage(
+                content=f"Support ticket details the customer has already provided (use verbatim):\n{pinned}"
+            ))
+
+        messages.extend(to_message(entry) for entry in history[window_start:])
+        return messages
+
+
+def new_window_state():
+    return {"summary": "", "summarized_upto": 0, "ticket_fields": {}, "ticket_awaiting": None}
@@ -0,0 +1,232 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    PATH_TICKET_OUTBOX,
+    GITHUB_API_URL,
+    TICKET_MAX_ATTEMPTS,
+    TICKET_RETRY_BASE_SECONDS,
+    TICKET_RETRY_MAX_SECONDS,
+    TICKET_HTTP_TIMEOUT
+)
+
+STATUS_QUEUED = "queued"
+STATUS_DELIVERING = "delivering"
+STATUS_DELIVERED = "delivered"
+STATUS_DEAD = "dead"
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+STALE_DELIVERY_SECONDS = 120
+
+
+def create_http_session(pool_size=4):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def ticket_marker(ticket_id):
+    return f"<!-- support-ticket-id: {ticket_id} -->"
+
+
+class TicketOutbox:
+    def __init__(self, db_path=PATH_TICKET_OUTBOX, api_base_url=GITHUB_API_URL, headers_factory=None,
+                 max_attempts=TICKET_MAX_ATTEMPTS, base_delay=TICKET_RETRY_BASE_SECONDS,
+                 max_delay=TICKET_RETRY_MAX_SECONDS, timeout=TICKET_HTTP_TIMEOUT):
+        self.api_base_url = api_base_url.rstrip("/")
+        self.headers_factory = headers_factory or (lambda: {})
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.session = create_http_session()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.worker = None
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            "ticket_id TEXT PRIMARY KEY, idempotency_key TEXT UNIQUE NOT NULL, api_path TEXT NOT NULL, "
+            "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, issue_url TEXT, last_error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    def enqueue(self, ticket_id, idempotency_key, api_path, payload):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO tickets (ticket_id, idempotency_key, api_path, payload, status, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (ticket_id, idempotency_key, api_path, json.dumps(payload), STATUS_QUEUED, now, now, now)
+            )
+            self.connection.commit()
+            row = self.connection.execute(
+                "SELECT ticket_id FROM tickets WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        self.wakeup.set()
+        return row["ticket_id"]
+
+    def find_by_key(self, idempotency_key):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT ticket_id FROM tickets WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        return row["ticket_id"] if row else None
+
+    def status(self, ticket_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT ticket_id, status, attempts, issue_url, last_error, created_at, updated_at "
+                "FROM tickets WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, ticket_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.connection.execute(
+                f"UPDATE tickets SET {assignments} WHERE ticket_id = ?", (*fields.values(), ticket_id)
+            )
+            self.connection.commit()
+
+    def claim_due_tickets(self):
+        now = time.time()
+        with self.lock:
+            # Deliveries abandoned by a crashed worker are picked up again; the ticket marker
+            # lookup in deliver() keeps that from creating a duplicate issue.
+            self.connection.execute(
+                "UPDATE tickets SET status = ? WHERE status = ? AND updated_at < ?",
+                (STATUS_QUEUED, STATUS_DELIVERING, now - STALE_DELIVERY_SECONDS)
+            )
+            rows = self.connection.execute(
+                "SELECT * FROM tickets WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at",
+                (STATUS_QUEUED, now)
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                cursor = self.connection.execute(
+                    "UPDATE tickets SET status = ?, attempts = attempts + 1, updated_at = ? "
+                    "WHERE ticket_id = ? AND status = ?",
+                    (STATUS_DELIVERING, now, row["ticket_id"], STATUS_QUEUED)
+                )
+                if cursor.rowcount:
+                    claimed.append({**dict(row), "attempts": row["attempts"] + 1})
+            self.connection.commit()
+        return claimed
+
+    def seconds_until_next_ticket(self):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT MIN(next_attempt_at) AS due FROM tickets WHERE status = ?", (STATUS_QUEUED,)
+            ).fetchone()
+        if row["due"] is None:
+            return None
+        return max(0.0, row["due"] - time.time())
+
+    def find_existing_issue(self, api_path, ticket_id, headers):
+        response = self.session.get(
+            f"{self.api_base_url}{api_path}",
+            params={"state": "all", "labels": "support-ticket", "sort": "created", "per_page": 50},
+            headers=headers,
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            return None
+        marker = ticket_marker(ticket_id)
+        for issue in response.json():
+            if marker in (issue.get("body") or ""):
+                return issue.get("html_url")
+        return None
+
+    def retry_delay(self, attempts, retry_after=None):
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def schedule_retry(self, ticket, error, retry_after=None):
+        if ticket["attempts"] >= self.max_attempts:
+            print(f"[TICKET_MODULE] Ticket {ticket['ticket_id']} dead-lettered after {ticket['attempts']} attempts: {error}")
+            self.update(ticket["ticket_id"], status=STATUS_DEAD, last_error=error)
+            return
+        delay = self.retry_delay(ticket["attempts"], retry_after)
+        print(f"[TICKET_MODULE] Ticket {ticket['ticket_id']} attempt {ticket['attempts']} failed ({error}); "
+              f"retrying in {delay:.1f}s")
+        self.update(ticket["ticket_id"], status=STATUS_QUEUED, last_error=error, next_attempt_at=time.time() + delay)
+
+    def deliver(self, ticket):
+        headers = {**self.headers_factory(), "Idempotency-Key": ticket["idempotency_key"]}
+        url = f"{self.api_base_url}{ticket['api_path']}"
+        try:
+            if ticket["attempts"] > 1:
+                existing_url = self.find_existing_issue(ticket["api_path"], ticket["ticket_id"], headers)
+                if existing_url:
+                    self.update(ticket["ticket_id"], status=STATUS_DELIVERED, issue_url=existing_url, last_error=None)
+                    return
+
+            response = self.session.post(url, json=json.loads(ticket["payload"]), headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as error:
+            self.schedule_retry(ticket, f"{type(error).__name__}: {error}")
+            return
+
+        if response.status_code in (200, 201):
+            issue_link = response.json().get("html_url")
+            print(f"[TICKET_MODULE] Ticket {ticket['ticket_id']} delivered: {issue_link}")
+            self.update(ticket["ticket_id"], status=STATUS_DELIVERED, issue_url=issue_link, last_error=None)
+            return
+
+        try:
+            error_description = response.json().get("message", "Unknown error occurred")
+        except ValueError:
+            error_description = response.text[:200] or "Unknown error occurred"
+        error = f"{response.status_code} – {error_description}"
+
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            retry_after = response.headers.get("Retry-After")
+            self.schedule_retry(ticket, error, float(retry_after) if retry_after and retry_after.isdigit() else None)
+        else:
+            print(f"[TICKET_MODULE] Ticket {ticket['ticket_id']} rejected: {error}")
+            self.update(ticket["ticket_id"], status=STATUS_DEAD, last_error=error)
+
+    def process_due_tickets(self):
+        tickets = self.claim_due_tickets()
+        for ticket in tickets:
+            self.deliver(ticket)
+        return len(tickets)
+
+    def run_worker(self):
+        while not self.stopping.is_set():
+            try:
+                self.process_due_tickets()
+            except Exception as error:
+                print(f"[TICKET_MODULE] Outbox worker error: {error}")
+            wait_seconds = self.seconds_until_next_ticket()
+            self.wakeup.wait(timeout=30.0 if wait_seconds is None else min(30.0, max(0.05, wait_seconds)))
+            self.wakeup.clear()
+
+    def start(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.stopping.clear()
+            self.worker = threading.Thread(target=self.run_worker, name="ticket-outbox", daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self.stopping.set()
+        self.wakeup.set()
+        if self.worker is not None:
+            self.worker.join(timeout)
@@ -0,0 +1,204 @@
+import re
+import json
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from config import (
+    OPENAI_REQUESTS_PER_MINUTE,
+    OPENAI_TOKENS_PER_MINUTE,
+    OPENAI_MAX_RETRIES,
+    OPENAI_MIN_RATE_FRACTION
+)
+from telemetry import get_metrics_sink
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+DEFAULT_COMPLETION_TOKENS = 512
+RECOVERY_STEP = 0.02
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_priority = contextvars.ContextVar("openai_request_priority", default=PRIORITY_INTERACTIVE)
+_limiter = None
+_http_client = None
+_client_lock = threading.Lock()
+
+
+@contextmanager
+def request_priority(priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_duration(value):
+    # OpenAI reset headers look like "1s", "6m0s" or "20ms".
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in DURATION_PATTERN.findall(value))
+
+
+def estimate_request_tokens(request):
+    try:
+        payload = json.loads(request.content or b"{}")
+    except ValueError:
+        return 1
+    if "input" in payload:
+        inputs = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+        # Embedding inputs are sent either as text or, by OpenAIEmbeddings, as token ID arrays.
+        return max(1, sum(len(item) if isinstance(item, list) else len(str(item)) // 4 for item in inputs))
+    prompt_tokens = sum(len(json.dumps(message, ensure_ascii=False)) // 4 for message in payload.get("messages", []))
+    completion_tokens = payload.get("max_completion_tokens") or payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return max(1, prompt_tokens + completion_tokens)
+
+
+def is_rate_limit_error(error):
+    return getattr(error, "status_code", None) == 429
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now, scale):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait_time(self, amount, scale):
+        # A request larger than the whole bucket waits for a full bucket instead of forever.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.rate * scale)
+
+    def take(self, amount):
+        self.level -= amount
+
+
+class RateLimiter:
+    """Process-wide request and token budget for OpenAI calls.
+
+    Waiting callers are served in priority order, so a burst of background ingestion never
+    delays a customer's turn by more than one request. A 429 pauses everyone until the
+    provider's retry time and halves the refill rate, which recovers step by step on success;
+    ``x-ratelimit-remaining-*`` headers pull the local buckets down to the provider's view.
+    """
+
+    def __init__(self, requests_per_minute=OPENAI_REQUESTS_PER_MINUTE, tokens_per_minute=OPENAI_TOKENS_PER_MINUTE,
+                 min_rate_fraction=OPENAI_MIN_RATE_FRACTION):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_rate_fraction = min_rate_fraction
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+        self.waiters = []
+        self.sequence = itertools.count()
+
+    def acquire(self, token_count, priority=PRIORITY_INTERACTIVE):
+        started = time.monotonic()
+        ticket = (priority, next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now, self.scale)
+                    self.tokens.refill(now, self.scale)
+                    delay = None
+                    if self.waiters[0] == ticket:
+                        delay = max(
+                            self.blocked_until - now,
+                            self.requests.wait_time(1, self.scale),
+                            self.tokens.wait_time(token_count, self.scale)
+                        )
+                        if delay <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(token_count)
+                            break
+                    self.condition.wait(delay)
+            finally:
+                self.waiters.remove(ticket)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()
+
+        waited = time.monotonic() - started
+        if waited >= 0.05:
+            get_metrics_sink().record_observation(
+                "rag_openai_throttle_seconds", waited, priority=PRIORITY_NAMES.get(priority, priority)
+            )
+        return waited
+
+    def observe_response(self, status_code, headers):
+        now = time.monotonic()
+        with self.condition:
+            if status_code == 429:
+                retry_after = parse_duration(headers.get("retry-after-ms", "")) / 1000.0 if headers.get("retry-after-ms") \
+                    else parse_duration(headers.get("retry-after") or headers.get("x-ratelimit-reset-requests") or "1s")
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+                self.scale = max(self.min_rate_fraction, self.scale / 2)
+            else:
+                self.scale = min(1.0, self.scale + RECOVERY_STEP)
+
+            for bucket, name in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if remaining is None:
+                    continue
+                bucket.refill(now, self.scale)
+                bucket.level = min(bucket.level, float(remaining))
+                if float(remaining) <= 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}"))
+                    self.blocked_until = max(self.blocked_until, now + reset)
+            self.condition.notify_all()
+
+        if status_code == 429:
+            get_metrics_sink().record_counter("rag_openai_rate_limited_total")
+
+
+def get_rate_limiter():
+    global _limiter
+    with _client_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def get_openai_http_client():
+    """One HTTP client, and so one connection pool, for every OpenAI model in the process."""
+    global _http_client
+    limiter = get_rate_limiter()
+    with _client_lock:
+        if _http_client is None:
+            import httpx
+
+            def before_request(request):
+                limiter.acquire(estimate_request_tokens(request), _priority.get())
+
+            def after_response(response):
+                limiter.observe_response(response.status_code, response.headers)
+
+            _http_client = httpx.Client(
+                event_hooks={"request": [before_request], "response": [after_response]},
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=httpx.Timeout(60.0, connect=10.0)
+            )
+        return _http_client
+
+
+def openai_client_settings():
+    # Retries pass through the limiter again, so they wait out the pause a 429 starts.
+    return {"http_client": get_openai_http_client(), "max_retries": OPENAI_MAX_RETRIES}
@@ -0,0 +1,180 @@
+import os
+import re
+from collections import Counter
+
+WORD_PATTERN = re.compile(r"\w+")
+YEAR_PATTERN = re.compile(r"\b(19[89]\d|20[0-4]\d)\b")
+QUESTION_PATTERN = re.compile(r"^Q:\s", re.MULTILINE)
+
+GENERAL = "general"
+DEFAULT_LANGUAGE = "en"
+TAGGING_VERSION = "tags2"
+SAMPLE_CHARACTERS = 4000
+# A model named only in the text must be mentioned this often, and twice as often as any other.
+DOMINANT_MODEL_MENTIONS = 3
+
+VEHICLE_MODELS = (
+    "4Runner", "Avalon", "Aygo", "bZ4X", "C-HR", "Camry", "Corolla", "Corolla Cross",
+    "Fortuner", "GR86", "GR Yaris", "Hiace", "Highlander", "Hilux", "Innova", "Land Cruiser", "Mirai",
+    "Prius", "RAV4", "Sequoia", "Sienna", "Supra", "Tacoma", "Tundra", "Venza", "Yaris", "Yaris Cross"
+)
+DOC_TYPE_TERMS = {
+    "manual": "manual", "handbook": "manual", "faq": "faq", "faqs": "faq", "policy": "policy", "policies": "policy"
+}
+# Document types that answer questions about every model, whichever models their text mentions.
+GENERAL_DOC_TYPES = {"faq", "policy"}
+LANGUAGE_STOP_WORDS = {
+    "en": {"the", "and", "of", "to", "is", "with", "for", "your", "this", "that", "are", "when"},
+    "es": {"el", "los", "las", "del", "y", "que", "con", "para", "una", "por", "es", "cómo"},
+    "fr": {"le", "les", "des", "et", "est", "pour", "avec", "une", "du", "dans", "au", "comment"},
+    "de": {"der", "die", "das", "und", "ist", "mit", "für", "ein", "eine", "nicht", "wie", "den"},
+    "pt": {"os", "as", "do", "da", "e", "que", "com", "para", "uma", "não", "como", "em"}
+}
+
+
+def model_slug(name):
+    return "-".join(name.lower().replace("-", " ").split())
+
+
+def model_pattern(name):
+    words = name.lower().replace("-", " ").split()
+    return re.compile(r"(?<![\w-])" + r"[\s-]?".join(map(re.escape, words)) + r"(?![\w-])", re.IGNORECASE)
+
+
+# Longer names first, so "Corolla Cross" is not also reported as "Corolla".
+MODEL_PATTERNS = [(model_slug(name), model_pattern(name)) for name in sorted(VEHICLE_MODELS, key=len, reverse=True)]
+
+
+def count_models(text):
+    counts = Counter()
+    for slug, pattern in MODEL_PATTERNS:
+        matches = len(pattern.findall(text))
+        if matches:
+            counts[slug] = matches
+            text = pattern.sub(" ", text)
+    return counts
+
+
+def detect_models(text):
+    return [slug for slug, _ in count_models(text).most_common()]
+
+
+def dominant_model(text):
+    ranked = count_models(text).most_common(2)
+    if not ranked or ranked[0][1] < DOMINANT_MODEL_MENTIONS:
+        return None
+    if len(ranked) > 1 and ranked[0][1] < 2 * ranked[1][1]:
+        return None
+    return ranked[0][0]
+
+
+def detect_language(text, min_hits=1):
+    words = WORD_PATTERN.findall(text.lower())
+    hits = {language: sum(word in stop_words for word in words) for language, stop_words in LANGUAGE_STOP_WORDS.items()}
+    language = max(hits, key=hits.get)
+    return language if hits[language] >= min_hits else None
+
+
+def metadata_matches(metadata, shard_filter):
+    for key, allowed in shard_filter.items():
+        value = metadata.get(key)
+        if isinstance(allowed, (list, tuple, set)):
+            if value not in allowed:
+                return False
+        elif value != allowed:
+            return False
+    return True
+
+
+def filter_key(shard_filter):
+    if not shard_filter:
+        return None
+    return tuple(sorted((key, tuple(values)) for key, values in shard_filter.items()))
+
+
+class DocumentTagger:
+    """Derives the routing metadata of a file from its name and its first pages.
+
+    Every chunk gets ``vehicle_model``, ``model_year``, ``doc_type`` and ``language``;
+    documents that are not about one model or year (FAQs, policies) are tagged ``general``.
+    A model is taken from the text only for manuals, or when one model clearly dominates it,
+    since FAQs and brochures mention several models in passing.
+    """
+
+    def tag_file(self, source, documents):
+        name = os.path.splitext(os.path.basename(source))[0]
+        sample = "\n".join(doc.page_content for doc in documents[:3])[:SAMPLE_CHARACTERS]
+        doc_type = self.detect_doc_type(source, name, sample)
+
+        model, year = None, None
+        if doc_type not in GENERAL_DOC_TYPES:
+            model = next(iter(detect_models(name)), None)
+            if model is None:
+                model = next(iter(detect_models(sample)), None) if doc_type == "manual" else dominant_model(sample)
+            years = YEAR_PATTERN.findall(name)
+            if not years and model:
+                # A year in the text only identifies the model year of a vehicle-specific document.
+                years = YEAR_PATTERN.findall(sample)[:1]
+            year = years[0] if years else None
+
+        return {
+            "vehicle_model": model or GENERAL,
+            "model_year": year or GENERAL,
+            "doc_type": doc_type,
+            "language": detect_language(sample) or DEFAULT_LANGUAGE
+        }
+
+    def detect_doc_type(self, source, name, sample):
+        words = set(WORD_PATTERN.findall(name.lower().replace("_", " ")))
+        for word, doc_type in DOC_TYPE_TERMS.items():
+            if word in words:
+                return doc_type
+        if len(QUESTION_PATTERN.findall(sample)) >= 2:
+            return "faq"
+        return "manual" if source.lower().endswith('.pdf') else "document"
+
+
+class QueryRouter:
+    """Restricts a search to the shards a question names: vehicle model, model year, document type.
+
+    Only values that exist in the index are routed to, and ``general`` documents stay in
+    every model and year shard, so a question about a model without its own manual still
+    searches the FAQ. Language is routed only when the index holds more than one.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+
+    @classmethod
+    def from_lexical_index(cls, lexical_index):
+        shards = {"vehicle_model": Counter(), "model_year": Counter(), "doc_type": Counter(), "language": Counter()}
+        if lexical_index is not None:
+            with lexical_index.lock:
+                for entry in lexical_index.documents.values():
+                    for field, counts in shards.items():
+                        value = entry["metadata"].get(field)
+                        if value is not None:
+                            counts[value] += 1
+        return cls(shards)
+
+    def route(self, query):
+        shard_filter = {}
+        models = [slug for slug in detect_models(query) if slug in self.shards["vehicle_model"]]
+        if models:
+            shard_filter["vehicle_model"] = models + [GENERAL]
+        years = [year for year in dict.fromkeys(YEAR_PATTERN.findall(query)) if year in self.shards["model_year"]]
+        if years:
+            shard_filter["model_year"] = years + [GENERAL]
+
+        words = set(WORD_PATTERN.findall(query.lower()))
+        doc_types = list(dict.fromkeys(
+            doc_type for word, doc_type in DOC_TYPE_TERMS.items() if word in words and doc_type in self.shards["doc_type"]
+        ))
+        if len(doc_types) == 1:
+            shard_filter["doc_type"] = doc_types
+
+        if len(self.shards["language"]) > 1:
+            language = detect_language(query, min_hits=2)
+            if language in self.shards["language"]:
+                shard_filter["language"] = [language]
+        return shard_filter or None
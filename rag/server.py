@@ -0,0 +1,351 @@
+"""Headless HTTP API for the support agent.
+
+    python server.py --workers 4 --port 8000
+
+The supervisor process keeps the index synchronized with ``documents/`` and starts worker
+processes that all accept on the same port (SO_REUSEPORT) and open the active index read-only.
+
+    GET  /healthz                           liveness
+    GET  /readyz                            readiness, with the served index version
+    POST /v1/search                         {"queries": ["..."]}
+    POST /v1/sessions                       creates a conversation
+    GET  /v1/sessions/<id>?limit=&before=   a page of the conversation, newest last
+    POST /v1/sessions/<id>/messages         {"message": "...", "stream": false}
+
+Streamed turns are sent as server-sent events: ``status`` (tool progress), ``reset`` (a new
+completion started, discard streamed text), ``token`` and a final ``done`` with the answer.
+"""
+import os
+import re
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import (
+    API_HOST,
+    API_PORT,
+    API_WORKERS,
+    API_MAX_CONCURRENT_TURNS,
+    API_MAX_QUEUED_REQUESTS,
+    API_QUEUE_TIMEOUT_SECONDS,
+    API_INDEX_RETIRE_SECONDS,
+    CHAT_PAGE_SIZE,
+    WARMUP_ON_START
+)
+from core import AgentResourceCache, ApplicationController
+from sessions import get_session_store
+from telemetry import get_metrics_sink
+from ui import TOOL_PROGRESS_MESSAGES
+
+SESSION_PATH_PATTERN = re.compile(r"^/v1/sessions/([0-9a-f]{32})(/messages)?$")
+
+
+class ServerBusy(Exception):
+    pass
+
+
+class AdmissionQueue:
+    """Bounds concurrent agent work per worker and rejects requests once the queue is full.
+
+    Rejecting early with 503 lets a load balancer retry on a less busy worker instead of
+    piling up requests that would time out anyway.
+    """
+
+    def __init__(self, max_active=API_MAX_CONCURRENT_TURNS, max_queued=API_MAX_QUEUED_REQUESTS,
+                 timeout=API_QUEUE_TIMEOUT_SECONDS):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.slots = threading.Semaphore(max_active)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {"active": self.active, "queued": self.waiting, "max_active": self.max_active,
+                    "max_queued": self.max_queued}
+
+    @contextmanager
+    def admit(self):
+        with self.lock:
+            if self.active + self.waiting >= self.max_active + self.max_queued:
+                raise ServerBusy("Request queue is full")
+            self.waiting += 1
+        acquired = self.slots.acquire(timeout=self.timeout)
+        with self.lock:
+            self.waiting -= 1
+            if acquired:
+                self.active += 1
+        if not acquired:
+            raise ServerBusy("Timed out waiting in the request queue")
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active -= 1
+            self.slots.release()
+
+
+class ServerSentEventHandler(BaseCallbackHandler):
+    def __init__(self, request_handler):
+        self.request_handler = request_handler
+        self.lock = threading.Lock()
+        self.disconnected = False
+
+    def send(self, event, data):
+        if self.disconnected:
+            return
+        payload = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+        with self.lock:
+            try:
+                self.request_handler.wfile.write(payload)
+                self.request_handler.wfile.flush()
+            except OSError:
+                # The answer is still stored with the session, so the client can fetch it later.
+                self.disconnected = True
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.send("reset", {})
+
+    def on_llm_new_token(self, token, **kwargs):
+        if token:
+            self.send("token", {"text": token})
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        tool_name = (serialized or {}).get("name", "tool")
+        self.send("status", {"text": TOOL_PROGRESS_MESSAGES.get(tool_name, f"Running {tool_name}…")})
+
+
+class SupportAPIServer(ThreadingHTTPServer):
+    # Non-daemon request threads are joined by server_close(), so a stopping worker drains.
+    daemon_threads = False
+
+    def __init__(self, address, handler_class):
+        from vector import ReadOnlyIndex
+        self.index = ReadOnlyIndex()
+        self.resources = AgentResourceCache(warm_up=WARMUP_ON_START)
+        self.admission = AdmissionQueue()
+        self.sessions = get_session_store()
+        super().__init__(address, handler_class)
+
+    def server_bind(self):
+        # Every worker binds the same port and the kernel spreads connections across them.
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def current_resources(self):
+        knowledge_base = self.index.current()
+        if knowledge_base is None:
+            return None
+        return self.resources.get(knowledge_base)
+
+
+class SupportAPIRequestHandler(BaseHTTPRequestHandler):
+    server_version = "SupportAPI/1.0"
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/healthz":
+            self.send_json(200, {"status": "ok", "pid": os.getpid()})
+            return
+        if url.path == "/readyz":
+            self.handle_readiness()
+            return
+        match = SESSION_PATH_PATTERN.match(url.path)
+        if match and not match.group(2):
+            self.handle_history(match.group(1), parse_qs(url.query))
+            return
+        self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        try:
+            body = self.read_json()
+        except ValueError:
+            self.send_json(400, {"error": "Request body must be a JSON object"})
+            return
+
+        try:
+            if self.path == "/v1/search":
+                self.handle_search(body)
+                return
+            if self.path == "/v1/sessions":
+                self.send_json(201, {"session_id": self.server.sessions.create()})
+                return
+            match = SESSION_PATH_PATTERN.match(self.path)
+            if match and match.group(2):
+                self.handle_turn(match.group(1), body)
+                return
+            self.send_json(404, {"error": "Not found"})
+        except ServerBusy as error:
+            get_metrics_sink().record_counter("rag_api_rejected_total")
+            self.send_json(503, {"error": str(error)}, headers={"Retry-After": "1"})
+
+    def handle_readiness(self):
+        knowledge_base = self.server.index.current()
+        payload = {
+            "ready": knowledge_base is not None,
+            "index_version": knowledge_base.lexical_index.version if knowledge_base is not None else None,
+            "pid": os.getpid(),
+            "queue": self.server.admission.snapshot()
+        }
+        self.send_json(200 if payload["ready"] else 503, payload)
+
+    def handle_history(self, session_id, parameters):
+        if not self.server.sessions.exists(session_id):
+            self.send_json(404, {"error": "Unknown session"})
+            return
+        try:
+            limit = min(int(parameters.get("limit", [CHAT_PAGE_SIZE])[0]), 500)
+            before = int(parameters["before"][0]) if "before" in parameters else None
+        except ValueError:
+            self.send_json(400, {"error": "\"limit\" and \"before\" must be integers"})
+            return
+        messages, start = self.server.sessions.load_page(session_id, limit, before)
+        # "before" for the next older page; null once the start of the conversation is reached.
+        self.send_json(200, {"session_id": session_id, "messages": messages, "before": start or None})
+
+    def handle_search(self, body):
+        queries = body.get("queries") or ([body["query"]] if body.get("query") else [])
+        if not isinstance(queries, list) or not queries:
+            self.send_json(400, {"error": "Provide \"queries\" as a list of strings"})
+            return
+
+        with self.server.admission.admit():
+            resources = self.server.current_resources()
+            if resources is None:
+                self.send_json(503, {"error": "The knowledge base is not loaded yet"}, headers={"Retry-After": "5"})
+                return
+            search_tool = next(tool for tool in resources.tools if tool.name == "search_knowledge_base")
+            results = search_tool.invoke({"search_queries": [str(query) for query in queries]})
+        self.send_json(200, {"index_version": resources.index_version, "results": results})
+
+    def handle_turn(self, session_id, body):
+        query = str(body.get("message") or "").strip()
+        if not query:
+            self.send_json(400, {"error": "Provide a non-empty \"message\""})
+            return
+        session = self.server.sessions.load_context(session_id)
+        if session is None:
+            self.send_json(404, {"error": "Unknown session"})
+            return
+
+        history, window_state, history_offset = session
+        history.append({"role": "user", "content": query})
+        with self.server.admission.admit():
+            resources = self.server.current_resources()
+            if resources is None:
+                self.send_json(503, {"error": "The knowledge base is not loaded yet"}, headers={"Retry-After": "5"})
+                return
+            controller = ApplicationController().attach_resources(resources)
+
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                events = ServerSentEventHandler(self)
+                response, cached = controller.answer(query, history, window_state, [events], history_offset)
+            else:
+                events = None
+                response, cached = controller.answer(query, history, window_state, history_offset=history_offset)
+
+        self.server.sessions.append(
+            session_id,
+            [{"role": "user", "content": query}, {"role": "assistant", "content": response}],
+            window_state
+        )
+        result = {"session_id": session_id, "response": response, "cached": cached,
+                  "index_version": resources.index_version}
+        if events is not None:
+            events.send("done", result)
+        else:
+            self.send_json(200, result)
+
+
+def run_worker(host, port):
+    # The supervisor exports the metrics of every worker; a worker only writes its own totals.
+    metrics_sink = get_metrics_sink(exporter=False)
+    server = SupportAPIServer((host, port), SupportAPIRequestHandler)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"[SERVER_MODULE] Worker {os.getpid()} serving on {host}:{port}")
+    server.serve_forever()
+    server.server_close()
+    metrics_sink.flush()
+
+
+def run_supervisor(host, port, worker_count):
+    from vector import LiveIndex
+
+    # Merges the workers' totals into metrics.prom and serves them on TELEMETRY_METRICS_PORT.
+    get_metrics_sink()
+    # Workers only read the index; this process is the single writer and swaps in new generations.
+    # Retired generations are kept for a while since workers switch on their next pointer check.
+    live_index = LiveIndex(interactive=False, retire_delay=API_INDEX_RETIRE_SECONDS).load().start_watcher()
+    if live_index.current() is None:
+        print("[SERVER_MODULE] No documents found; workers report not ready until documents are added")
+
+    context = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+
+    def start_worker():
+        process = context.Process(target=run_worker, args=(host, port), name="support-api-worker")
+        process.start()
+        return process
+
+    workers = [start_worker() for _ in range(worker_count)]
+    while not stopping.is_set():
+        for index, process in enumerate(workers):
+            if not process.is_alive():
+                print(f"[SERVER_MODULE] Worker {process.pid} exited with {process.exitcode}; restarting")
+                workers[index] = start_worker()
+        stopping.wait(1.0)
+
+    for process in workers:
+        process.terminate()
+    deadline = time.monotonic() + API_QUEUE_TIMEOUT_SECONDS
+    for process in workers:
+        process.join(max(0.0, deadline - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless HTTP API for the support assistant.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    arguments = parser.parse_args()
+    run_supervisor(arguments.host, arguments.port, max(1, arguments.workers))
+
+
+if __name__ == "__main__":
+    main()
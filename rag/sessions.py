@@ -0,0 +1,115 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from config import PATH_SESSION_STORE
+from memory import new_window_state
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+class SessionStore:
+    """Conversation history and summary state by session ID, shared by every serving process."""
+
+    def __init__(self, db_path=PATH_SESSION_STORE):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, window_state TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, position INTEGER NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (session_id, position))"
+        )
+        self.connection.commit()
+
+    def create(self):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT INTO sessions (session_id, window_state, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(new_window_state()), now, now)
+            )
+            self.connection.commit()
+        return session_id
+
+    def window_state(self, session_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT window_state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, session_id):
+        return self.window_state(session_id) is not None
+
+    def count(self, session_id):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def read_messages(self, session_id, start=0, end=None):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND position >= ? AND position < ? "
+                "ORDER BY position",
+                (session_id, start, end if end is not None else 2 ** 62)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def load_page(self, session_id, limit, before=None):
+        """Returns up to ``limit`` messages ending just before position ``before`` and their start position."""
+        end = self.count(session_id) if before is None else before
+        start = max(0, end - limit)
+        return self.read_messages(session_id, start, end), start
+
+    def load_context(self, session_id):
+        """Returns what a new turn needs: the history not yet folded into the summary, the
+        summary state and the position of the first returned message.
+
+        Reading from the summary boundary keeps the cost of a turn independent of how long
+        the conversation already is. Ticket fields given before the boundary are kept in the
+        summary state, so they stay pinned.
+        """
+        window_state = self.window_state(session_id)
+        if window_state is None:
+            return None
+        offset = window_state["summarized_upto"]
+        return self.read_messages(session_id, offset), window_state, offset
+
+    def append(self, session_id, entries, window_state):
+        now = time.time()
+        with self.lock:
+            # Taking the write lock before reading the next position keeps workers that append
+            # to the same session from claiming the same positions.
+            self.connection.execute("BEGIN IMMEDIATE")
+            with self.connection:
+                position = self.connection.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                self.connection.executemany(
+                    "INSERT INTO messages (session_id, position, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, position + offset, entry["role"], entry["content"], now)
+                     for offset, entry in enumerate(entries)]
+                )
+                self.connection.execute(
+                    "UPDATE sessions SET window_state = ?, updated_at = ? WHERE session_id = ?",
+                    (json.dumps(window_state), now, session_id)
+                )
+
+
+def get_session_store():
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore()
+        return _session_store
@@ -0,0 +1,535 @@
+import os
+import json
+import time
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import (
+    PATH_TELEMETRY,
+    TELEMETRY_LOG_MAX_MB,
+    TELEMETRY_LOG_BACKUPS,
+    TELEMETRY_METRICS_PORT,
+    TELEMETRY_FLUSH_SECONDS,
+    TELEMETRY_PROFILE_SAMPLE_RATE,
+    TELEMETRY_PROFILER
+)
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ITERATION_BUCKETS = (1, 2, 3, 4, 6, 10)
+
+_active_turn = contextvars.ContextVar("active_turn", default=None)
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def record_timing(stage, seconds):
+    turn = _active_turn.get()
+    if turn is not None:
+        turn.add_timing(stage, seconds)
+
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - started)
+
+
+def extract_token_usage(response):
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    if not usage:
+        # Streamed completions carry usage on the final message instead of llm_output.
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += metadata.get("input_tokens", 0)
+                completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+class TurnProfiler:
+    def __init__(self, turn_id, profiler_name=TELEMETRY_PROFILER):
+        self.turn_id = turn_id
+        self.profiler_name = profiler_name
+        self.profiler = None
+
+    def start(self):
+        try:
+            if self.profiler_name == "pyinstrument":
+                from pyinstrument import Profiler
+                self.profiler = Profiler()
+                self.profiler.start()
+            else:
+                import cProfile
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+        except (ImportError, ValueError, RuntimeError) as error:
+            # Only one profiler can be active per interpreter; concurrent sampled turns skip it.
+            print(f"[TELEMETRY_MODULE] Profiling skipped for turn {self.turn_id}: {error}")
+            self.profiler = None
+        return self
+
+    def stop(self):
+        if self.profiler is None:
+            return None
+        profile_dir = os.path.join(PATH_TELEMETRY, "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+        if self.profiler_name == "pyinstrument":
+            self.profiler.stop()
+            profile_path = os.path.join(profile_dir, f"{self.turn_id}.html")
+            with open(profile_path, 'w', encoding='utf-8') as fh:
+                fh.write(self.profiler.output_html())
+        else:
+            self.profiler.disable()
+            profile_path = os.path.join(profile_dir, f"{self.turn_id}.prof")
+            self.profiler.dump_stats(profile_path)
+        return profile_path
+
+
+class StageTimer:
+    def __init__(self, started=None):
+        self.started = started or time.perf_counter()
+        self.last_mark = self.started
+        self.stages = {}
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last_mark
+        self.last_mark = now
+
+    def total(self):
+        return self.last_mark - self.started
+
+    def describe(self):
+        return ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in self.stages.items())
+
+
+class TurnRecord:
+    def __init__(self, turn_id):
+        self.turn_id = turn_id
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.run_ids = {turn_id}
+        self.run_started = {}
+        self.llm_calls = []
+        self.tool_calls = []
+        self.open_tools = {}
+        self.timings = {}
+        self.profiler = None
+
+    def add_timing(self, stage, seconds):
+        # Stages measured inside a tool (embedding, store lookup) are attributed to that call.
+        target = next(reversed(self.open_tools.values()), None) if self.open_tools else None
+        timings = target.setdefault("stages", {}) if target is not None else self.timings
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def to_dict(self, error=None):
+        prompt_tokens = sum(call["prompt_tokens"] for call in self.llm_calls)
+        completion_tokens = sum(call["completion_tokens"] for call in self.llm_calls)
+        record = {
+            "turn_id": str(self.turn_id),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "wall_seconds": round(time.perf_counter() - self.started, 4),
+            "iterations": len(self.llm_calls),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "status": "error" if error else "ok"
+        }
+        if self.timings:
+            record["stages"] = self.timings
+        if error:
+            record["error"] = f"{type(error).__name__}: {error}"
+        return record
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def merge(self, counts, total, count):
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.total += total
+        self.count += count
+
+
+def format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def render_prometheus(counters, histograms):
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+            if metric != name:
+                continue
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{name}_bucket{format_labels(labels, ('le', bound))} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.total:.6f}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def merge_snapshots(snapshots):
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, counts, total, count in snapshot["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if key not in histograms:
+                histograms[key] = Histogram(tuple(buckets))
+            histograms[key].merge(counts, total, count)
+    return counters, histograms
+
+
+def write_atomically(path, text):
+    # A node_exporter textfile collector or the exporting process never reads a partial file.
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as fh:
+        fh.write(text)
+    os.replace(temp_path, path)
+
+
+def process_is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsSink:
+    """Counters and histograms of this process, exported in the Prometheus text format.
+
+    Records only update memory. Every ``flush_seconds`` each process writes its totals to
+    ``processes/<pid>.json``; the exporting process (the app, or the API supervisor) merges
+    the totals of every process into ``metrics.prom`` and serves them on ``metrics_port``.
+    API workers set ``exporter=False``, so they neither bind the port nor overwrite the file.
+    """
+
+    def __init__(self, telemetry_dir=PATH_TELEMETRY, metrics_port=TELEMETRY_METRICS_PORT, exporter=True,
+                 flush_seconds=TELEMETRY_FLUSH_SECONDS, process_id=None):
+        # Absolute, so the exit flush still finds the directory after the process changes directory.
+        telemetry_dir = os.path.abspath(telemetry_dir)
+        self.telemetry_dir = telemetry_dir
+        self.metrics_path = os.path.join(telemetry_dir, "metrics.prom")
+        self.process_dir = os.path.join(telemetry_dir, "processes")
+        self.state_path = os.path.join(self.process_dir, f"{process_id or os.getpid()}.json")
+        self.exporter = exporter
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.dirty = False
+        self.exported_files = None
+        self.server = None
+
+        os.makedirs(self.process_dir, exist_ok=True)
+        self.logger = logging.getLogger("rag.telemetry.turns")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(
+                os.path.join(telemetry_dir, "turns.jsonl"),
+                maxBytes=TELEMETRY_LOG_MAX_MB * 1024 * 1024,
+                backupCount=TELEMETRY_LOG_BACKUPS,
+                encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+        if exporter:
+            self.remove_exited_processes()
+            if metrics_port:
+                self.start_server(metrics_port)
+        if flush_seconds:
+            threading.Thread(target=self.flush_periodically, args=(flush_seconds,), name="metrics-flush",
+                             daemon=True).start()
+        atexit.register(self.try_flush)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+        self.dirty = True
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].observe(value)
+        self.dirty = True
+
+    def record_counter(self, name, value=1, **labels):
+        with self.lock:
+            self.increment(name, value, **labels)
+
+    def record_observation(self, name, value, **labels):
+        with self.lock:
+            self.observe(name, value, **labels)
+
+    def record_turn(self, record):
+        self.logger.info(json.dumps(record, ensure_ascii=False))
+        with self.lock:
+            self.increment("rag_turns_total", status=record["status"])
+            self.increment("rag_llm_tokens_total", record["prompt_tokens"], kind="prompt")
+            self.increment("rag_llm_tokens_total", record["completion_tokens"], kind="completion")
+            self.observe("rag_turn_seconds", record["wall_seconds"])
+            self.observe("rag_agent_iterations", record["iterations"], buckets=ITERATION_BUCKETS)
+            for call in record["llm_calls"]:
+                self.observe("rag_llm_call_seconds", call["seconds"])
+            for call in record["tool_calls"]:
+                self.increment("rag_tool_calls_total", tool=call["name"], status=call["status"])
+                self.observe("rag_tool_seconds", call.get("seconds", 0.0), tool=call["name"])
+                for stage, seconds in call.get("stages", {}).items():
+                    self.observe("rag_retrieval_stage_seconds", seconds, stage=stage)
+
+    def snapshot(self):
+        return {
+            "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+            "histograms": [
+                [name, labels, histogram.buckets, histogram.counts, histogram.total, histogram.count]
+                for (name, labels), histogram in self.histograms.items()
+            ]
+        }
+
+    def process_files(self):
+        try:
+            names = os.listdir(self.process_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.process_dir, name) for name in names if name.endswith(".json"))
+
+    def remove_exited_processes(self):
+        # Totals of a previous run; the counters of a worker that exits during this run are kept.
+        for path in self.process_files():
+            pid = os.path.splitext(os.path.basename(path))[0]
+            if path != self.state_path and pid.isdigit() and not process_is_running(int(pid)):
+                os.remove(path)
+
+    def merged_totals(self):
+        with self.lock:
+            snapshots = [self.snapshot()]
+        for path in self.process_files():
+            if path == self.state_path:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as fh:
+                    snapshots.append(json.load(fh))
+            except (FileNotFoundError, ValueError):
+                continue
+        return merge_snapshots(snapshots)
+
+    def render_prometheus(self):
+        return render_prometheus(*self.merged_totals())
+
+    def flush(self):
+        os.makedirs(self.process_dir, exist_ok=True)
+        with self.lock:
+            changed, self.dirty = self.dirty, False
+            state = json.dumps(self.snapshot()) if changed else None
+        if state is not None:
+            write_atomically(self.state_path, state)
+        if not self.exporter:
+            return
+        # Re-rendered only when this or another process wrote new totals since the last export.
+        files = [(path, os.stat(path).st_mtime_ns) for path in self.process_files() if os.path.exists(path)]
+        if changed or files != self.exported_files:
+            write_atomically(self.metrics_path, self.render_prometheus())
+            self.exported_files = files
+
+    def try_flush(self):
+        try:
+            self.flush()
+        except OSError as error:
+            print(f"[TELEMETRY_MODULE] Failed to write metrics: {error}")
+
+    def flush_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            self.try_flush()
+
+    def start_server(self, port):
+        sink = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer(("0.0.0.0", port), MetricsRequestHandler)
+        except OSError as error:
+            print(f"[TELEMETRY_MODULE] Metrics endpoint unavailable on port {port}: {error}")
+            return
+        threading.Thread(target=self.server.serve_forever, name="metrics-endpoint", daemon=True).start()
+        print(f"[TELEMETRY_MODULE] Serving Prometheus metrics on :{port}/metrics")
+
+
+def get_metrics_sink(exporter=True):
+    """The process-wide sink; the first call decides whether this process exports the metrics."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = MetricsSink(exporter=exporter)
+        return _sink
+
+
+class TurnMetricsHandler(BaseCallbackHandler):
+    """Collects per-turn LLM, tool and retrieval timings from agent executor callbacks.
+
+    A turn is the outermost chain run; nested runs are mapped back to it through their
+    parent run IDs, so one handler can be shared by concurrent sessions.
+    """
+
+    def __init__(self, sink=None, profile_sample_rate=TELEMETRY_PROFILE_SAMPLE_RATE):
+        self.sink = sink
+        self.profile_sample_rate = profile_sample_rate
+        self.lock = threading.Lock()
+        self.turns = {}
+        self.turn_by_run = {}
+
+    def find_turn(self, run_id, parent_run_id=None):
+        with self.lock:
+            turn = self.turn_by_run.get(run_id) or self.turn_by_run.get(parent_run_id)
+            if turn is not None and run_id not in self.turn_by_run:
+                self.turn_by_run[run_id] = turn
+                turn.run_ids.add(run_id)
+            return turn
+
+    def start_turn(self, run_id):
+        turn = TurnRecord(run_id)
+        with self.lock:
+            self.turns[run_id] = turn
+            self.turn_by_run[run_id] = turn
+        _active_turn.set(turn)
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            turn.profiler = TurnProfiler(str(run_id)).start()
+
+    def finish_turn(self, run_id, error=None):
+        with self.lock:
+            turn = self.turns.pop(run_id, None)
+            if turn is None:
+                return
+            for child_id in turn.run_ids:
+                self.turn_by_run.pop(child_id, None)
+        _active_turn.set(None)
+
+        record = turn.to_dict(error)
+        if turn.profiler is not None:
+            record["profile"] = turn.profiler.stop()
+        try:
+            (self.sink or get_metrics_sink()).record_turn(record)
+        except OSError as error:
+            print(f"[TELEMETRY_MODULE] Failed to write turn metrics: {error}")
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self.start_turn(run_id)
+        else:
+            self.find_turn(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self.finish_turn(run_id)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self.finish_turn(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        turn = self.find_turn(run_id, parent_run_id)
+        if turn is not None:
+            turn.run_started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        turn = self.find_turn(run_id, parent_run_id)
+        if turn is None or run_id not in turn.run_started:
+            return
+        prompt_tokens, completion_tokens = extract_token_usage(response)
+        turn.llm_calls.append({
+            "seconds": round(time.perf_counter() - turn.run_started.pop(run_id), 4),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens
+        })
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        turn = self.find_turn(run_id, parent_run_id)
+        if turn is None or run_id not in turn.run_started:
+            return
+        turn.llm_calls.append({
+            "seconds": round(time.perf_counter() - turn.run_started.pop(run_id), 4),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "error": type(error).__name__
+        })
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        turn = self.find_turn(run_id, parent_run_id)
+        if turn is None:
+            return
+        call = {"name": (serialized or {}).get("name", "tool"), "status": "running"}
+        turn.run_started[run_id] = time.perf_counter()
+        turn.open_tools[run_id] = call
+        turn.tool_calls.append(call)
+
+    def close_tool(self, run_id, parent_run_id, status):
+        turn = self.find_turn(run_id, parent_run_id)
+        if turn is None or run_id not in turn.open_tools:
+            return
+        call = turn.open_tools.pop(run_id)
+        call["seconds"] = round(time.perf_counter() - turn.run_started.pop(run_id), 4)
+        call["status"] = status
+        if "stages" in call:
+            call["stages"] = {stage: round(seconds, 4) for stage, seconds in call["stages"].items()}
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self.close_tool(run_id, parent_run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self.close_tool(run_id, parent_run_id, "error")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The app imports its modules by name, as `streamlit run app.py` and `python server.py` do from rag/.
+RAG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAG_DIR)
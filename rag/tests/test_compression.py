@@ -0,0 +1,62 @@
+from langchain_core.documents import Document
+
+from compression import ContextCompressor
+
+SERVICE_FAQ = """ABOUT OUR SERVICE
+Q: How can I contact customer support?
+A: You can reach us in several ways:
+   - Phone: +1-800-123-4567 (Main customer service line)
+   - Email: support@autosupport.ai
+   - Online Support Portal: support.autosupport.ai
+
+Q: What are your support hours?
+A: Our main customer service operates Monday through Friday, 9:00 AM to 6:00 PM EST.
+   Emergency technical support is available 24/7 at +1-800-123-4569."""
+
+HOURS_ANSWER = "Monday through Friday, 9:00 AM to 6:00 PM EST"
+
+TIRE_PAGE = """Tire inflation pressure
+Check the tire inflation pressure once a month when the tires are cold.
+Recommended values: 35 psi front, 35 psi rear.
+Do not exceed the maximum pressure molded on the tire sidewall.
+Overinflated tires wear unevenly in the center of the tread."""
+
+
+def faq_documents():
+    return [
+        Document(page_content=SERVICE_FAQ, metadata={"source": "company_faq.txt"}),
+        Document(page_content="AUTOSUPPORT AI LTD. - CUSTOMER SUPPORT FAQ", metadata={"source": "company_faq.txt"})
+    ]
+
+
+def compress(token_budget, query="What are your support hours?", documents=None):
+    compressor = ContextCompressor(token_budget=token_budget)
+    documents = faq_documents() if documents is None else documents
+    return compressor.compress([query], documents, 4, lambda doc: f"Source: {doc.metadata['source']}")
+
+
+def test_chunks_within_budget_are_returned_whole():
+    assert compress(1200) == [f"Source: company_faq.txt\n{SERVICE_FAQ}"]
+
+
+def test_support_hours_answer_survives_trimming():
+    [context] = compress(60)
+
+    assert "Q: What are your support hours?" in context
+    assert HOURS_ANSWER in context
+    assert "Emergency technical support" in context
+    assert "Email: support@autosupport.ai" not in context
+
+
+def test_remaining_budget_is_filled_with_unscored_sentences():
+    page = Document(page_content=TIRE_PAGE, metadata={"source": "manual.pdf"})
+    [context] = compress(60, "How often should I check the tire pressure?", [page])
+
+    # The recommended values share no term with the question, but fit in the budget.
+    assert "Check the tire inflation pressure once a month" in context
+    assert "35 psi front" in context
+    assert "Overinflated" not in context
+
+
+def test_title_only_chunks_are_dropped():
+    assert all("CUSTOMER SUPPORT FAQ" not in entry for entry in compress(60) + compress(1200))
@@ -0,0 +1,89 @@
+import pytest
+from langchain_core.agents import AgentAction
+
+from answercache import is_cacheable_answer
+from core import ApplicationController, confirm_submitted_tickets
+
+
+def controller():
+    # answer_is_cacheable only checks that a cache is configured, not what it holds.
+    cached = ApplicationController()
+    cached.answer_cache = object()
+    return cached
+
+
+def entries(*pairs):
+    return [{"role": role, "content": content} for role, content in pairs]
+
+
+def test_questions_are_cacheable():
+    history = entries(("user", "What are your support hours?"))
+
+    assert controller().answer_is_cacheable(history)
+
+
+def test_disabled_cache_is_never_used():
+    assert not ApplicationController().answer_is_cacheable(entries(("user", "What are your support hours?")))
+
+
+@pytest.mark.parametrize("request_text", [
+    "Please provide your full name.",
+    "Please write a short summary/title for the ticket.",
+    "Please describe the issue in detail."
+])
+def test_replies_to_ticket_questions_bypass_the_cache(request_text):
+    history = entries(
+        ("user", "yes, open a ticket"),
+        ("assistant", request_text),
+        ("user", "What are your support hours?")
+    )
+
+    assert not controller().answer_is_cacheable(history)
+
+
+def test_collected_ticket_fields_bypass_the_cache():
+    history = entries(
+        ("assistant", "Please provide your full name."),
+        ("user", "Ana Ruiz"),
+        ("assistant", "Thanks Ana. Anything else?"),
+        ("user", "What are your support hours?")
+    )
+
+    assert not controller().answer_is_cacheable(history)
+
+
+def test_cache_is_used_again_after_the_ticket_is_submitted():
+    history = entries(
+        ("assistant", "Please describe the issue in detail."),
+        ("user", "The light blinks."),
+        ("assistant", "Support ticket TKT-1A2B3C4D has been submitted."),
+        ("user", "What are your support hours?")
+    )
+
+    assert controller().answer_is_cacheable(history)
+
+
+def test_paraphrased_ticket_confirmation_ends_the_ticket_flow():
+    history = entries(
+        ("assistant", "Please describe the issue in detail."),
+        ("user", "The light blinks."),
+        ("assistant", "All done! Your ticket (tkt-1a2b3c4d) is on its way to our team."),
+        ("user", "What are your support hours?")
+    )
+
+    assert controller().answer_is_cacheable(history)
+
+
+def test_submitted_ticket_id_comes_from_the_tool_output():
+    submit = AgentAction("submit_support_ticket", {"summary": "Warning light"}, "")
+    search = AgentAction("search_knowledge_base", {"search_queries": ["warning"]}, "")
+    steps = [(search, "Source: manual.pdf (page 3)"), (submit, "Support ticket TKT-0A1B2C3D has been submitted")]
+
+    assert confirm_submitted_tickets("Your ticket is on its way.", steps).endswith("Ticket ID: TKT-0A1B2C3D")
+    assert confirm_submitted_tickets("Ticket tkt-0a1b2c3d is on its way.", steps) == "Ticket tkt-0a1b2c3d is on its way."
+    assert confirm_submitted_tickets("Here you go. (Source: manual.pdf)", steps[:1]) == "Here you go. (Source: manual.pdf)"
+
+
+def test_answers_naming_a_ticket_are_not_cached():
+    assert is_cacheable_answer("Hours are 9-6. (Source: company_faq.txt)")
+    assert not is_cacheable_answer("Your ticket tkt-0a1b2c3d was filed. (Source: company_faq.txt)")
@@ -0,0 +1,45 @@
+import pytest
+
+from embeddings import EmbeddingCache, pack_vector
+
+VECTOR = [0.5] * 16
+VECTOR_BYTES = len(pack_vector(VECTOR))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(cache_path=str(tmp_path / "embedding_cache.db"), max_bytes=10 * VECTOR_BYTES)
+
+
+def test_hits_return_stored_vectors(cache):
+    cache.put_many({"a": VECTOR, "b": [1.0] * 16})
+
+    assert cache.get_many(["a", "b", "missing", "a"]) == {"a": VECTOR, "b": [1.0] * 16}
+
+
+def test_lookups_do_not_write(cache):
+    cache.put_many({"a": VECTOR})
+    changes = cache.connection.total_changes
+
+    cache.get_many(["a"])
+
+    assert cache.connection.total_changes == changes
+    assert list(cache.pending_touches) == ["a"]
+
+
+def test_running_size_matches_the_table(cache):
+    cache.put_many({"a": VECTOR, "b": VECTOR})
+    cache.put_many({"a": [0.25] * 32})
+
+    assert cache.stored_bytes == cache.size_bytes() == 3 * VECTOR_BYTES
+
+
+def test_eviction_keeps_recently_used_vectors(cache):
+    cache.put_many({f"old-{index}": VECTOR for index in range(10)})
+    cache.get_many(["old-0"])
+
+    cache.put_many({"new": VECTOR})
+
+    remaining = cache.get_many([f"old-{index}" for index in range(10)] + ["new"])
+    assert "old-0" in remaining and "new" in remaining and "old-1" not in remaining
+    assert cache.stored_bytes == cache.size_bytes() <= 9 * VECTOR_BYTES
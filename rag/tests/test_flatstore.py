@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import flatstore
+from embeddings import HashingEmbeddings
+from flatstore import FlatVectorStore
+
+TEXTS = {
+    "hilux-oil": ("Hilux engine oil capacity and change interval.", {"vehicle_model": "hilux", "doc_type": "manual"}),
+    "hilux-tyres": ("Hilux tyre pressure and rotation.", {"vehicle_model": "hilux", "doc_type": "manual"}),
+    "camry-oil": ("Camry engine oil capacity and change interval.", {"vehicle_model": "camry", "doc_type": "manual"}),
+    "faq-oil": ("How often should I change the oil?", {"vehicle_model": "general", "doc_type": "faq"})
+}
+
+
+def open_store(path, quantized=False):
+    return FlatVectorStore(HashingEmbeddings(dimensions=64), index_path=str(path), quantized=quantized)
+
+
+@pytest.fixture(params=[False, True], ids=["float32", "int8"])
+def store(request, tmp_path):
+    store = open_store(tmp_path / "flat_index", quantized=request.param)
+    store.add_texts(
+        [text for text, _ in TEXTS.values()],
+        metadatas=[metadata for _, metadata in TEXTS.values()],
+        ids=list(TEXTS)
+    )
+    return store
+
+
+def search_ids(store, query, filter=None, k=4):
+    return {doc.id for doc in store.similarity_search(query, k=k, filter=filter)}
+
+
+def test_filter_restricts_results_to_matching_rows(store):
+    assert search_ids(store, "engine oil", {"vehicle_model": ["hilux", "general"]}) == {"hilux-oil", "hilux-tyres", "faq-oil"}
+    assert search_ids(store, "engine oil", {"vehicle_model": ["hilux"], "doc_type": "manual"}) == {"hilux-oil", "hilux-tyres"}
+    assert search_ids(store, "engine oil", {"vehicle_model": ["corolla"]}) == set()
+
+
+def test_empty_allowed_list_matches_nothing(store):
+    assert search_ids(store, "engine oil", {"vehicle_model": []}) == set()
+
+
+def test_filter_skips_deleted_rows(store):
+    store.delete(["hilux-oil"])
+
+    assert search_ids(store, "engine oil", {"vehicle_model": ["hilux"]}) == {"hilux-tyres"}
+
+
+def test_compaction_keeps_live_rows(store, tmp_path):
+    store.delete(["hilux-oil", "camry-oil"])
+
+    assert store.rows == 2 and not store.deleted.any()
+    assert store.get()["ids"] == ["hilux-tyres", "faq-oil"]
+    assert search_ids(store, "engine oil", {"vehicle_model": ["hilux"]}) == {"hilux-tyres"}
+    reopened = open_store(store.index_path, quantized=store.has_codes)
+    assert reopened.get(["faq-oil"])["documents"] == [TEXTS["faq-oil"][0]]
+    assert sorted(os.listdir(tmp_path)) == ["flat_index"]
+
+
+def test_interrupted_compaction_keeps_the_old_index(store, monkeypatch):
+    real_replace = os.replace
+
+    def crash_before_swapping_in(source, target):
+        # The old index has been moved aside; the compacted one is not in place yet.
+        if target == store.index_path:
+            raise KeyboardInterrupt
+        real_replace(source, target)
+
+    monkeypatch.setattr(flatstore.os, "replace", crash_before_swapping_in)
+    with pytest.raises(KeyboardInterrupt):
+        store.compact()
+    monkeypatch.undo()
+    assert not os.path.exists(store.index_path)
+
+    reopened = open_store(store.index_path)
+    assert sorted(reopened.get()["ids"]) == sorted(TEXTS)
+    assert not os.path.exists(store.index_path + flatstore.COMPACTION_RETIRED_SUFFIX)
+    assert not os.path.exists(store.index_path + flatstore.COMPACTION_STAGING_SUFFIX)
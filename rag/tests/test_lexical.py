@@ -0,0 +1,38 @@
+import pytest
+
+from lexical import BM25Index
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(index_path=str(tmp_path / "lexical_index.json"))
+    index.add(
+        ["dtc", "tyres", "oil"],
+        [
+            "Error code P0420 means the catalyst system efficiency is below threshold.",
+            "The 2024 Hilux 4wd uses 265/65R17 tyres; check the pressure monthly.",
+            "Use 0W-20 oil in the 2024 model and change it every 10000 km."
+        ],
+        [{}, {}, {}]
+    )
+    return index
+
+
+def decisive(index, query):
+    return index.is_decisive(query, index.search(query, k=4))
+
+
+def test_error_code_is_an_exact_lookup(index):
+    assert decisive(index, "what does p0420 mean")
+
+
+# Each query also has a term no chunk contains, so only an identifier could make it decisive.
+@pytest.mark.parametrize("query", ["recommended tyres for 2024", "4wd towing limits", "service after 10000 km"])
+def test_years_trims_and_numbers_are_not_identifiers(index, query):
+    assert not decisive(index, query)
+
+
+def test_filtered_search_only_returns_allowed_chunks(index):
+    index.add(["faq"], ["Oil change intervals for every model."], [{"doc_type": "faq"}])
+
+    assert [chunk_id for chunk_id, _ in index.search("oil", filter={"doc_type": ["faq"]})] == ["faq"]
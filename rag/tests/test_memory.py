@@ -0,0 +1,60 @@
+from langchain_core.messages import SystemMessage
+
+from fakes import FakeSupportChatModel
+from memory import ConversationWindow, extract_ticket_fields, new_window_state
+from sessions import SessionStore
+
+TICKET_CONVERSATION = [
+    ("user", "My dashboard shows a warning I can't find in the manual."),
+    ("assistant", "I couldn't find this information in the manuals. Would you like to open a support ticket?"),
+    ("user", "yes"),
+    ("assistant", "Please provide your full name."),
+    ("user", "Ana Ruiz"),
+    ("assistant", "Please provide your email address."),
+    ("user", "ana.ruiz@example.org"),
+    ("assistant", "Please write a short summary/title for the ticket."),
+    ("user", "Unknown dashboard warning"),
+    ("assistant", "Please describe the issue in detail.")
+]
+
+
+def entries(pairs):
+    return [{"role": role, "content": content} for role, content in pairs]
+
+
+def pinned_text(messages):
+    return "\n".join(m.content for m in messages if isinstance(m, SystemMessage) and "Support ticket details" in m.content)
+
+
+def test_ticket_fields_survive_summary_and_resume(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    window = ConversationWindow(FakeSupportChatModel(), recent_turns=1, slack_turns=0)
+    session_id = store.create()
+
+    # Each turn reads only the unsummarized tail, as the app and the API server do.
+    for position in range(0, len(TICKET_CONVERSATION), 2):
+        history, state, offset = store.load_context(session_id)
+        history.extend(entries(TICKET_CONVERSATION[position:position + 2]))
+        window.build_messages(history[:-1], state, offset)
+        store.append(session_id, history[-2:], state)
+
+    history, state, offset = store.load_context(session_id)
+    assert offset > 4
+    history.append({"role": "user", "content": "The light is orange and blinks at start-up."})
+
+    assert extract_ticket_fields(history[:-1], state, offset) == {
+        "name": "Ana Ruiz", "email": "ana.ruiz@example.org", "summary": "Unknown dashboard warning"
+    }
+    pinned = pinned_text(window.build_messages(history[:-1], state, offset))
+    assert "name: Ana Ruiz" in pinned and "email: ana.ruiz@example.org" in pinned
+
+
+def test_full_history_and_tail_agree():
+    history = entries(TICKET_CONVERSATION)
+    state = new_window_state()
+    window = ConversationWindow(FakeSupportChatModel(), recent_turns=1, slack_turns=0)
+    window.build_messages(history, state)
+
+    tail = history[state["summarized_upto"]:]
+    assert extract_ticket_fields(history, state) == extract_ticket_fields(tail, state, state["summarized_upto"])
+    assert extract_ticket_fields(history, state) == extract_ticket_fields(history)
@@ -0,0 +1,61 @@
+import os
+from collections import Counter
+
+import pytest
+from langchain_core.documents import Document
+
+from conftest import RAG_DIR
+from ingest import extract_file_documents
+from routing import DocumentTagger, QueryRouter, GENERAL, metadata_matches
+
+DOCUMENTS_DIR = os.path.join(RAG_DIR, "documents")
+# Files in documents/ that are about one vehicle; everything else must be tagged general.
+SHIPPED_MODEL_DOCUMENTS = {}
+
+
+def tag(source, text):
+    return DocumentTagger().tag_file(source, [Document(page_content=text, metadata={"source": source})])
+
+
+@pytest.mark.parametrize("filename", sorted(os.listdir(DOCUMENTS_DIR)))
+def test_shipped_documents_are_tagged(filename):
+    path = os.path.join(DOCUMENTS_DIR, filename)
+    tags = DocumentTagger().tag_file(path, extract_file_documents(path))
+
+    model, year = SHIPPED_MODEL_DOCUMENTS.get(filename, (GENERAL, GENERAL))
+    assert tags["vehicle_model"] == model
+    assert tags["model_year"] == year
+
+
+def test_faq_mentioning_models_stays_general():
+    tags = tag("documents/company_faq.txt", "Q: Which vehicles?\nA: Toyota Hilux (2024).\n\nQ: And?\nA: Hilux only.")
+
+    assert tags == {"vehicle_model": GENERAL, "model_year": GENERAL, "doc_type": "faq", "language": "en"}
+
+
+def test_manual_takes_model_and_year_from_name_or_text():
+    assert tag("documents/2018 Toyota Hilux Owner's Manual.pdf", "Welcome to your vehicle")["model_year"] == "2018"
+    tags = tag("documents/owners.pdf", "Toyota Hilux 2019. Thank you for choosing the Hilux and not a Camry.")
+
+    assert (tags["vehicle_model"], tags["model_year"], tags["doc_type"]) == ("hilux", "2019", "manual")
+
+
+def test_other_documents_need_a_dominant_model():
+    assert tag("documents/notes.txt", "The Camry and the Hilux are covered.")["vehicle_model"] == GENERAL
+    assert tag("documents/notes.txt", "Camry service. Camry tyres. Camry, not Hilux.")["vehicle_model"] == "camry"
+
+
+def test_routed_query_keeps_general_documents():
+    shards = {
+        "vehicle_model": Counter({"hilux": 10, GENERAL: 5}),
+        "model_year": Counter({"2018": 10, GENERAL: 5}),
+        "doc_type": Counter({"manual": 10, "faq": 5}),
+        "language": Counter({"en": 15})
+    }
+    faq_path = os.path.join(DOCUMENTS_DIR, "company_faq.txt")
+    faq_tags = DocumentTagger().tag_file(faq_path, extract_file_documents(faq_path))
+
+    shard_filter = QueryRouter(shards).route("How do I reset the oil light on a 2018 Hilux?")
+
+    assert shard_filter == {"vehicle_model": ["hilux", GENERAL], "model_year": ["2018", GENERAL]}
+    assert metadata_matches(faq_tags, shard_filter)
@@ -0,0 +1,81 @@
+import os
+import shutil
+
+from telemetry import MetricsSink
+
+
+def sink(tmp_path, **options):
+    return MetricsSink(telemetry_dir=str(tmp_path), metrics_port=0, flush_seconds=0, **options)
+
+
+def read_metrics(tmp_path):
+    with open(tmp_path / "metrics.prom", encoding="utf-8") as fh:
+        return fh.read()
+
+
+def test_exporter_sums_the_totals_of_every_process(tmp_path):
+    exporter = sink(tmp_path)
+    workers = [sink(tmp_path, exporter=False, process_id=str(pid)) for pid in (101, 102)]
+    for worker in workers:
+        worker.record_counter("rag_api_rejected_total")
+        worker.record_observation("rag_turn_seconds", 0.3)
+        worker.flush()
+    exporter.record_counter("rag_api_rejected_total")
+    exporter.flush()
+
+    metrics = read_metrics(tmp_path)
+    assert "rag_api_rejected_total 3" in metrics
+    assert 'rag_turn_seconds_bucket{le="0.5"} 2' in metrics
+    assert "rag_turn_seconds_count 2" in metrics
+    assert exporter.render_prometheus() == metrics
+
+
+def test_workers_do_not_write_the_exported_file(tmp_path):
+    worker = sink(tmp_path, exporter=False)
+    worker.record_counter("rag_api_rejected_total")
+    worker.flush()
+
+    assert not os.path.exists(tmp_path / "metrics.prom")
+    assert os.listdir(tmp_path / "processes") == [f"{os.getpid()}.json"]
+
+
+def test_records_are_written_on_flush_only(tmp_path):
+    exporter = sink(tmp_path)
+    exporter.record_counter("rag_api_rejected_total")
+
+    assert not os.path.exists(tmp_path / "metrics.prom")
+    exporter.flush()
+    modified = os.stat(tmp_path / "metrics.prom").st_mtime_ns
+    exporter.flush()
+    assert os.stat(tmp_path / "metrics.prom").st_mtime_ns == modified
+
+
+def test_exporter_drops_totals_of_exited_processes_on_start(tmp_path):
+    stale = sink(tmp_path, exporter=False, process_id="999999999")
+    stale.record_counter("rag_api_rejected_total")
+    stale.flush()
+
+    exporter = sink(tmp_path)
+    exporter.flush()
+
+    assert "rag_api_rejected_total" not in exporter.render_prometheus()
+
+
+def test_flush_survives_a_changed_or_removed_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    exporter = MetricsSink(telemetry_dir="telemetry", metrics_port=0, flush_seconds=0)
+    exporter.record_counter("rag_api_rejected_total")
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    monkeypatch.chdir(workspace)
+    shutil.rmtree(tmp_path / "telemetry")
+
+    exporter.flush()
+    assert "rag_api_rejected_total 1" in read_metrics(tmp_path / "telemetry")
+
+    # The exit flush reports a directory that cannot be written instead of raising.
+    shutil.rmtree(tmp_path / "telemetry")
+    (tmp_path / "telemetry").write_text("")
+    exporter.record_counter("rag_api_rejected_total")
+    exporter.try_flush()
+    (tmp_path / "telemetry").unlink()
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+import requests
+
+import ticket
+from embeddings import HashingEmbeddings
+from fakes import FakeGitHubServer
+from flatstore import FlatVectorStore
+from outbox import TicketOutbox, STATUS_QUEUED, STATUS_DELIVERING, STATUS_DELIVERED, STATUS_DEAD
+from tools import ToolFactory
+
+API_PATH = "/repos/support-user/support-repo/issues"
+
+
+@pytest.fixture
+def github():
+    server = FakeGitHubServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def outbox(tmp_path, github, monkeypatch):
+    # The worker thread is not started; tests deliver with process_due_tickets() to stay deterministic.
+    outbox = TicketOutbox(db_path=str(tmp_path / "ticket_outbox.db"), api_base_url=github.url,
+                          headers_factory=ticket.build_outbox_headers, max_attempts=2, base_delay=0.0)
+    monkeypatch.setattr(ticket, "_outbox", outbox)
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    monkeypatch.setenv("GITHUB_REPO", "support-repo")
+    monkeypatch.setenv("GITHUB_USER", "support-user")
+    return outbox
+
+
+def submit_ticket(description="The infotainment screen stays black after starting the engine."):
+    return ticket.create_support_ticket("Black screen", "Jane Smith", "jane.smith@mail.com", description)
+
+
+def only_ticket_id(outbox):
+    rows = outbox.connection.execute("SELECT ticket_id FROM tickets").fetchall()
+    assert len(rows) == 1
+    return rows[0]["ticket_id"]
+
+
+def test_repeated_submission_queues_one_ticket(outbox, github):
+    first, second = submit_ticket(), submit_ticket()
+    ticket_id = only_ticket_id(outbox)
+
+    assert ticket_id in first and ticket_id in second
+    assert outbox.status(ticket_id)["status"] == STATUS_QUEUED
+
+    assert outbox.process_due_tickets() == 1
+    assert outbox.process_due_tickets() == 0
+    assert len(github.issues) == 1
+    assert ticket.ticket_marker(ticket_id) in github.issues[0]["body"]
+
+
+def test_status_tool_reports_the_tracking_link(outbox, github, tmp_path):
+    store = FlatVectorStore(HashingEmbeddings(dimensions=64), index_path=str(tmp_path / "flat"))
+    status_tool = ToolFactory(store).create_ticket_status_tool()
+    submit_ticket()
+    ticket_id = only_ticket_id(outbox)
+
+    assert "queued for delivery" in status_tool.invoke({"ticket_id": ticket_id})
+    outbox.process_due_tickets()
+
+    # Customers type the ID in any case and with stray whitespace.
+    reply = status_tool.invoke({"ticket_id": f" {ticket_id.lower()} "})
+    assert "created successfully" in reply
+    assert github.issues[0]["html_url"] in reply
+    assert "No support ticket" in status_tool.invoke({"ticket_id": "TKT-00000000"})
+
+
+def test_claimed_ticket_is_not_claimed_twice(outbox):
+    submit_ticket()
+    claimed = outbox.claim_due_tickets()
+
+    assert [row["attempts"] for row in claimed] == [1]
+    assert outbox.status(claimed[0]["ticket_id"])["status"] == STATUS_DELIVERING
+    assert outbox.claim_due_tickets() == []
+
+
+def test_abandoned_delivery_is_reclaimed_without_a_duplicate_issue(outbox, github):
+    submit_ticket()
+    claimed = outbox.claim_due_tickets()[0]
+    # The worker created the issue and died before recording it.
+    requests.post(f"{github.url}{API_PATH}", json=ticket.build_ticket_payload(
+        "Black screen", "Jane Smith", "jane.smith@mail.com", "...", claimed["ticket_id"]), timeout=5)
+    outbox.connection.execute("UPDATE tickets SET updated_at = ?", (time.time() - 3600,))
+    outbox.connection.commit()
+
+    reclaimed = outbox.claim_due_tickets()
+    assert [row["attempts"] for row in reclaimed] == [2]
+    outbox.deliver(reclaimed[0])
+
+    status = outbox.status(claimed["ticket_id"])
+    assert status["status"] == STATUS_DELIVERED
+    assert status["issue_url"] == github.issues[0]["html_url"]
+    assert len(github.issues) == 1
+
+
+def test_ticket_is_dead_lettered_after_its_last_attempt(outbox, github):
+    github.failure_rate = 1.0
+    submit_ticket()
+    ticket_id = only_ticket_id(outbox)
+
+    outbox.process_due_tickets()
+    assert outbox.status(ticket_id)["status"] == STATUS_QUEUED
+    outbox.process_due_tickets()
+
+    assert outbox.status(ticket_id)["status"] == STATUS_DEAD
+    assert "could not be delivered" in ticket.get_ticket_status(ticket_id)
+    assert github.issues == []
+
+
+def test_missing_credentials_queue_nothing(outbox, monkeypatch):
+    monkeypatch.delenv("GITHUB_TOKEN")
+
+    assert submit_ticket().startswith("Configuration error")
+    assert outbox.connection.execute("SELECT COUNT(*) FROM tickets").fetchone()[0] == 0
@@ -0,0 +1,22 @@
+import gc
+import weakref
+
+from embeddings import HashingEmbeddings
+from flatstore import FlatVectorStore
+from tools import ToolFactory
+
+
+def test_retriever_does_not_outlive_its_index(tmp_path):
+    store = FlatVectorStore(HashingEmbeddings(dimensions=64), index_path=str(tmp_path / "flat_index"))
+    store.add_texts(["Business hours are 9 to 6."], ids=["hours"])
+    factory = ToolFactory(store)
+    retriever = factory.get_retriever()
+
+    assert factory.get_retriever() is retriever
+    assert [doc.id for doc in factory.retrieve_documents("business hours")] == ["hours"]
+
+    # LiveIndex.retire deletes a generation through a weakref finalizer, so nothing may pin it.
+    retired = weakref.ref(store)
+    del store, factory, retriever
+    gc.collect()
+    assert retired() is None
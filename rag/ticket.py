@@ -1,9 +1,17 @@
 import os
-import requests
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
+from outbox import TicketOutbox, ticket_marker, STATUS_DELIVERED, STATUS_DEAD
+
 load_dotenv()
 
+_outbox = None
+_outbox_lock = threading.Lock()
+
 
 def get_github_auth():
     auth_token = os.getenv("GITHUB_TOKEN")
@@ -12,12 +20,14 @@ def get_github_auth():
     return auth_token, repository_name, account_username
 
 
-def build_ticket_payload(ticket_title, customer_name, customer_email, issue_details):
+def build_ticket_payload(ticket_title, customer_name, customer_email, issue_details, ticket_id=None):
     formatted_body = (
         f"**Customer Name:** {customer_name}\n"
         f"**Contact Email:** {customer_email}\n\n"
         f"**Issue Description:**\n{issue_details}"
     )
+    if ticket_id:
+        formatted_body += f"\n\n{ticket_marker(ticket_id)}"
 
     return {
         "title": f"[Customer Support Ticket] {ticket_title}",
@@ -34,30 +44,25 @@ def build_api_headers(authentication_token):
     }
 
 
-def post_github_issue(api_endpoint, request_headers, issue_data):
-    try:
-        api_response = requests.post(
-            api_endpoint,
-            json=issue_data,
-            headers=request_headers,
-            timeout=10
-        )
+def build_idempotency_key(repository_name, summary, name, email, description):
+    # Identical submissions on the same day collapse into one ticket, so a repeated tool call
+    # does not open a second issue.
+    submitted_on = datetime.now(timezone.utc).date().isoformat()
+    fingerprint = "\0".join([repository_name, summary, name, email, description, submitted_on])
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def build_outbox_headers():
+    auth_token, _, _ = get_github_auth()
+    return build_api_headers(auth_token)
 
-        if api_response.status_code in (200, 201):
-            issue_link = api_response.json().get("html_url")
-            print(f"[TICKET_MODULE] Successfully created issue: {issue_link}")
-            return True, f"Support ticket created successfully!\n\nTrack your ticket here: {issue_link}"
-        else:
-            error_description = api_response.json().get("message", "Unknown error occurred")
-            print(f"[TICKET_MODULE] API Error: {api_response.status_code} – {error_description}")
-            return False, f"Ticket creation failed: {api_response.status_code} – {error_description}"
 
-    except requests.exceptions.Timeout:
-        print("[TICKET_MODULE] Request timeout")
-        return False, "Ticket creation failed: Request timeout. Please try again."
-    except Exception as error:
-        print(f"[TICKET_MODULE] Unexpected error: {error}")
-        return False, f"Ticket creation error: {str(error)}"
+def get_ticket_outbox():
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = TicketOutbox(headers_factory=build_outbox_headers).start()
+        return _outbox
 
 
 def create_support_ticket(summary: str, name: str, email: str, description: str) -> str:
@@ -67,12 +72,33 @@ def create_support_ticket(summary: str, name: str, email: str, description: str)
         print("[TICKET_MODULE] Missing required GitHub credentials")
         return "Configuration error: GitHub credentials are incomplete. Please contact administrator."
 
-    api_url = f"https://api.github.com/repos/{username}/{repo_name}/issues"
-    headers = build_api_headers(auth_token)
-    payload = build_ticket_payload(summary, name, email, description)
+    outbox = get_ticket_outbox()
+    idempotency_key = build_idempotency_key(f"{username}/{repo_name}", summary, name, email, description)
+    ticket_id = outbox.find_by_key(idempotency_key)
 
-    print(f"[TICKET_MODULE] Submitting ticket to repository: {repo_name}")
-    success, message = post_github_issue(api_url, headers, payload)
+    if ticket_id is None:
+        ticket_id = f"TKT-{uuid.uuid4().hex[:8].upper()}"
+        api_path = f"/repos/{username}/{repo_name}/issues"
+        payload = build_ticket_payload(summary, name, email, description, ticket_id)
+        print(f"[TICKET_MODULE] Queueing ticket {ticket_id} for repository: {repo_name}")
+        ticket_id = outbox.enqueue(ticket_id, idempotency_key, api_path, payload)
+
+    return (
+        f"Support ticket {ticket_id} has been submitted and is being delivered to our support team.\n\n"
+        f"You can ask for its status at any time using this ticket ID."
+    )
 
-    return message
 
+def get_ticket_status(ticket_id: str) -> str:
+    ticket = get_ticket_outbox().status(ticket_id.strip().upper())
+    if ticket is None:
+        return f"No support ticket with ID {ticket_id} was found."
+
+    if ticket["status"] == STATUS_DELIVERED:
+        return f"Support ticket {ticket['ticket_id']} was created successfully!\n\nTrack your ticket here: {ticket['issue_url']}"
+    if ticket["status"] == STATUS_DEAD:
+        return (
+            f"Support ticket {ticket['ticket_id']} could not be delivered ({ticket['last_error']}). "
+            f"Please contact support@autosupport.ai."
+        )
+    return f"Support ticket {ticket['ticket_id']} is queued for delivery (attempts so far: {ticket['attempts']})."
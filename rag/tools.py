@@ -1,54 +1,173 @@
 import os
+from typing import List
 from langchain.tools import tool
-from ticket import create_support_ticket
+from ticket import create_support_ticket, get_ticket_status
+from lexical import HybridRetriever, reciprocal_rank_fusion
+from compression import ContextCompressor
+from routing import QueryRouter, filter_key
+from telemetry import timed, get_metrics_sink
+from config import SEARCH_COMPRESSION_ENABLED, SEARCH_CANDIDATE_FACTOR, SEARCH_ROUTING_ENABLED, SEARCH_RESULT_LIMIT
 
 
 class ToolFactory:
-    def __init__(self, vector_store):
+    def __init__(self, vector_store, retrieval_limit=SEARCH_RESULT_LIMIT):
         self.vector_store = vector_store
-        self.retrieval_limit = 4
-
-    def format_source_citation(self, doc):
+        self.retrieval_limit = retrieval_limit
+        # Compression picks the final chunks with MMR, so it retrieves a wider candidate pool.
+        self.candidate_limit = self.retrieval_limit * (SEARCH_CANDIDATE_FACTOR if SEARCH_COMPRESSION_ENABLED else 1)
+        self.compressor = ContextCompressor(getattr(vector_store, "lexical_index", None))
+        self.router = QueryRouter.from_lexical_index(self.compressor.lexical_index) if SEARCH_ROUTING_ENABLED else None
+        self.retriever = None
+
+    def format_citation_header(self, doc):
         filename = os.path.basename(doc.metadata.get('source', 'unknown'))
         page_num = doc.metadata.get('page')
 
         citation_header = f"Source: {filename}"
         if page_num is not None:
             citation_header += f" (page {page_num})"
+        return citation_header
+
+    def format_source_citation(self, doc):
+        return f"{self.format_citation_header(doc)}\n{doc.page_content.strip()}"
+
+    def get_retriever(self):
+        # Kept on the factory, which lives as long as the resources of its index version, so a
+        # retired generation is released (and deleted by LiveIndex.retire) with its resources.
+        if self.retriever is None:
+            self.retriever = HybridRetriever(
+                vector_store=self.vector_store,
+                lexical_index=getattr(self.vector_store, "lexical_index", None),
+                k=self.candidate_limit
+            )
+        return self.retriever
 
-        return f"{citation_header}\n{doc.page_content.strip()}"
+    def route_query(self, query):
+        return self.router.route(query) if self.router is not None else None
+
+    def record_fallbacks(self, count):
+        get_metrics_sink().record_counter("rag_search_route_fallbacks_total", count)
 
     def retrieve_documents(self, query):
-        retriever = self.vector_store.as_retriever(
-            search_kwargs={"k": self.retrieval_limit}
-        )
+        retriever = self.get_retriever()
+        shard_filter = self.route_query(query)
+        if shard_filter:
+            documents = retriever.invoke(query, filter=shard_filter)
+            if documents:
+                return documents
+            self.record_fallbacks(1)
         return retriever.invoke(query)
 
+    def merge_search_results(self, result_lists):
+        merged = []
+        seen = set()
+        longest = max((len(results) for results in result_lists), default=0)
+        for rank in range(longest):
+            for results in result_lists:
+                if rank >= len(results):
+                    continue
+                doc = results[rank]
+                key = (doc.metadata.get('source'), doc.metadata.get('page'), doc.page_content)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(doc)
+        return merged
+
+    def normalize_queries(self, queries):
+        return list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+
+    def retrieve_documents_batch(self, queries):
+        queries = self.normalize_queries(queries)
+        if not queries:
+            return []
+        if len(queries) == 1:
+            return self.retrieve_documents(queries[0])
+
+        retriever = self.get_retriever()
+        filters = {query: self.route_query(query) for query in queries}
+        results = self.search_queries(retriever, queries, filters)
+
+        # Routed queries whose shards have nothing relevant are searched again across the whole index.
+        unmatched = [query for query in queries if filters[query] and not results[query]]
+        if unmatched:
+            self.record_fallbacks(len(unmatched))
+            results.update(self.search_queries(retriever, unmatched, dict.fromkeys(unmatched)))
+
+        return self.merge_search_results([results[query] for query in queries])
+
+    def search_queries(self, retriever, queries, filters):
+        results = {}
+        lexical_results = {}
+        for query in queries:
+            documents, decisive = retriever.lexical_lookup(query, filters[query])
+            if decisive:
+                results[query] = documents
+            elif documents:
+                lexical_results[query] = documents
+
+        # Only queries the lexical index could not settle pay for an embedding round-trip.
+        pending = [query for query in queries if query not in results]
+        if pending:
+            with timed("embedding"):
+                query_vectors = self.vector_store.embeddings.embed_documents(pending)
+            groups = {}
+            for query, query_vector in zip(pending, query_vectors):
+                groups.setdefault(filter_key(filters[query]), []).append((query, query_vector))
+
+            # Queries routed to the same shards share one store call.
+            for group in groups.values():
+                with timed("store"):
+                    vector_results = self.vector_store.similarity_search_by_vectors(
+                        [query_vector for _, query_vector in group],
+                        k=self.candidate_limit,
+                        filter=filters[group[0][0]]
+                    )
+                for (query, _), documents in zip(group, vector_results):
+                    if query in lexical_results:
+                        documents = reciprocal_rank_fusion([lexical_results[query], documents], self.candidate_limit)
+                    results[query] = documents
+        return results
+
+    def format_search_results(self, queries, documents):
+        if not SEARCH_COMPRESSION_ENABLED:
+            return [self.format_source_citation(doc) for doc in documents]
+
+        # The tool output is re-sent on every later agent iteration, so it is held to a token budget.
+        queries = self.normalize_queries(queries)
+        with timed("compression"):
+            return self.compressor.compress(
+                queries,
+                documents,
+                self.retrieval_limit * len(queries),
+                self.format_citation_header
+            )
+
     def validate_ticket_data(self, name, email, summary, description):
         fields = [name.strip(), email.strip(), summary.strip(), description.strip()]
         return all(fields)
 
     def create_search_tool(self):
         @tool
-        def search_knowledge_base(search_query: str) -> str:
+        def search_knowledge_base(search_queries: List[str]) -> str:
             """
             Searches through vehicle documentation and FAQ database for relevant information.
             This tool should be used for any inquiry about vehicle features, troubleshooting,
             maintenance procedures, specifications, company policies, or contact information.
 
             Args:
-                search_query: User's question or search term
+                search_queries: One or more search terms. When a question has several parts,
+                    pass all related sub-queries together in a single call instead of calling
+                    this tool repeatedly.
 
             Returns:
-                Formatted search results with source attribution
+                Formatted, de-duplicated search results with source attribution
             """
-            documents = self.retrieve_documents(search_query)
+            documents = self.retrieve_documents_batch(search_queries)
 
             if not documents:
                 return "No relevant information was found in the knowledge base."
 
-            citations = [self.format_source_citation(doc) for doc in documents]
-            return "\n\n".join(citations)
+            return "\n\n".join(self.format_search_results(search_queries, documents))
 
         return search_knowledge_base
 
@@ -84,10 +203,29 @@ class ToolFactory:
 
         return submit_support_ticket
 
+    def create_ticket_status_tool(self):
+        @tool
+        def check_ticket_status(ticket_id: str) -> str:
+            """
+            Looks up the delivery status of a previously submitted support ticket.
+            Use this when the customer asks about a ticket ID (format: TKT-XXXXXXXX)
+            or wants the tracking link for a ticket created earlier.
+
+            Args:
+                ticket_id: Ticket ID returned when the ticket was submitted
+
+            Returns:
+                Current delivery status and, once delivered, the tracking link
+            """
+            return get_ticket_status(ticket_id)
+
+        return check_ticket_status
+
     def get_all_tools(self):
         return [
             self.create_search_tool(),
-            self.create_ticket_tool()
+            self.create_ticket_tool(),
+            self.create_ticket_status_tool()
         ]
 
 
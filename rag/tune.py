@@ -0,0 +1,219 @@
+"""Offline tuner for chunk size, chunk overlap and the number of search results.
+
+    python tune.py --chunk-sizes 600,800,1050,1400 --overlaps 0,120,200 --ks 2,3,4,6
+
+One index per chunk size and overlap is built from ``documents/`` in a temporary directory
+and searched with every question of ``evaluation/retrieval_questions.json``. A question is
+answered at k when the search tool output for it, the context the model receives after
+compression, holds an entry cited from its source (and page, if given) that contains its
+evidence text. Files are extracted once for all candidates, and
+chunk texts already embedded by an earlier candidate or by the app come from the embedding cache.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+DEFAULT_QUESTIONS = os.path.join("evaluation", "retrieval_questions.json")
+
+
+def parse_values(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def normalize_text(text):
+    return " ".join(text.split()).lower()
+
+
+def directory_bytes(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def load_questions(path, documents_dir):
+    with open(path, 'r', encoding='utf-8') as fh:
+        questions = json.load(fh)
+    available = set(os.listdir(documents_dir)) if os.path.isdir(documents_dir) else set()
+    # Questions about documents that are not in this checkout cannot be answered by any candidate.
+    usable = [question for question in questions if question["source"] in available]
+    return usable, len(questions) - len(usable)
+
+
+def extract_corpus(documents_dir):
+    from ingest import extract_file_documents
+    from watcher import SUPPORTED_EXTENSIONS
+    started = time.perf_counter()
+    corpus = {
+        filename: extract_file_documents(os.path.join(documents_dir, filename))
+        for filename in sorted(os.listdir(documents_dir))
+        if filename.lower().endswith(SUPPORTED_EXTENSIONS)
+    }
+    return corpus, time.perf_counter() - started
+
+
+def is_relevant(entry, question):
+    # Entries are formatted by ToolFactory as a "Source: file (page N)" header line and the text.
+    header, _, text = entry.partition("\n")
+    cited = f"Source: {question['source']}"
+    if question.get("page") is not None:
+        from_source = header == f"{cited} (page {question['page']})"
+    else:
+        from_source = header == cited or header.startswith(f"{cited} (page ")
+    if not from_source:
+        return False
+    evidence = question.get("evidence")
+    return not evidence or normalize_text(evidence) in normalize_text(text)
+
+
+def build_candidate(corpus, chunk_size, chunk_overlap, workspace):
+    from config import INGEST_BATCH_SIZE
+    from chunking import DocumentChunker
+    from manifest import build_chunk_id
+    from vector import VectorStoreManager
+
+    started = time.perf_counter()
+    chunker = DocumentChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks, chunk_ids = [], []
+    for filename, documents in corpus.items():
+        for position, chunk in enumerate(chunker.split_file(documents)):
+            chunks.append(chunk)
+            chunk_ids.append(build_chunk_id(filename, "tuning", position))
+
+    index_dir = os.path.join(workspace, f"index-{chunk_size}-{chunk_overlap}")
+    manager = VectorStoreManager(index_dir=index_dir, interactive=False)
+    database = manager.open_database()
+    for start in range(0, len(chunks), INGEST_BATCH_SIZE):
+        database.add_documents(chunks[start:start + INGEST_BATCH_SIZE], ids=chunk_ids[start:start + INGEST_BATCH_SIZE])
+    manager.lexical_index.add_documents(chunks, chunk_ids)
+    manager.lexical_index.save(chunker.describe())
+    database.lexical_index = manager.lexical_index
+    database.index_dir = index_dir
+
+    return database, {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "chunks": len(chunks),
+        "build_seconds": time.perf_counter() - started,
+        "index_bytes": directory_bytes(index_dir)
+    }
+
+
+def evaluate_candidate(database, questions, k):
+    from benchmark import latency_summary
+    from memory import count_tokens
+    from tools import ToolFactory
+
+    factory = ToolFactory(database, retrieval_limit=k)
+    factory.retrieve_documents(questions[0]["question"])
+
+    answered, latencies, context_tokens = 0, [], []
+    for question in questions:
+        started = time.perf_counter()
+        documents = factory.retrieve_documents(question["question"])
+        entries = factory.format_search_results([question["question"]], documents)
+        latencies.append(time.perf_counter() - started)
+        context_tokens.append(count_tokens("\n\n".join(entries)))
+        answered += any(is_relevant(entry, question) for entry in entries)
+
+    return {
+        "k": k,
+        "recall_at_k": answered / len(questions),
+        "search_latency": latency_summary(latencies),
+        "context_tokens_mean": float(np.mean(context_tokens)),
+        "context_tokens_p95": float(np.percentile(context_tokens, 95))
+    }
+
+
+def recommend(candidates, target_recall):
+    # Context tokens are paid on every turn; index size and build time only when documents change.
+    eligible = [candidate for candidate in candidates if candidate["recall_at_k"] >= target_recall]
+    if not eligible:
+        return None
+    best = min(eligible, key=lambda row: (row["context_tokens_mean"], row["index_bytes"], row["build_seconds"]))
+    return {
+        **best,
+        "settings": {
+            "TEXT_CHUNK_SIZE": best["chunk_size"],
+            "TEXT_CHUNK_OVERLAP": best["chunk_overlap"],
+            "SEARCH_RESULT_LIMIT": best["k"]
+        }
+    }
+
+
+def run_tuning(arguments):
+    questions, skipped = load_questions(arguments.questions, arguments.documents)
+    if not questions:
+        raise SystemExit(f"No question in {arguments.questions} refers to a file in {arguments.documents}/")
+
+    corpus, extraction_seconds = extract_corpus(arguments.documents)
+    print(f"[TUNING] extracted {len(corpus)} files in {extraction_seconds:.1f}s; "
+          f"{len(questions)} questions ({skipped} skipped)", file=sys.stderr)
+
+    workspace = arguments.workspace or tempfile.mkdtemp(prefix="tuning-")
+    candidates = []
+    try:
+        for chunk_size in parse_values(arguments.chunk_sizes):
+            for chunk_overlap in parse_values(arguments.overlaps):
+                if chunk_overlap >= chunk_size:
+                    continue
+                database, build = build_candidate(corpus, chunk_size, chunk_overlap, workspace)
+                print(f"[TUNING] build: {json.dumps(build)}", file=sys.stderr)
+                for k in parse_values(arguments.ks):
+                    candidate = {**build, **evaluate_candidate(database, questions, k)}
+                    print(f"[TUNING] chunk_size={chunk_size} overlap={chunk_overlap} k={k}: "
+                          f"recall={candidate['recall_at_k']:.3f} tokens={candidate['context_tokens_mean']:.0f}",
+                          file=sys.stderr)
+                    candidates.append(candidate)
+    finally:
+        if not arguments.workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    recommendation = recommend(candidates, arguments.target_recall)
+    if recommendation is None:
+        print(f"[TUNING] No configuration reached recall {arguments.target_recall}", file=sys.stderr)
+    return {
+        "settings": vars(arguments),
+        "questions": len(questions),
+        "skipped_questions": skipped,
+        "extraction_seconds": extraction_seconds,
+        "candidates": candidates,
+        "recommendation": recommendation
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Tune chunk size, overlap and search result count offline.")
+    parser.add_argument("--documents", default="documents")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS)
+    parser.add_argument("--chunk-sizes", default="600,800,1050,1400")
+    parser.add_argument("--overlaps", default="0,120,200")
+    parser.add_argument("--ks", default="2,3,4,6")
+    parser.add_argument("--target-recall", type=float, default=0.9)
+    parser.add_argument("--embedding-backend", help="Overrides EMBEDDING_BACKEND, e.g. hashing to tune offline.")
+    parser.add_argument("--vector-store", help="Overrides VECTOR_STORE_BACKEND.")
+    parser.add_argument("--workspace", help="Keep the candidate indexes in this directory.")
+    parser.add_argument("--output", default="benchmark_results/tuning.json")
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    # Must run before any module that imports config, which reads these at import time.
+    if arguments.embedding_backend:
+        os.environ["EMBEDDING_BACKEND"] = arguments.embedding_backend
+    if arguments.vector_store:
+        os.environ["VECTOR_STORE_BACKEND"] = arguments.vector_store
+
+    from benchmark import write_results
+    write_results(run_tuning(arguments), arguments.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
-import os
 import streamlit as st
-from config import PATH_DOCUMENTS
+from langchain_core.callbacks import BaseCallbackHandler
+from config import CHAT_PAGE_SIZE, DOCUMENT_WATCH_ENABLED, PATH_INDEX_MANIFEST
+from manifest import IndexManifest, index_file_path, read_active_index_dir
+from sessions import get_session_store
+from watcher import get_document_catalog, count_documents
+
+TOOL_PROGRESS_MESSAGES = {
+    "search_knowledge_base": "🔎 Searching knowledge base…",
+    "submit_support_ticket": "🎫 Creating support ticket…"
+}
 
 
 def setup_page_layout():
@@ -16,14 +24,12 @@ def show_header():
 
 
 def get_document_counts():
-    if not os.path.isdir(PATH_DOCUMENTS):
-        return 0, 0, []
-
-    all_files = os.listdir(PATH_DOCUMENTS)
-    supported_files = [f for f in all_files if f.lower().endswith(('.pdf', '.txt'))]
-    pdf_total = sum(1 for f in supported_files if f.lower().endswith('.pdf'))
-    txt_total = sum(1 for f in supported_files if f.lower().endswith('.txt'))
-    return pdf_total, txt_total, sorted(supported_files)
+    if DOCUMENT_WATCH_ENABLED:
+        # Kept current by the document watcher instead of listing the folder on every rerun.
+        return get_document_catalog().counts()
+    # Without the watcher documents are only indexed on startup, so show what the index holds.
+    manifest = IndexManifest(index_file_path(read_active_index_dir(), PATH_INDEX_MANIFEST)).load()
+    return count_documents(manifest.files)
 
 
 def show_document_stats():
@@ -60,11 +66,57 @@ def render_sidebar():
 
 
 def init_session_data():
-    if "conversation_history" not in st.session_state:
-        st.session_state.conversation_history = []
+    if "session_id" not in st.session_state:
+        # The session ID is kept in the URL, so a reload or a server restart resumes the conversation.
+        store = get_session_store()
+        session_id = st.query_params.get("session")
+        if not session_id or not store.exists(session_id):
+            session_id = store.create()
+            st.query_params["session"] = session_id
+        st.session_state.session_id = session_id
+    if "visible_messages" not in st.session_state:
+        st.session_state.visible_messages = CHAT_PAGE_SIZE
 
 
 def show_chat_messages():
-    for msg in st.session_state.conversation_history:
+    # Only the latest page is read and rendered, so a rerun costs the same however long the chat is.
+    messages, start = get_session_store().load_page(st.session_state.session_id, st.session_state.visible_messages)
+    if start > 0 and st.button(f"Show older messages ({start} more)"):
+        st.session_state.visible_messages += CHAT_PAGE_SIZE
+        st.rerun()
+
+    for msg in messages:
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
+
+
+class ChatStreamHandler(BaseCallbackHandler):
+    def __init__(self, status_placeholder, text_placeholder):
+        self.status_placeholder = status_placeholder
+        self.text_placeholder = text_placeholder
+        self.tokens = []
+        self.status_placeholder.caption("Thinking…")
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        # Every agent iteration is a new completion; only the last one is the answer.
+        self.tokens = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        if not token:
+            return
+        if not self.tokens:
+            self.status_placeholder.empty()
+        self.tokens.append(token)
+        self.text_placeholder.markdown("".join(self.tokens) + "▌")
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        tool_name = (serialized or {}).get("name", "tool")
+        self.text_placeholder.empty()
+        self.status_placeholder.caption(TOOL_PROGRESS_MESSAGES.get(tool_name, f"Running {tool_name}…"))
+
+    def on_tool_end(self, output, **kwargs):
+        self.status_placeholder.caption("Thinking…")
+
+    def finish(self, response):
+        self.status_placeholder.empty()
+        self.text_placeholder.markdown(response)
@@ -1,27 +1,43 @@
 import os
+import time
+import shutil
+import weakref
+import threading
 import streamlit as st
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
 
 from config import (
-    API_KEY_OPENAI,
     PATH_VECTOR_DB,
-    PATH_DOCUMENTS,
-    TEXT_CHUNK_SIZE,
-    TEXT_CHUNK_OVERLAP
+    PATH_INDEX_MANIFEST,
+    PATH_LEXICAL_INDEX,
+    PATH_FLAT_INDEX,
+    DOCUMENT_WATCH_ENABLED,
+    DOCUMENT_WATCH_POLL_SECONDS,
+    VECTOR_STORE_BACKEND,
+    PATH_DOCUMENTS
 )
+from manifest import (
+    IndexManifest,
+    LEGACY_EMBEDDING_BACKEND,
+    LEGACY_CHUNKING,
+    compute_file_hash,
+    index_file_path,
+    read_active_index_dir,
+    write_active_index_dir
+)
+from ingest import IngestionPipeline
+from lexical import BM25Index
+from flatstore import FlatVectorStore
+from embeddings import create_embedding_backend, describe_embedding_backend
+from chunking import DocumentChunker
+from watcher import DocumentWatcher, get_document_catalog
 
 
 class DocumentProcessor:
     def __init__(self):
-        self.embedding_model = OpenAIEmbeddings(openai_api_key=API_KEY_OPENAI)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=TEXT_CHUNK_SIZE,
-            chunk_overlap=TEXT_CHUNK_OVERLAP
-        )
+        self.embedding_model = create_embedding_backend()
+        self.embedding_backend = describe_embedding_backend(self.embedding_model)
+        self.chunker = DocumentChunker()
+        self.chunking = self.chunker.describe()
 
     def locate_pdf_files(self):
         if not os.path.isdir(PATH_DOCUMENTS):
@@ -33,86 +49,283 @@ class DocumentProcessor:
             return []
         return [f for f in os.listdir(PATH_DOCUMENTS) if f.lower().endswith('.txt')]
 
-    def extract_pdf_content(self, pdf_filename):
-        file_path = os.path.join(PATH_DOCUMENTS, pdf_filename)
-        loader = PyPDFLoader(file_path)
-        return loader.load()
-
-    def extract_text_content(self, text_filename):
-        file_path = os.path.join(PATH_DOCUMENTS, text_filename)
-        try:
-            with open(file_path, 'r', encoding='utf-8') as fh:
-                content = fh.read()
-            return [Document(page_content=content, metadata={"source": file_path})]
-        except Exception as err:
-            st.warning(f"Failed to read {text_filename}: {err}")
-            return []
-
-    def gather_all_documents(self):
-        documents = []
-
-        pdf_list = self.locate_pdf_files()
-        for pdf in pdf_list:
-            documents.extend(self.extract_pdf_content(pdf))
-
-        text_list = self.locate_text_files()
-        for txt in text_list:
-            documents.extend(self.extract_text_content(txt))
-
-        return documents
-
-    def create_text_chunks(self, documents):
-        return self.text_splitter.split_documents(documents)
-
-    def build_database(self, chunks):
-        return Chroma.from_documents(
-            documents=chunks,
-            embedding=self.embedding_model,
-            persist_directory=PATH_VECTOR_DB
-        )
+    def locate_source_files(self):
+        return self.locate_pdf_files() + self.locate_text_files()
 
 
 class VectorStoreManager:
-    def __init__(self):
+    def __init__(self, index_dir=PATH_VECTOR_DB, interactive=True):
+        self.index_dir = index_dir
+        self.interactive = interactive
         self.processor = DocumentProcessor()
+        self.manifest = IndexManifest(index_file_path(index_dir, PATH_INDEX_MANIFEST)).load()
+        self.lexical_index = BM25Index(index_file_path(index_dir, PATH_LEXICAL_INDEX)).load()
+
+    def warn(self, message):
+        # Background rebuilds have no page to show warnings on.
+        if self.interactive:
+            st.warning(message)
+        else:
+            print(f"[VECTOR_MODULE] {message}")
 
     def database_exists(self):
-        return os.path.isdir(PATH_VECTOR_DB) and os.listdir(PATH_VECTOR_DB)
+        return os.path.isdir(self.index_dir) and os.listdir(self.index_dir)
 
     def load_persisted_database(self):
         if self.database_exists():
-            return Chroma(
-                persist_directory=PATH_VECTOR_DB,
+            return self.open_database()
+        return None
+
+    def open_database(self):
+        if VECTOR_STORE_BACKEND == "flat":
+            return FlatVectorStore(
+                self.processor.embedding_model,
+                index_path=index_file_path(self.index_dir, PATH_FLAT_INDEX)
+            )
+        if VECTOR_STORE_BACKEND == "chroma":
+            # Chroma is only imported when it is the configured store; it dominates import time.
+            from chromastore import BatchedChroma
+            return BatchedChroma(
+                persist_directory=self.index_dir,
                 embedding_function=self.processor.embedding_model
             )
-        return None
+        raise ValueError(f"Unknown vector store backend: {VECTOR_STORE_BACKEND}")
 
     def count_available_documents(self):
         pdf_count = len(self.processor.locate_pdf_files())
         txt_count = len(self.processor.locate_text_files())
         return pdf_count + txt_count
 
-    def create_fresh_database(self):
-        total_docs = self.count_available_documents()
+    def scan_document_hashes(self):
+        return {
+            filename: compute_file_hash(os.path.join(PATH_DOCUMENTS, filename))
+            for filename in self.processor.locate_source_files()
+        }
 
-        if total_docs == 0:
-            return None
+    def adopt_unmanaged_chunks(self, database):
+        # Stores built before the manifest existed carry random chunk IDs. Group them by
+        # source file with an unknown hash so the next diff replaces them exactly once.
+        stored = database.get(include=["metadatas"])
+        for chunk_id, metadata in zip(stored.get("ids", []), stored.get("metadatas", [])):
+            filename = os.path.basename((metadata or {}).get("source", "unknown"))
+            entry = self.manifest.files.setdefault(filename, {"hash": None, "chunk_ids": []})
+            entry["chunk_ids"].append(chunk_id)
 
-        with st.spinner(f"Indexing {total_docs} document(s)... Please wait."):
-            all_docs = self.processor.gather_all_documents()
+    def remove_stale_files(self, database, filenames):
+        stale_ids = [chunk_id for f in filenames for chunk_id in self.manifest.chunk_ids(f)]
+        if stale_ids:
+            database.delete(ids=stale_ids)
+            self.lexical_index.remove(stale_ids)
+        for filename in filenames:
+            self.manifest.forget(filename)
+        self.manifest.save()
 
-        chunks = self.processor.create_text_chunks(all_docs)
-        return self.processor.build_database(chunks)
+    def index_files(self, database, content_hashes):
+        progress_bar = None
+        if self.interactive:
+            progress_bar = st.progress(0.0, text=f"Indexing {len(content_hashes)} document(s)... Please wait.")
+
+        def show_progress(progress):
+            if progress_bar is not None:
+                progress_bar.progress(progress.fraction(), text=f"Indexing: {progress.describe()}")
+
+        pipeline = IngestionPipeline(
+            self.processor.chunker,
+            database,
+            progress_callback=show_progress,
+            lexical_index=self.lexical_index
+        )
+        for filename, chunk_ids in pipeline.run(content_hashes):
+            self.manifest.record(filename, content_hashes[filename], chunk_ids)
+            self.manifest.save()
+
+        if progress_bar is not None:
+            progress_bar.empty()
+        print(f"[VECTOR_MODULE] Indexed {pipeline.progress.describe()} in {pipeline.progress.elapsed():.1f}s")
+        for filename, error in pipeline.failures:
+            self.warn(f"Failed to read {filename}: {error}")
+
+    def rebuild_lexical_index(self, database):
+        stored = database.get(include=["documents", "metadatas"])
+        self.lexical_index.clear()
+        self.lexical_index.add(stored.get("ids", []), stored.get("documents", []), stored.get("metadatas", []))
+
+    def index_is_compatible(self):
+        return (self.manifest.embedding_backend == self.processor.embedding_backend
+                and self.manifest.vector_store == VECTOR_STORE_BACKEND)
+
+    def discard_incompatible_database(self, database):
+        # Vectors from different embedding backends are not comparable, and a store that was
+        # not the active one may hold stale chunks, so the index is dropped and rebuilt.
+        self.warn(
+            f"The knowledge base was built with `{self.manifest.embedding_backend}` embeddings in "
+            f"`{self.manifest.vector_store}` but `{self.processor.embedding_backend}` in "
+            f"`{VECTOR_STORE_BACKEND}` is configured. Rebuilding the index."
+        )
+        database.reset_collection()
+        self.lexical_index.clear()
+        self.manifest.reset(self.processor.embedding_backend, VECTOR_STORE_BACKEND, self.processor.chunking)
+        self.manifest.save()
+
+    def synchronize_database(self, database):
+        if not self.manifest.exists():
+            self.adopt_unmanaged_chunks(database)
+            self.manifest.embedding_backend = (
+                LEGACY_EMBEDDING_BACKEND if self.manifest.files else self.processor.embedding_backend
+            )
+            self.manifest.vector_store = VECTOR_STORE_BACKEND
+            self.manifest.chunking = LEGACY_CHUNKING if self.manifest.files else self.processor.chunking
+        if not self.index_is_compatible():
+            self.discard_incompatible_database(database)
+        lexical_in_sync = self.manifest.exists() and self.lexical_index.version == self.manifest.version()
+        if self.manifest.chunking != self.processor.chunking:
+            # Embeddings stay comparable, so only the files are re-split; unchanged chunk texts
+            # are served from the embedding cache.
+            self.manifest.rechunk(self.processor.chunking)
+
+        current_hashes = self.scan_document_hashes()
+        added, changed, removed = self.manifest.compare(current_hashes)
+        if added or changed or removed:
+            self.remove_stale_files(database, changed + removed)
+
+            pending = added + changed
+            if pending:
+                self.index_files(database, {filename: current_hashes[filename] for filename in pending})
+
+        # The lexical index is updated alongside the store, but it is rebuilt from the store's
+        # own chunks if it was missing or left behind by an interrupted run.
+        if not lexical_in_sync:
+            self.rebuild_lexical_index(database)
+        if self.lexical_index.version != self.manifest.version():
+            self.lexical_index.save(self.manifest.version())
+
+        database.lexical_index = self.lexical_index
+        database.index_dir = self.index_dir
+        return database
+
+    def open_read_only(self):
+        # Serving workers only read a generation that another process keeps synchronized.
+        if not self.database_exists():
+            return None
+        database = self.open_database()
+        database.lexical_index = self.lexical_index
+        database.index_dir = self.index_dir
+        return database
 
     def get_or_create_database(self):
-        existing = self.load_persisted_database()
-        if existing:
-            return existing
-        return self.create_fresh_database()
+        if not self.database_exists() and self.count_available_documents() == 0:
+            return None
+        return self.synchronize_database(self.open_database())
+
+
+def documents_changed(index_dir):
+    manifest = IndexManifest(index_file_path(index_dir, PATH_INDEX_MANIFEST)).load()
+    current_hashes = {
+        filename: compute_file_hash(os.path.join(PATH_DOCUMENTS, filename))
+        for filename in get_document_catalog().filenames()
+    }
+    return any(manifest.compare(current_hashes))
+
+
+def remove_stale_generations(active_dir):
+    # Generations left behind by a process that exited before releasing them.
+    parent = os.path.dirname(PATH_VECTOR_DB) or "."
+    prefix = f"{os.path.basename(PATH_VECTOR_DB)}.gen-"
+    for name in os.listdir(parent):
+        index_dir = os.path.join(parent, name)
+        if name.startswith(prefix) and os.path.normpath(index_dir) != os.path.normpath(active_dir):
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+
+class LiveIndex:
+    """Serves one synchronized index generation and swaps in a new one when documents change.
+
+    A rebuild copies the active generation to a new directory, synchronizes the copy with
+    ``documents/`` and only then publishes it, so the store in use is never written to.
+    Executors built on the previous store keep searching it; its directory is deleted once
+    the last of them is released, or after ``retire_delay`` seconds when other processes
+    read it through ``ReadOnlyIndex``.
+    """
+
+    def __init__(self, interactive=True, retire_delay=0):
+        self.interactive = interactive
+        self.retire_delay = retire_delay
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+        self.database = None
+        self.watcher = None
+
+    def current(self):
+        with self.lock:
+            return self.database
+
+    def load(self):
+        active_dir = read_active_index_dir()
+        remove_stale_generations(active_dir)
+        self.database = VectorStoreManager(active_dir, self.interactive).get_or_create_database()
+        return self
+
+    def start_watcher(self):
+        if DOCUMENT_WATCH_ENABLED and self.watcher is None:
+            self.watcher = DocumentWatcher(get_document_catalog(), self.refresh).start()
+        return self
+
+    def refresh(self):
+        with self.rebuild_lock:
+            active_dir = read_active_index_dir()
+            if self.database is not None and not documents_changed(active_dir):
+                return False
+
+            staging_dir = f"{PATH_VECTOR_DB}.gen-{time.time_ns()}"
+            if os.path.isdir(active_dir):
+                shutil.copytree(active_dir, staging_dir)
+            try:
+                database = VectorStoreManager(staging_dir, interactive=False).get_or_create_database()
+            except Exception:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                raise
+            if database is None:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return False
+
+            write_active_index_dir(staging_dir)
+            with self.lock:
+                previous, self.database = self.database, database
+            if previous is not None:
+                self.retire(previous)
+
+        print(f"[VECTOR_MODULE] Switched to index {database.lexical_index.version} in {staging_dir}")
+        return True
+
+    def retire(self, database):
+        if self.retire_delay:
+            timer = threading.Timer(self.retire_delay, shutil.rmtree, (database.index_dir,), {"ignore_errors": True})
+            timer.daemon = True
+            timer.start()
+            return
+        finalizer = weakref.finalize(database, shutil.rmtree, database.index_dir, ignore_errors=True)
+        # A retired generation that is still referenced at exit is cleaned up on the next start.
+        finalizer.atexit = False
+
 
+class ReadOnlyIndex:
+    """Follows the generation named in ``active_index.json`` without ever writing to it."""
 
-@st.cache_resource(show_spinner=False)
-def setup_vector_store():
-    manager = VectorStoreManager()
-    return manager.get_or_create_database()
+    def __init__(self, check_seconds=DOCUMENT_WATCH_POLL_SECONDS):
+        self.check_seconds = check_seconds
+        self.lock = threading.Lock()
+        self.database = None
+        self.index_dir = None
+        self.checked_at = None
 
+    def current(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.checked_at is None or now - self.checked_at >= self.check_seconds:
+                self.checked_at = now
+                index_dir = read_active_index_dir()
+                if index_dir != self.index_dir:
+                    database = VectorStoreManager(index_dir, interactive=False).open_read_only()
+                    if database is not None:
+                        self.database, self.index_dir = database, index_dir
+            return self.database
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+
+from config import PATH_DOCUMENTS, DOCUMENT_WATCH_POLL_SECONDS, DOCUMENT_WATCH_DEBOUNCE_SECONDS
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def count_documents(filenames):
+    file_list = sorted(filenames)
+    pdf_total = sum(1 for f in file_list if f.lower().endswith('.pdf'))
+    txt_total = sum(1 for f in file_list if f.lower().endswith('.txt'))
+    return pdf_total, txt_total, file_list
+
+
+class DocumentCatalog:
+    def __init__(self, documents_path=PATH_DOCUMENTS):
+        self.documents_path = documents_path
+        self.lock = threading.Lock()
+        self.files = {}
+        self.scan()
+
+    def scan(self):
+        files = {}
+        if os.path.isdir(self.documents_path):
+            for entry in os.scandir(self.documents_path):
+                if entry.is_file() and entry.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+        with self.lock:
+            changed = files != self.files
+            self.files = files
+        return changed
+
+    def filenames(self):
+        with self.lock:
+            return sorted(self.files)
+
+    def counts(self):
+        return count_documents(self.filenames())
+
+
+class DocumentWatcher:
+    """Rescans the documents folder on inotify events, or every few seconds without inotify.
+
+    Bursts of events (a large PDF being copied in) are debounced, and ``on_change`` runs on
+    the watcher thread only when the catalog actually differs from the previous scan.
+    """
+
+    def __init__(self, catalog, on_change, poll_seconds=DOCUMENT_WATCH_POLL_SECONDS,
+                 debounce_seconds=DOCUMENT_WATCH_DEBOUNCE_SECONDS):
+        self.catalog = catalog
+        self.on_change = on_change
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.stopping = threading.Event()
+        self.worker = None
+        self.inotify = None
+        self.retry_pending = False
+
+    def start(self):
+        if self.worker is None:
+            self.inotify = self.open_inotify()
+            self.worker = threading.Thread(target=self.run, name="document-watcher", daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+
+    def open_inotify(self):
+        try:
+            from inotify_simple import INotify, flags
+            inotify = INotify()
+            inotify.add_watch(
+                self.catalog.documents_path,
+                flags.CLOSE_WRITE | flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO
+            )
+            return inotify
+        except (ImportError, OSError) as error:
+            # No inotify_simple, not Linux, or no documents folder yet: poll instead.
+            print(f"[WATCHER_MODULE] Polling {self.catalog.documents_path} every {self.poll_seconds:.0f}s ({error})")
+            return None
+
+    def wait_for_events(self):
+        if self.inotify is None:
+            self.stopping.wait(self.poll_seconds)
+            return
+
+        # Reading with the poll interval as timeout still rescans periodically, so a documents
+        # folder that is replaced wholesale is picked up as well.
+        if self.inotify.read(timeout=int(self.poll_seconds * 1000)):
+            while self.inotify.read(timeout=int(self.debounce_seconds * 1000)):
+                pass
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wait_for_events()
+            changed = self.catalog.scan()
+            if self.stopping.is_set() or not (changed or self.retry_pending):
+                continue
+            started = time.perf_counter()
+            try:
+                self.on_change()
+            except Exception as error:
+                # The catalog already holds the new listing, so retry on the next wake-up.
+                self.retry_pending = True
+                print(f"[WATCHER_MODULE] Failed to apply document changes: {error}")
+                continue
+            self.retry_pending = False
+            print(f"[WATCHER_MODULE] Applied document changes in {time.perf_counter() - started:.1f}s")
+
+
+def get_document_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = DocumentCatalog()
+        return _catalog